@@ -1,14 +1,10 @@
-import os
-import google.generativeai as genai
-from django.db.models import Q
 from Tour.models import Tour
+from .llm import get_llm_client, get_response_cache, normalize_query
+from .retrieval import get_tour_index
 
-# Configure Gemini
-# Ideally, this should be loaded from settings, but for simplicity we check env here
-# The user needs to set GEMINI_API_KEY in their .env
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# The LLM backend (Gemini or the local stub) is selected in llm.py
+
+MISSING_KEY_ANSWER = "I'm sorry, my brain (API Key) is missing. Please tell the admin to configure `GEMINI_API_KEY`."
 
 KNOWN_TAGS = [
     "Nature", "Culture", "History", "Adventure", "Relaxation",
@@ -24,11 +20,17 @@ def extract_search_params(text):
     Ask Gemini to extract keywords, tags, price constraints, number of people, and guide names.
     Returns a dictionary with keys: keywords, tags, min_price, max_price, num_people, guide_names.
     """
-    if not GEMINI_API_KEY:
+    client = get_llm_client()
+    if not client.available:
         return {"keywords": [text], "tags": [], "min_price": None, "max_price": None, "num_people": None, "guide_names": []}
 
+    # Same question, same parameters
+    cache_key = ("extract", client.name, normalize_query(text))
+    cached = get_response_cache().get(cache_key)
+    if cached is not None:
+        return json.loads(cached)
+
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
         prompt = f"""
         Analyze the following travel query and extract search parameters in JSON format.
         
@@ -48,9 +50,10 @@ def extract_search_params(text):
         
         Query: "{text}"
         """
-        response = model.generate_content(prompt)
-        cleaned_text = response.text.strip().replace('```json', '').replace('```', '')
+        response_text = client.generate(prompt, task="extract", query=text)
+        cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
         params = json.loads(cleaned_text)
+        get_response_cache().set(cache_key, json.dumps(params))
         return params
     except Exception as e:
         print(f"Error extracting params: {e}")
@@ -77,43 +80,22 @@ def get_relevant_tours(query, limit=5):
     if not keywords and not tags and min_price is None and max_price is None and num_people is None and not guide_names:
         return []
 
-    # 2. Build Query
-    q_objects = Q()
-    
-    # Keywords matching (OR logic)
-    for keyword in keywords:
-        q_objects |= Q(name__icontains=keyword)
-        q_objects |= Q(description__icontains=keyword)
-        q_objects |= Q(places__name__icontains=keyword)
-        q_objects |= Q(places__city__icontains=keyword)
-        q_objects |= Q(places__province__icontains=keyword)
-    
-    # Tags matching (OR logic, combined with keywords)
-    for tag in tags:
-         q_objects |= Q(tags__icontains=tag)
-
-    # Start with the keyword/tag filter
-    tours = Tour.objects.filter(q_objects).distinct()
-
-    # 3. Apply Price Filters (AND logic)
-    if min_price is not None:
-        tours = tours.filter(price__gte=min_price)
-    
-    if max_price is not None:
-        tours = tours.filter(price__lte=max_price)
-
-    # 4. Apply Capacity Filter (AND logic)
-    if num_people is not None:
-        tours = tours.filter(min_people__lte=num_people, max_people__gte=num_people)
-
-    # 5. Apply Guide Filter (AND logic)
-    if guide_names:
-        guide_q = Q()
-        for name in guide_names:
-            guide_q |= Q(guide__name__icontains=name)
-        tours = tours.filter(guide_q)
-
-    return list(tours[:limit])
+    # 2. Rank tours with the in-memory index; price, capacity and guide
+    # are post-filters on the ranked candidates
+    tour_ids = get_tour_index().search(
+        keywords=keywords,
+        tags=tags,
+        min_price=min_price,
+        max_price=max_price,
+        num_people=num_people,
+        guide_names=guide_names,
+        limit=limit,
+    )
+
+    # 3. Load the matches, keeping the ranking
+    tours = Tour.objects.filter(id__in=tour_ids).select_related("guide").prefetch_related("places")
+    tours_by_id = {tour.id: tour for tour in tours}
+    return [tours_by_id[tour_id] for tour_id in tour_ids if tour_id in tours_by_id]
 
 def format_tour_context(tours):
     """
@@ -143,13 +125,18 @@ def format_tour_context(tours):
     
     return "\n---\n".join(context_parts)
 
-def ask_gemini(question, context_tours):
-    """
-    Send the question and context to Gemini and get a response.
-    """
-    if not GEMINI_API_KEY:
-        return "I'm sorry, my brain (API Key) is missing. Please tell the admin to configure `GEMINI_API_KEY`."
-
+def _answer_cache_key(client, question, context_tours):
+    # Same question over the same tours, same answer
+    return (
+        "answer",
+        client.name,
+        normalize_query(question),
+        tuple(tour.id for tour in context_tours),
+        # Tour edits (price, places, ...) move the index generation
+        get_tour_index().generation,
+    )
+
+def _answer_prompt(question, context_tours):
     context_text = format_tour_context(context_tours)
     
     prompt = f"""
@@ -180,10 +167,71 @@ TOUR INFORMATION:
 USER QUESTION:
 {question}
 """
+    return prompt
+
+def ask_gemini(question, context_tours):
+    """
+    Send the question and context to Gemini and get a response.
+    """
+    client = get_llm_client()
+    if not client.available:
+        return MISSING_KEY_ANSWER
+
+    cache_key = _answer_cache_key(client, question, context_tours)
+    cached = get_response_cache().get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _answer_prompt(question, context_tours)
     
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        return response.text
+        answer = client.generate(prompt, task="answer", question=question, tours=context_tours)
+        get_response_cache().set(cache_key, answer)
+        return answer
     except Exception as e:
         return f"I'm having trouble thinking right now. (Error: {str(e)})"
+
+def stream_gemini(question, context_tours):
+    """
+    Like ask_gemini, but yields the answer in chunks as the model produces
+    them. The assembled answer is cached once the stream completes.
+    """
+    client = get_llm_client()
+    if not client.available:
+        yield MISSING_KEY_ANSWER
+        return
+
+    cache_key = _answer_cache_key(client, question, context_tours)
+    cached = get_response_cache().get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    prompt = _answer_prompt(question, context_tours)
+    parts = []
+    try:
+        for chunk in client.stream(prompt, task="answer", question=question, tours=context_tours):
+            if chunk:
+                parts.append(chunk)
+                yield chunk
+    except Exception as e:
+        yield f"I'm having trouble thinking right now. (Error: {str(e)})"
+        return
+    get_response_cache().set(cache_key, "".join(parts))
+
+def answer_question(question):
+    """
+    Retrieve the relevant tours and answer the question about them.
+    Blocking; the chat consumer runs it on the chatbot pool (bot_pool.py).
+    """
+    tours = get_relevant_tours(question)
+    return ask_gemini(question, tours)
+
+
+def stream_answer(question):
+    """
+    Streaming answer_question: retrieval first, then the answer in chunks.
+    Blocking generator; the chat consumer iterates it on the chatbot pool.
+    """
+    tours = get_relevant_tours(question)
+    yield from stream_gemini(question, tours)
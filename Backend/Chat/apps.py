@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Chat'
+
+    def ready(self):
+        """Import signals when the app is ready"""
+        import Chat.signals
+        from .archive import flag_archived_rooms
+        from .conversations import backfill_conversations
+        from .response_time import backfill_response_stats
+        from .search import ensure_message_search_index
+
+        # The FTS5 message index is not a model, create it after migrations
+        post_migrate.connect(ensure_message_search_index, sender=self)
+        # Inboxes (and the response stats below) start from the message history
+        post_migrate.connect(backfill_conversations, sender=self)
+        # Response stats start from the existing message history
+        post_migrate.connect(backfill_response_stats, sender=self)
+        # Rooms archived before Conversation.has_archive existed
+        post_migrate.connect(flag_archived_rooms, sender=self)
@@ -0,0 +1,242 @@
+"""
+Hot/cold tiering of chat messages.
+
+The archive_messages command moves messages older than
+CHAT_ARCHIVE_AFTER_DAYS out of the Message table into MessageArchiveBlock
+rows: up to ARCHIVE_BLOCK_SIZE messages of one room per block, stored as
+zlib-compressed JSON. Each block is written and its messages deleted in one
+short transaction. The latest message of every conversation always stays in
+Message (Conversation.last_message points to it).
+
+MessageListView reads the archive once a page runs past the oldest hot
+message of a room flagged with Conversation.has_archive, so clients page
+through the full history as before and rooms that were never archived cost
+no archive query. Archived
+messages are not in the search index; they count as read in rebuilt unread
+counters, and rebuild_response_stats() reads them back.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .conversations import ConversationService
+from .models import Conversation, Message, MessageArchiveBlock
+
+
+# Default age after which messages are archived, in days
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+
+# Messages per archive block
+ARCHIVE_BLOCK_SIZE = 500
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+
+def archive_after_days():
+    return getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", DEFAULT_ARCHIVE_AFTER_DAYS)
+
+
+def pack_records(records):
+    """Compress [id, sender_id, content, created_at] records into block data."""
+    payload = json.dumps(
+        [
+            [message_id, sender_id, content, created_at.isoformat()]
+            for message_id, sender_id, content, created_at in records
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return zlib.compress(payload.encode("utf-8"), ARCHIVE_COMPRESSION_LEVEL)
+
+
+def unpack_records(data):
+    """Records of a block, oldest first, with created_at as a datetime."""
+    return [
+        (message_id, sender_id, content, datetime.fromisoformat(created_at))
+        for message_id, sender_id, content, created_at in json.loads(
+            zlib.decompress(bytes(data)).decode("utf-8")
+        )
+    ]
+
+
+def _archivable(room, cutoff):
+    return (
+        Message.objects.filter(room=room, created_at__lt=cutoff)
+        .exclude(
+            pk__in=Conversation.objects.filter(last_message__isnull=False).values(
+                "last_message_id"
+            )
+        )
+        .order_by("created_at", "id")
+    )
+
+
+def archive_room(room, cutoff, block_size=ARCHIVE_BLOCK_SIZE):
+    """
+    Move the room's messages older than cutoff into archive blocks, and
+    flag the room's conversation as archived.
+
+    Returns:
+        Tuple of (archived messages, blocks written)
+    """
+    archived = blocks = 0
+    while True:
+        records = list(
+            _archivable(room, cutoff).values_list(
+                "id", "sender_id", "content", "created_at"
+            )[:block_size]
+        )
+        if not records:
+            break
+        ids = [record[0] for record in records]
+        with transaction.atomic():
+            MessageArchiveBlock.objects.create(
+                room=room,
+                first_message_at=records[0][3],
+                last_message_at=records[-1][3],
+                min_message_id=min(ids),
+                max_message_id=max(ids),
+                message_count=len(records),
+                data=pack_records(records),
+            )
+            Message.objects.filter(pk__in=ids).delete()
+            if not blocks:
+                ConversationService.get_or_create_conversation(room)
+                Conversation.objects.filter(room=room).update(has_archive=True)
+        archived += len(records)
+        blocks += 1
+        if len(records) < block_size:
+            break
+    return archived, blocks
+
+
+def archive_messages(days=None, progress=None, now=None):
+    """
+    Archive every room's messages older than `days` (default:
+    CHAT_ARCHIVE_AFTER_DAYS).
+
+    Args:
+        progress: Optional callback(room, archived messages in the room)
+
+    Returns:
+        Tuple of (archived messages, blocks written)
+    """
+    days = archive_after_days() if days is None else days
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    rooms = (
+        Message.objects.filter(created_at__lt=cutoff)
+        .values_list("room", flat=True)
+        .distinct()
+        .order_by()
+    )
+    archived = blocks = 0
+    for room in list(rooms):
+        room_archived, room_blocks = archive_room(room, cutoff)
+        archived += room_archived
+        blocks += room_blocks
+        if progress and room_archived:
+            progress(room, room_archived)
+    return archived, blocks
+
+
+def has_archive(room):
+    """Whether some of the room's messages are archived."""
+    return Conversation.objects.filter(room=room, has_archive=True).exists()
+
+
+def flag_archived_rooms(**kwargs):
+    """
+    Set has_archive on the conversations of rooms with archive blocks
+    (post_migrate handler, for blocks written before the flag existed).
+    """
+    Conversation.objects.filter(
+        has_archive=False,
+        room__in=MessageArchiveBlock.objects.values("room"),
+    ).update(has_archive=True)
+
+
+def iter_archived_records(room):
+    """Every archived record of a room, oldest first."""
+    blocks = (
+        MessageArchiveBlock.objects.filter(room=room)
+        .order_by("last_message_at", "id")
+        .values_list("data", flat=True)
+    )
+    for data in blocks.iterator(chunk_size=8):
+        yield from unpack_records(data)
+
+
+def find_archived_message(room, message_id):
+    """created_at of an archived message of the room, or None."""
+    blocks = MessageArchiveBlock.objects.filter(
+        room=room, min_message_id__lte=message_id, max_message_id__gte=message_id
+    ).values_list("data", flat=True)
+    for data in blocks:
+        for record_id, _, _, created_at in unpack_records(data):
+            if record_id == message_id:
+                return created_at
+    return None
+
+
+def _to_messages(room, records):
+    """Unsaved Message objects (with sender and profiles) for records."""
+    User = get_user_model()
+    senders = User.objects.select_related("tourist_profile", "guide_profile").in_bulk(
+        {sender_id for _, sender_id, _, _ in records}
+    )
+    # Records of deleted users are skipped, as their messages would have been
+    return [
+        Message(
+            id=message_id,
+            room=room,
+            sender=senders[sender_id],
+            content=content,
+            created_at=created_at,
+        )
+        for message_id, sender_id, content, created_at in records
+        if sender_id in senders
+    ]
+
+
+def get_archived_messages(room, limit, before=None, after=None):
+    """
+    A page of archived messages, oldest first.
+
+    Args:
+        before: (created_at, id) - the newest archived messages older than it
+        after: (created_at, id) - the oldest archived messages newer than it
+        (neither: the newest archived messages)
+
+    Returns:
+        List of unsaved Message objects
+    """
+    blocks = MessageArchiveBlock.objects.filter(room=room)
+    if after is not None:
+        blocks = blocks.filter(last_message_at__gte=after[0]).order_by(
+            "last_message_at", "id"
+        )
+    else:
+        if before is not None:
+            blocks = blocks.filter(first_message_at__lte=before[0])
+        blocks = blocks.order_by("-last_message_at", "-id")
+
+    records = []
+    for data in blocks.values_list("data", flat=True).iterator(chunk_size=2):
+        for record in unpack_records(data):
+            position = (record[3], record[0])
+            if before is not None and position >= before:
+                continue
+            if after is not None and position <= after:
+                continue
+            records.append(record)
+        if len(records) >= limit:
+            break
+
+    records.sort(key=lambda record: (record[3], record[0]))
+    records = records[:limit] if after is not None else records[-limit:]
+    return _to_messages(room, records)
@@ -0,0 +1,177 @@
+"""
+Bounded worker pool for chatbot requests.
+
+Chatbot calls (retrieval + LLM) run on a dedicated thread pool instead of
+the shared sync_to_async / database_sync_to_async threads, so a slow model
+can never starve ordinary chat database calls. Requests are admitted only
+while the pool has room:
+- at most CHATBOT_MAX_PENDING_PER_USER requests per user in flight
+- at most CHATBOT_MAX_PENDING requests in flight overall
+Anything beyond that fails fast with BotBusy. Each request waits at most
+CHATBOT_TIMEOUT seconds (BotTimeout); its slot is only released once the
+worker thread has actually finished, so the limits hold even for calls
+that time out.
+"""
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+DEFAULT_CHATBOT_WORKERS = 4
+DEFAULT_CHATBOT_MAX_PENDING = 16
+DEFAULT_CHATBOT_MAX_PENDING_PER_USER = 1
+
+# Seconds a chatbot request may take before the user gets a timeout reply
+DEFAULT_CHATBOT_TIMEOUT = 30
+
+
+class BotBusy(Exception):
+    """The pool (or the user's share of it) is full"""
+
+
+class BotTimeout(Exception):
+    """The request did not finish within the timeout"""
+
+
+class BotWorkerPool:
+    """Dedicated executor with admission limits"""
+
+    def __init__(self, workers, max_pending, max_pending_per_user, timeout):
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot")
+        self._lock = threading.Lock()
+        self._pending = Counter()
+
+    def _acquire(self, user_id):
+        with self._lock:
+            if sum(self._pending.values()) >= self.max_pending:
+                raise BotBusy("Too many chatbot requests")
+            if self._pending[user_id] >= self.max_pending_per_user:
+                raise BotBusy("Previous chatbot request still running")
+            self._pending[user_id] += 1
+
+    def _release(self, user_id):
+        with self._lock:
+            self._pending[user_id] -= 1
+            if self._pending[user_id] <= 0:
+                del self._pending[user_id]
+
+    def pending(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                return sum(self._pending.values())
+            return self._pending[user_id]
+
+    def _call(self, user_id, func, args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+            self._release(user_id)
+
+    def submit(self, user_id, func, *args):
+        """
+        Start func(*args) on the pool for a user (call from the event loop).
+
+        Returns:
+            Awaitable result; raises BotTimeout when it takes too long
+
+        Raises:
+            BotBusy: The pool or the user's share of it is full
+        """
+        return self._wait(self._start(user_id, func, args))
+
+    def _start(self, user_id, func, args):
+        self._acquire(user_id)
+        try:
+            return asyncio.get_running_loop().run_in_executor(
+                self._executor, self._call, user_id, func, args
+            )
+        except Exception:
+            self._release(user_id)
+            raise
+
+    def stream(self, user_id, func, *args):
+        """
+        Run the generator func(*args) on the pool and iterate its chunks
+        from the event loop as they are produced (same limits as submit).
+        The timeout covers the whole stream; a timed out worker stops at
+        its next chunk.
+
+        Returns:
+            Async iterator of chunks; raises BotTimeout when it takes too long
+
+        Raises:
+            BotBusy: The pool or the user's share of it is full
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                for chunk in func(*args):
+                    if stopped.is_set():
+                        return
+                    loop.call_soon_threadsafe(chunks.put_nowait, ("chunk", chunk))
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, ("error", e))
+            else:
+                loop.call_soon_threadsafe(chunks.put_nowait, ("done", None))
+
+        self._start(user_id, produce, ())
+        return self._iterate(chunks, stopped, loop.time() + self.timeout)
+
+    async def _iterate(self, chunks, stopped, deadline):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    kind, value = await asyncio.wait_for(chunks.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise BotTimeout(f"Chatbot request exceeded {self.timeout}s")
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            stopped.set()
+
+    async def _wait(self, future):
+        try:
+            # shield: a timeout stops the wait, the worker finishes on its own
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise BotTimeout(f"Chatbot request exceeded {self.timeout}s")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_bot_pool():
+    """The process-wide chatbot pool, sized from the settings."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BotWorkerPool(
+                    workers=getattr(settings, "CHATBOT_WORKERS", DEFAULT_CHATBOT_WORKERS),
+                    max_pending=getattr(settings, "CHATBOT_MAX_PENDING", DEFAULT_CHATBOT_MAX_PENDING),
+                    max_pending_per_user=getattr(
+                        settings, "CHATBOT_MAX_PENDING_PER_USER", DEFAULT_CHATBOT_MAX_PENDING_PER_USER
+                    ),
+                    timeout=getattr(settings, "CHATBOT_TIMEOUT", DEFAULT_CHATBOT_TIMEOUT),
+                )
+    return _pool
@@ -2,7 +2,21 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from .fanout import send_many
+from urllib.parse import parse_qs
+import asyncio
 import json
+import time
+import uuid
+
+# At most one typing broadcast per connection per interval, in seconds
+TYPING_THROTTLE_SECONDS = 2
+
+# At most one seen update per connection per interval, in seconds; marks in
+# between are coalesced into one trailing update
+SEEN_THROTTLE_SECONDS = 1
+
+BOT_TIMEOUT_MESSAGE = "I'm taking too long to think right now. Please try again in a moment."
 
 class ChatConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -19,6 +33,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         self.group_name = f"chat_{self.room_name}"
         self.user_id = getattr(user, "id", None)
         self.username = getattr(user, "username", "")
+        self.last_typing_sent = 0
+        self.last_seen_sent = 0
+        self.seen_task = None
+        self.bot_tasks = set()
 
         # Cache room participants in Redis
         await self.add_user_to_room(self.room_name, self.user_id)
@@ -41,12 +59,26 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         except Exception:
             pass
 
+        # Persist this socket's queued messages and seen state before it goes away
+        from .write_behind import message_writer, write_behind_enabled
+        from .seen_state import room_seen_buffer
+        try:
+            seen_task = getattr(self, "seen_task", None)
+            if seen_task and not seen_task.done():
+                # Keep the coalesced mark instead of dropping it
+                seen_task.cancel()
+                await self.mark_room_seen()
+            if write_behind_enabled():
+                await message_writer.aflush()
+            await room_seen_buffer.aflush()
+        except Exception as e:
+            print(f"Error flushing chat state: {e}")
+
     @database_sync_to_async
     def is_user_online(self, user_id):
         """Check if user is online"""
-        if user_id:
-            return bool(cache.get(f"user_online:{user_id}", False))
-        return False
+        from .presence import PresenceService
+        return PresenceService.is_online(user_id)
 
     async def broadcast_online_status(self, is_in_room):
         """Broadcast user online status to the room"""
@@ -71,28 +103,15 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
     @database_sync_to_async
     def add_user_to_room(self, room_name, user_id):
-        """Cache room participants in Redis to avoid repeated DB queries"""
-        cache_key = f"room_users:{room_name}"
-        user_ids = cache.get(cache_key, set())
-        user_ids.add(user_id)
-        cache.set(cache_key, user_ids, timeout=86400)  # 24 hours
-        return user_ids
+        """Record the user as a member of the room"""
+        from .fanout import RoomMembership
+        RoomMembership.add(room_name, user_id)
 
     @database_sync_to_async
     def get_room_users(self, room_name):
-        """Get cached room participants"""
-        cache_key = f"room_users:{room_name}"
-        user_ids = cache.get(cache_key)
-        if user_ids is None:
-            # Fallback to DB if cache miss (rare)
-            from .models import Message
-            user_ids = set(
-                Message.objects.filter(room=room_name)
-                .values_list("sender_id", flat=True)
-                .distinct()
-            )
-            cache.set(cache_key, user_ids, timeout=86400)
-        return list(user_ids)
+        """Get room participants"""
+        from .fanout import RoomMembership
+        return list(RoomMembership.get_user_ids(room_name))
 
     async def receive_json(self, content, **kwargs):
         msg_type = content.get("type")
@@ -104,8 +123,8 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
             user = self.scope["user"]
 
-            # Create message in DB (async)
-            message_id, created_at = await self.create_message(
+            # Create message in DB (async), or queue it for the write-behind writer
+            message_id, created_at = await self.save_message(
                 self.room_name, user, text
             )
 
@@ -129,18 +148,21 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             )
 
             # Mark room as seen for sender (they just sent a message, so they've seen everything)
-            await self.mark_room_seen()
-            # Broadcast seen status so the other person sees the update
-            await self.broadcast_seen_status()
+            # and broadcast it so the other person sees the update
+            await self.mark_seen_throttled()
 
             # Send notifications asynchronously (don't wait)
             await self.send_notifications(payload)
 
             # Handle chatbot
             if "chatbot" in self.room_name and getattr(user, "username", "") != "chatbot":
-                await self.handle_bot_response(text)
+                self.start_bot_response(text)
 
         elif msg_type == "typing":
+            now = time.monotonic()
+            if now - self.last_typing_sent < TYPING_THROTTLE_SECONDS:
+                return
+            self.last_typing_sent = now
             user = self.scope["user"]
             await self.channel_layer.group_send(
                 self.group_name,
@@ -149,27 +171,36 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         
         elif msg_type == "mark_seen":
             # User scrolled/viewed messages - mark as seen
-            await self.mark_room_seen()
-            await self.broadcast_seen_status()
+            await self.mark_seen_throttled()
+
+    async def save_message(self, room, sender, content):
+        """Persist a message, inline or through the write-behind writer"""
+        from .write_behind import message_writer, write_behind_enabled
+        if write_behind_enabled():
+            return await message_writer.enqueue(room, sender, content)
+        return await self.create_message(room, sender, content)
 
     @database_sync_to_async
     def create_message(self, room, sender, content):
         """Create message and return minimal data"""
         from .models import Message
-        from .response_time import invalidate_guide_response_time_cache
-        from Authentication.models import User as AuthUser
+        from .response_time import record_response_times
+        
+        from .conversations import ConversationService
         
         msg_obj = Message.objects.create(room=room, sender=sender, content=content)
         
-        # Invalidate response time cache if sender is a guide
-        # This ensures the response time is recalculated with the new message
-        if hasattr(sender, 'role') and sender.role == AuthUser.ROLE_GUIDE:
-            invalidate_guide_response_time_cache(sender.id)
+        # Move the conversation's last-message pointer (inbox ordering)
+        conversation = ConversationService.register_message(msg_obj)
+        
+        # Keep the guide first-response stats up to date
+        record_response_times([msg_obj], {room: conversation})
         
         return msg_obj.id, msg_obj.created_at.isoformat()
 
     async def send_notifications(self, payload):
         """Send notifications to all room participants"""
+        from .write_behind import message_writer, write_behind_enabled
         try:
             user_ids = await self.get_room_users(self.room_name)
             notify_payload = {
@@ -179,27 +210,72 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                 "sender": payload["sender"],
                 "created_at": payload["created_at"],
             }
-            for uid in user_ids:
-                await self.channel_layer.group_send(
-                    f"notify_user_{uid}",
-                    {"type": "chat.notification", "payload": notify_payload},
+            if write_behind_enabled():
+                # Logged and sent by the writer task with the next batch
+                await message_writer.enqueue_notification(
+                    [int(uid) for uid in user_ids if str(uid).isdigit()],
+                    self.room_name,
+                    notify_payload,
                 )
+                return
+            # Number each recipient's copy so reconnecting clients can replay it
+            stamped = await self.record_notification_events(user_ids, notify_payload)
+            # All recipients at once rather than one round trip each
+            await send_many(
+                self.channel_layer,
+                [
+                    (f"notify_user_{uid}", {"type": "chat.notification", "payload": uid_payload})
+                    for uid, uid_payload in stamped.items()
+                ],
+            )
         except Exception as e:
             print(f"Error sending notifications: {e}")
 
+    @database_sync_to_async
+    def record_notification_events(self, user_ids, payload):
+        """Log the notification in each recipient's replay stream"""
+        from Management.replay import record_events
+        return record_events(
+            [int(uid) for uid in user_ids if str(uid).isdigit()], "chat", payload
+        )
+
     async def chat_message(self, event):
         await self.send_json(event["payload"])
 
     async def chat_typing(self, event):
         await self.send_json({"type": "typing", **event["payload"]})
 
+    async def mark_seen_throttled(self):
+        """Mark the room seen and broadcast it, coalescing frequent marks"""
+        if self.seen_task and not self.seen_task.done():
+            # A trailing update is already scheduled
+            return
+        wait = self.last_seen_sent + SEEN_THROTTLE_SECONDS - time.monotonic()
+        if wait > 0:
+            self.seen_task = asyncio.create_task(self.mark_seen_later(wait))
+            return
+        await self.mark_seen_now()
+
+    async def mark_seen_later(self, delay):
+        await asyncio.sleep(delay)
+        try:
+            await self.mark_seen_now()
+        except Exception as e:
+            print(f"Error marking room seen: {e}")
+
+    async def mark_seen_now(self):
+        from .seen_state import room_seen_buffer
+        self.last_seen_sent = time.monotonic()
+        seen_at = await self.mark_room_seen()
+        room_seen_buffer.ensure_writer()
+        await self.broadcast_seen_status(seen_at)
+
     @database_sync_to_async
     def mark_room_seen(self):
-        """Mark that user has seen messages in this room"""
+        """Mark that user has seen messages in this room (seen time written in batches)"""
         from .last_seen import LastSeenService
-        LastSeenService.mark_room_as_seen(self.user_id, self.room_name)
-        # Invalidate conversations cache so hasUnread updates immediately
-        cache.delete(f"conversations:{self.user_id}")
+        seen_at = LastSeenService.mark_room_as_seen(self.user_id, self.room_name, defer=True)
+        return seen_at.isoformat()
 
     @database_sync_to_async
     def get_room_seen_info(self):
@@ -208,9 +284,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         seen_at = LastSeenService.get_room_last_seen(self.user_id, self.room_name)
         return seen_at.isoformat() if seen_at else None
 
-    async def broadcast_seen_status(self):
+    async def broadcast_seen_status(self, seen_at=None):
         """Broadcast that user has seen messages"""
-        seen_at = await self.get_room_seen_info()
+        if seen_at is None:
+            seen_at = await self.get_room_seen_info()
         await self.channel_layer.group_send(
             self.group_name,
             {
@@ -229,38 +306,96 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         """Send seen status update to client"""
         await self.send_json(event["payload"])
 
+    def start_bot_response(self, user_text):
+        """Answer in the background so this socket keeps receiving messages"""
+        task = asyncio.create_task(self.handle_bot_response(user_text))
+        self.bot_tasks.add(task)
+        task.add_done_callback(self.bot_tasks.discard)
+
     async def handle_bot_response(self, user_text):
         """Process the user's message, ask AI, and send response."""
         try:
-            from .ai_service import get_relevant_tours, ask_gemini
-            from asgiref.sync import sync_to_async
+            from .ai_service import answer_question, stream_answer
+            from .bot_pool import BotBusy, BotTimeout, get_bot_pool
+            from django.conf import settings
             from django.contrib.auth import get_user_model
 
+            streaming = getattr(settings, "CHATBOT_STREAMING", True)
+
+            # Retrieval and the LLM run on the dedicated chatbot pool, never
+            # on the threads shared with ordinary chat database calls
+            try:
+                if streaming:
+                    pending = get_bot_pool().stream(self.user_id, stream_answer, user_text)
+                else:
+                    pending = get_bot_pool().submit(self.user_id, answer_question, user_text)
+            except BotBusy:
+                await self.send_json({
+                    "type": "chatbot.busy",
+                    "room": self.room_name,
+                    "message": "The assistant is busy, please try again in a moment.",
+                })
+                return
+
             await self.channel_layer.group_send(
                 self.group_name,
                 {"type": "chat.typing", "payload": {"user_id": "chatbot"}},
             )
 
-            tours = await database_sync_to_async(get_relevant_tours)(user_text)
-            ai_response_text = await sync_to_async(ask_gemini)(user_text, tours)
-
             User = get_user_model()
             bot_user = await database_sync_to_async(
                 lambda: User.objects.get_or_create(username="chatbot")[0]
             )()
+            sender = {"id": bot_user.id, "username": bot_user.username}
+
+            stream_id = None
+            if streaming:
+                # Forward chunks as they arrive; the Message is saved once at the end
+                stream_id = uuid.uuid4().hex
+                parts = []
+                try:
+                    async for chunk in pending:
+                        parts.append(chunk)
+                        await self.channel_layer.group_send(
+                            self.group_name,
+                            {
+                                "type": "chat.message.delta",
+                                "payload": {
+                                    "type": "chat.message.delta",
+                                    "stream_id": stream_id,
+                                    "delta": chunk,
+                                    "sender": sender,
+                                    "room": self.room_name,
+                                },
+                            },
+                        )
+                except BotTimeout:
+                    parts.append(
+                        "\n\n(Answer cut short, please try again.)" if parts
+                        else BOT_TIMEOUT_MESSAGE
+                    )
+                ai_response_text = "".join(parts)
+            else:
+                try:
+                    ai_response_text = await pending
+                except BotTimeout:
+                    ai_response_text = BOT_TIMEOUT_MESSAGE
 
-            message_id, created_at = await self.create_message(
+            message_id, created_at = await self.save_message(
                 self.room_name, bot_user, ai_response_text
             )
 
             payload = {
                 "type": "chat.message",
                 "message": ai_response_text,
-                "sender": {"id": bot_user.id, "username": bot_user.username},
+                "sender": sender,
                 "message_id": message_id,
                 "created_at": created_at,
                 "room": self.room_name,
             }
+            if stream_id:
+                # Lets clients replace the streamed draft with the saved message
+                payload["stream_id"] = stream_id
 
             await self.channel_layer.group_send(
                 self.group_name,
@@ -269,6 +404,9 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         except Exception as e:
             print(f"Error in handle_bot_response: {e}")
 
+    async def chat_message_delta(self, event):
+        await self.send_json(event["payload"])
+
 
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -280,18 +418,33 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         self.user_id = getattr(user, "id", None)
         self.username = getattr(user, "username", "")
         self.group_name = f"notify_user_{self.user_id or 'anon'}"
+        self.last_seq = None
         
+        # Join the group before reading the backlog so nothing falls in between;
+        # live events are only handled after connect returns, so they always
+        # follow the replay, and duplicates are skipped by sequence number.
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
         
-        # Set user as online when they connect to the app
-        await self.set_user_online(True)
+        # Count this connection; tell contacts if the user just came online
+        came_online = await self.register_presence(True)
+        if came_online:
+            await self.broadcast_presence(True)
+
+        since_seq = self.get_since_seq()
+        if since_seq is not None:
+            await self.replay_missed_events(since_seq)
+        else:
+            # Where the client's next ?since_seq should start from
+            await self.send_json({"type": "replay_complete", "seq": await self.get_latest_seq()})
 
     async def disconnect(self, close_code):
         try:
-            # Set user as offline when they disconnect from the app
-            await self.set_user_online(False)
+            # Offline only once the user's last connection closes
+            went_offline = await self.register_presence(False)
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            if went_offline:
+                await self.broadcast_presence(False)
         except Exception:
             pass
 
@@ -301,19 +454,78 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         
         if msg_type == "heartbeat":
             # Refresh online status when receiving heartbeat
-            await self.set_user_online(True)
+            await self.refresh_presence()
             # Send acknowledgment back
             await self.send_json({"type": "heartbeat_ack"})
 
     @database_sync_to_async
-    def set_user_online(self, is_online):
-        """Set user online status in cache"""
+    def refresh_presence(self):
+        """Extend the user's online status"""
+        from .presence import PresenceService
         if self.user_id:
-            cache_key = f"user_online:{self.user_id}"
-            if is_online:
-                cache.set(cache_key, True, timeout=300)  # 5 minutes timeout
-            else:
-                cache.delete(cache_key)
+            PresenceService.refresh(self.user_id, self.channel_name)
+
+    @database_sync_to_async
+    def register_presence(self, connected):
+        """Add or remove this connection; True when the online status changed"""
+        from .presence import PresenceService
+        if not self.user_id:
+            return False
+        if connected:
+            return PresenceService.connect(self.user_id, self.channel_name)
+        return PresenceService.disconnect(self.user_id, self.channel_name)
+
+    @database_sync_to_async
+    def get_contact_ids(self):
+        from .presence import PresenceService
+        return PresenceService.get_contact_ids(self.user_id)
+
+    async def broadcast_presence(self, is_online):
+        """Push the status change to users sharing a conversation"""
+        from .presence import presence_payload, push_presence_change
+        try:
+            contact_ids = await self.get_contact_ids()
+            await push_presence_change(
+                self.channel_layer,
+                contact_ids,
+                presence_payload(self.user_id, self.username, is_online),
+            )
+        except Exception as e:
+            print(f"Error broadcasting presence: {e}")
+
+    def get_since_seq(self):
+        """Read ?since_seq=N from the connection URL"""
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return max(int(query["since_seq"][0]), 0)
+        except (KeyError, IndexError, ValueError):
+            return None
+
+    async def replay_missed_events(self, since_seq):
+        """Send the notifications missed since since_seq, or ask for a resync"""
+        events, latest_seq, complete = await self.get_missed_events(since_seq)
+        if not complete:
+            await self.send_json({"type": "resync_required", "seq": latest_seq})
+        else:
+            for payload in events:
+                await self.send_json(payload)
+        self.last_seq = latest_seq
+        await self.send_json({"type": "replay_complete", "seq": latest_seq})
+
+    @database_sync_to_async
+    def get_missed_events(self, since_seq):
+        from Management.replay import get_events_since
+        return get_events_since(self.user_id, since_seq)
+
+    @database_sync_to_async
+    def get_latest_seq(self):
+        from Management.replay import get_latest_seq
+        return get_latest_seq(self.user_id)
 
     async def chat_notification(self, event):
-        await self.send_json(event["payload"])
\ No newline at end of file
+        payload = event["payload"]
+        seq = payload.get("seq") if isinstance(payload, dict) else None
+        if seq is not None and self.last_seq is not None and seq <= self.last_seq:
+            # Already delivered by the replay
+            return
+        await self.send_json(payload)
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Conversation index for chat rooms.
+Keeps one Conversation row per room with its participants and a pointer to
+the latest message, updated on every message insert, so a user's inbox is a
+single indexed query instead of a scan over the whole message table.
+Each participant also carries an unread counter, incremented for the other
+participants on every message and reset when the user marks the room seen.
+The index is built from the existing messages after migrate while it has no
+conversation with messages yet (backfill_conversations).
+"""
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, F, Max, Prefetch, Q, When
+from .models import Conversation, ConversationParticipant, Message, RoomLastSeen
+
+
+# Cache timeout for the known participant ids of a room: 24 hours
+CONVERSATION_MEMBERS_CACHE_TIMEOUT = 86400
+
+
+class ConversationService:
+    """Service to maintain and query conversations"""
+
+    @staticmethod
+    def _members_cache_key(room_name):
+        return f"conversation_members:{room_name}"
+
+    @staticmethod
+    def room_usernames(room_name):
+        """
+        Usernames encoded in a room name (format: username1__username2)
+        """
+        if "__" not in room_name:
+            return []
+        return [part for part in room_name.split("__") if part]
+
+    @staticmethod
+    def _room_user_ids(room_name):
+        usernames = ConversationService.room_usernames(room_name)
+        if not usernames:
+            return set()
+        query = Q()
+        for username in usernames:
+            query |= Q(username__iexact=username)
+        User = get_user_model()
+        return set(User.objects.filter(query).values_list("id", flat=True))
+
+    @staticmethod
+    def add_participants(conversation, user_ids):
+        """
+        Add users to a conversation (existing memberships are kept).
+        """
+        user_ids = {user_id for user_id in user_ids if user_id}
+        if not user_ids:
+            return
+        ConversationParticipant.objects.bulk_create(
+            [
+                ConversationParticipant(
+                    conversation=conversation,
+                    user_id=user_id,
+                    last_message_at=conversation.last_message_at,
+                )
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def get_member_ids(conversation):
+        """
+        Get the participant ids of a conversation (cached).
+        """
+        cache_key = ConversationService._members_cache_key(conversation.room)
+        member_ids = cache.get(cache_key)
+        if member_ids is None:
+            member_ids = set(
+                ConversationParticipant.objects.filter(
+                    conversation=conversation
+                ).values_list("user_id", flat=True)
+            )
+            cache.set(cache_key, member_ids, timeout=CONVERSATION_MEMBERS_CACHE_TIMEOUT)
+        return member_ids
+
+    @staticmethod
+    def get_or_create_conversation(room_name):
+        """
+        Get the conversation of a room, creating it with the participants
+        named in the room name on first use.
+        """
+        conversation, created = Conversation.objects.get_or_create(room=room_name)
+        if created:
+            ConversationService.add_participants(
+                conversation, ConversationService._room_user_ids(room_name)
+            )
+            cache.delete(ConversationService._members_cache_key(room_name))
+        return conversation
+
+    @staticmethod
+    def register_message(message):
+        """
+        Record a new message: make sure its sender is a participant and move
+        the conversation's last-message pointer.
+
+        Returns:
+            The room's Conversation
+        """
+        return ConversationService.register_messages([message])[message.room]
+
+    @staticmethod
+    def register_messages(messages):
+        """
+        Record a batch of new messages (e.g. a write-behind flush) with one
+        conversation update and one participant UPDATE per room.
+
+        Returns:
+            Dict of room name -> Conversation
+        """
+        by_room = {}
+        for message in messages:
+            by_room.setdefault(message.room, []).append(message)
+
+        conversations = {}
+        for room_name, room_messages in by_room.items():
+            conversation = ConversationService.get_or_create_conversation(room_name)
+
+            sender_counts = Counter(message.sender_id for message in room_messages)
+            new_senders = set(sender_counts) - ConversationService.get_member_ids(conversation)
+            if new_senders:
+                ConversationService.add_participants(conversation, new_senders)
+                cache.delete(ConversationService._members_cache_key(room_name))
+
+            last_message = max(room_messages, key=lambda m: (m.created_at, m.pk))
+            Conversation.objects.filter(pk=conversation.pk).update(
+                last_message=last_message, last_message_at=last_message.created_at
+            )
+            # One UPDATE: move the inbox ordering for everyone and count the
+            # messages as unread for everyone but their senders
+            total = len(room_messages)
+            ConversationParticipant.objects.filter(conversation=conversation).update(
+                last_message_at=last_message.created_at,
+                unread_count=Case(
+                    *[
+                        When(user_id=sender_id, then=F("unread_count") + (total - sent))
+                        for sender_id, sent in sender_counts.items()
+                    ],
+                    default=F("unread_count") + total,
+                ),
+            )
+            conversation.last_message = last_message
+            conversation.last_message_at = last_message.created_at
+            conversations[room_name] = conversation
+        return conversations
+
+    @staticmethod
+    def mark_seen(user_id, room_name):
+        """
+        Reset a user's unread counter for a room (and drop their cached
+        inbox when it changed).
+        """
+        updated = ConversationParticipant.objects.filter(
+            user_id=user_id, conversation__room=room_name
+        ).exclude(unread_count=0).update(unread_count=0)
+        if updated:
+            cache.delete(f"conversations:{user_id}")
+
+    @staticmethod
+    def get_user_conversations(user):
+        """
+        A user's conversations with messages, newest first, with the last
+        message and the other participants (and their profiles) preloaded.
+        """
+        return (
+            ConversationParticipant.objects.filter(
+                user=user, last_message_at__isnull=False
+            )
+            .select_related("conversation__last_message")
+            .prefetch_related(
+                Prefetch(
+                    "conversation__participants",
+                    queryset=ConversationParticipant.objects.exclude(user=user).select_related(
+                        "user", "user__tourist_profile", "user__guide_profile"
+                    ),
+                    to_attr="other_participants",
+                )
+            )
+            .order_by("-last_message_at")
+        )
+
+    @staticmethod
+    def rebuild():
+        """
+        Rebuild every conversation and membership from the message table.
+
+        Returns:
+            Number of conversations
+        """
+        rooms = (
+            Message.objects.values("room")
+            .annotate(last_id=Max("id"))
+            .order_by()
+        )
+        count = 0
+        for entry in rooms.iterator():
+            room_name = entry["room"]
+            last_message = Message.objects.get(pk=entry["last_id"])
+            conversation, _ = Conversation.objects.update_or_create(
+                room=room_name,
+                defaults={
+                    "last_message": last_message,
+                    "last_message_at": last_message.created_at,
+                },
+            )
+            sender_ids = set(
+                Message.objects.filter(room=room_name)
+                .values_list("sender_id", flat=True)
+                .distinct()
+            )
+            ConversationService.add_participants(
+                conversation, sender_ids | ConversationService._room_user_ids(room_name)
+            )
+            ConversationParticipant.objects.filter(conversation=conversation).update(
+                last_message_at=last_message.created_at
+            )
+            ConversationService._rebuild_unread_counts(conversation)
+            cache.delete(ConversationService._members_cache_key(room_name))
+            count += 1
+        return count
+
+    @staticmethod
+    def _rebuild_unread_counts(conversation):
+        """
+        Recount unread messages of each participant from RoomLastSeen.
+        """
+        seen = dict(
+            RoomLastSeen.objects.filter(room=conversation.room).values_list(
+                "user_id", "seen_at"
+            )
+        )
+        memberships = list(
+            ConversationParticipant.objects.filter(conversation=conversation)
+        )
+        for membership in memberships:
+            unread = Message.objects.filter(room=conversation.room).exclude(
+                sender_id=membership.user_id
+            )
+            seen_at = seen.get(membership.user_id)
+            if seen_at:
+                unread = unread.filter(created_at__gt=seen_at)
+            membership.unread_count = unread.count()
+        ConversationParticipant.objects.bulk_update(memberships, ["unread_count"])
+
+
+def backfill_conversations(**kwargs):
+    """
+    Build the conversation index from the message history after migrate, as
+    long as no conversation has messages yet (post_migrate handler).
+    """
+    if Conversation.objects.filter(last_message__isnull=False).exists():
+        return
+    if not Message.objects.exists():
+        return
+    ConversationService.rebuild()
@@ -0,0 +1,116 @@
+"""
+Multi-recipient fan-out for chat events.
+
+send_many() / group_send_many() send to many channel layer groups concurrently,
+so delivering a message to N recipients costs one round trip of latency
+instead of N sequential ones.
+
+RoomMembership keeps the users of a room. With Django's RedisCache (the
+default CACHES backend, see settings.py) it is a native Redis set
+(SADD / SMEMBERS), so joining a room is a single atomic command instead of a
+read-modify-write of a pickled set. With other cache backends
+(CACHE_BACKEND=locmem) the conversation participants (see conversations.py)
+are the membership.
+"""
+import asyncio
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from .conversations import ConversationService
+
+
+# Room membership sets expire 24 hours after the last join
+ROOM_MEMBERSHIP_TIMEOUT = 86400
+
+
+async def send_many(channel_layer, sends):
+    """
+    Run several group sends concurrently.
+
+    Args:
+        channel_layer: Channel layer to send through
+        sends: Iterable of (group, message) pairs
+
+    Returns:
+        Number of sends that failed
+    """
+    results = await asyncio.gather(
+        *[channel_layer.group_send(group, message) for group, message in sends],
+        return_exceptions=True,
+    )
+    failed = [result for result in results if isinstance(result, Exception)]
+    for error in failed:
+        print(f"Error sending to group: {error}")
+    return len(failed)
+
+
+async def group_send_many(channel_layer, groups, message):
+    """
+    Send the same event to several groups concurrently.
+
+    Returns:
+        Number of groups the send failed for
+    """
+    return await send_many(channel_layer, [(group, message) for group in groups])
+
+
+def redis_client():
+    """The Redis client of the default cache, or None for other backends."""
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+class RoomMembership:
+    """Service to track which users belong to a chat room"""
+
+    @staticmethod
+    def _redis():
+        return redis_client()
+
+    @staticmethod
+    def _key(room_name):
+        return caches["default"].make_and_validate_key(f"room_users:{room_name}")
+
+    @staticmethod
+    def _participant_ids(room_name):
+        conversation = ConversationService.get_or_create_conversation(room_name)
+        return set(ConversationService.get_member_ids(conversation))
+
+    @staticmethod
+    def _store(client, room_name, user_ids):
+        key = RoomMembership._key(room_name)
+        pipe = client.pipeline()
+        pipe.sadd(key, *user_ids)
+        pipe.expire(key, ROOM_MEMBERSHIP_TIMEOUT)
+        pipe.execute()
+
+    @staticmethod
+    def add(room_name, user_id):
+        """Add a user to a room (atomic with Redis)."""
+        client = RoomMembership._redis()
+        if client is None:
+            # Membership comes from the conversation participants
+            return
+        user_ids = {user_id}
+        if not client.exists(RoomMembership._key(room_name)):
+            # New or expired set: start from the participants
+            user_ids |= RoomMembership._participant_ids(room_name)
+        RoomMembership._store(client, room_name, user_ids)
+
+    @staticmethod
+    def get_user_ids(room_name):
+        """
+        Ids of the users of a room. An empty (or expired) Redis set is
+        seeded from the conversation participants.
+        """
+        client = RoomMembership._redis()
+        if client is not None:
+            members = client.smembers(RoomMembership._key(room_name))
+            if members:
+                return {int(user_id) for user_id in members}
+
+        user_ids = RoomMembership._participant_ids(room_name)
+        if client is not None and user_ids:
+            RoomMembership._store(client, room_name, user_ids)
+        return user_ids
@@ -116,24 +116,47 @@ class LastSeenService:
         return f"Active {days} day{'s' if days > 1 else ''} ago"
 
     @staticmethod
-    def mark_room_as_seen(user_id, room_name):
+    def mark_room_as_seen(user_id, room_name, defer=False):
         """
         Mark that user has seen the room (to calculate unread messages)
         Saves to both database (persistent) and cache (fast access)
+
+        Args:
+            defer: Queue the RoomLastSeen write for the next batch flush
+                (see seen_state.py) instead of writing it now
+
+        Returns:
+            The seen time (timezone-aware)
         """
+        from .conversations import ConversationService
         from .models import RoomLastSeen
+        from .write_behind import message_writer, write_behind_enabled
         
         now = timezone.now()
+
+        # The unread counter is reset now, or by the write-behind writer
+        # right after the room's queued (already delivered) messages; either
+        # way messages arriving after this point are counted again
+        if not (
+            write_behind_enabled()
+            and message_writer.reset_seen_after_pending(user_id, room_name)
+        ):
+            ConversationService.mark_seen(user_id, room_name)
         
-        # Save to database (persistent)
-        RoomLastSeen.objects.update_or_create(
-            user_id=user_id,
-            room=room_name,
-            defaults={'seen_at': now}
-        )
+        if defer:
+            from .seen_state import room_seen_buffer
+            room_seen_buffer.add(user_id, room_name, now)
+        else:
+            # Save to database (persistent)
+            RoomLastSeen.objects.update_or_create(
+                user_id=user_id,
+                room=room_name,
+                defaults={'seen_at': now}
+            )
         
         # Also cache for fast access
         cache.set(f"room_seen:{user_id}:{room_name}", now.isoformat(), timeout=86400)
+        return now
 
     @staticmethod
     def get_room_last_seen(user_id, room_name):
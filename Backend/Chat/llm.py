@@ -0,0 +1,225 @@
+"""
+Pluggable LLM clients for the chatbot.
+
+CHATBOT_LLM_BACKEND selects the client:
+- "gemini" (default): Google Gemini; the GenerativeModel is created once
+  per process and reused for every call (streamed with stream=True)
+- "stub": deterministic local client for tests and benchmarks; no network,
+  no API quota
+
+Responses are memoized in a process-local TTL + LRU cache (ResponseCache),
+keyed on the normalized question plus whatever else determines the answer
+(e.g. the retrieved tour ids), so repeated questions return instantly.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .retrieval import fold
+
+
+# Default TTL of cached responses, in seconds (1 hour)
+DEFAULT_LLM_CACHE_TTL = 3600
+
+# Default number of cached responses per process
+DEFAULT_LLM_CACHE_SIZE = 512
+
+DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
+
+
+def normalize_query(text):
+    """Cache form of a question: folded, lowercase, single spaces."""
+    return " ".join(fold(text).split())
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache"""
+
+    def __init__(self, max_size=DEFAULT_LLM_CACHE_SIZE, ttl=DEFAULT_LLM_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LLMClient:
+    """
+    Base client. generate() receives the full prompt plus the task name and
+    the structured inputs it was built from, so local backends don't have
+    to parse prompts.
+    """
+    name = "base"
+
+    @property
+    def available(self):
+        return True
+
+    def generate(self, prompt, task, **inputs):
+        raise NotImplementedError
+
+    def stream(self, prompt, task, **inputs):
+        """Yield the response in chunks (default: one chunk)."""
+        yield self.generate(prompt, task, **inputs)
+
+
+class GeminiClient(LLMClient):
+    name = "gemini"
+
+    def __init__(self, api_key=None, model_name=DEFAULT_GEMINI_MODEL):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt, task, **inputs):
+        return self._get_model().generate_content(prompt).text
+
+    def stream(self, prompt, task, **inputs):
+        for chunk in self._get_model().generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+_PRICE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(k|nghin|ngan|tr|trieu|m|million)\b")
+_PEOPLE_RE = re.compile(r"(\d+)\s*(people|persons|person|pax|nguoi|guests)\b")
+_MAX_PRICE_WORDS = ("under", "below", "less than", "max", "duoi", "toi da", "khong qua")
+_MIN_PRICE_WORDS = ("over", "above", "more than", "min", "tren", "tu")
+
+
+def _mentions(text, words):
+    return any(re.search(rf"\b{re.escape(word)}\b", text) for word in words)
+
+
+class StubClient(LLMClient):
+    """Deterministic client: rule-based extraction and a templated answer"""
+    name = "stub"
+
+    def generate(self, prompt, task, **inputs):
+        if task == "extract":
+            return json.dumps(self._extract(inputs.get("query", "")))
+        tours = inputs.get("tours") or []
+        if not tours:
+            return "I couldn't find a tour matching your request."
+        lines = ["Here are the tours I found:"]
+        for tour in tours:
+            lines.append(f"- {tour.name} (http://localhost:5173/tour/{tour.id})")
+        return "\n".join(lines)
+
+    def stream(self, prompt, task, **inputs):
+        # Word by word, like a model streaming tokens
+        for chunk in re.findall(r"\S+\s*|\s+", self.generate(prompt, task, **inputs)):
+            yield chunk
+
+    def _extract(self, query):
+        from .ai_service import KNOWN_TAGS
+
+        folded = normalize_query(query)
+        params = {
+            "keywords": [query],
+            "tags": [tag for tag in KNOWN_TAGS if fold(tag) in folded],
+            "min_price": None,
+            "max_price": None,
+            "num_people": None,
+            "guide_names": [],
+        }
+        price = _PRICE_RE.search(folded)
+        if price:
+            amount = float(price.group(1).replace(",", "."))
+            multiplier = 1000 if price.group(2) in ("k", "nghin", "ngan") else 1000000
+            # Words right before the amount decide the bound (default: maximum)
+            before = folded[max(price.start() - 20, 0): price.start()]
+            is_min = _mentions(before, _MIN_PRICE_WORDS) and not _mentions(before, _MAX_PRICE_WORDS)
+            params["min_price" if is_min else "max_price"] = int(amount * multiplier)
+        people = _PEOPLE_RE.search(folded)
+        if people:
+            params["num_people"] = int(people.group(1))
+        return params
+
+
+_client = None
+_client_lock = threading.Lock()
+_response_cache = None
+
+
+def get_llm_client():
+    """The process-wide client selected by CHATBOT_LLM_BACKEND."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend = getattr(settings, "CHATBOT_LLM_BACKEND", "gemini")
+                if backend == "stub":
+                    _client = StubClient()
+                elif backend == "gemini":
+                    # The user needs to set GEMINI_API_KEY in their .env
+                    _client = GeminiClient(
+                        api_key=os.getenv("GEMINI_API_KEY"),
+                        model_name=getattr(settings, "CHATBOT_GEMINI_MODEL", DEFAULT_GEMINI_MODEL),
+                    )
+                else:
+                    raise ValueError(f"Unknown CHATBOT_LLM_BACKEND: {backend}")
+    return _client
+
+
+def get_response_cache():
+    """The process-wide response cache."""
+    global _response_cache
+    if _response_cache is None:
+        with _client_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    max_size=getattr(settings, "CHATBOT_LLM_CACHE_SIZE", DEFAULT_LLM_CACHE_SIZE),
+                    ttl=getattr(settings, "CHATBOT_LLM_CACHE_TTL", DEFAULT_LLM_CACHE_TTL),
+                )
+    return _response_cache
+
+
+def reset_llm_client():
+    """Drop the client and cached responses (after changing the settings)."""
+    global _client, _response_cache
+    with _client_lock:
+        _client = None
+        _response_cache = None
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from Chat.archive import archive_after_days, archive_messages
+
+
+class Command(BaseCommand):
+    help = 'Move chat messages older than CHAT_ARCHIVE_AFTER_DAYS into compressed archive blocks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Archive messages older than this many days (default: CHAT_ARCHIVE_AFTER_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else archive_after_days()
+
+        def progress(room, count):
+            self.stdout.write(f'  {room}: {count} messages archived')
+
+        archived, blocks = archive_messages(days=days, progress=progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Archived {archived} messages older than {days} days into {blocks} blocks'
+            )
+        )
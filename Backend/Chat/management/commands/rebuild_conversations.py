@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from Chat.conversations import ConversationService
+from Chat.response_time import rebuild_response_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild conversations, participants and guide response stats from the message table'
+
+    def handle(self, *args, **options):
+        count = ConversationService.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {count} conversations')
+        )
+        stats = rebuild_response_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt response stats for {stats} guide rooms')
+        )
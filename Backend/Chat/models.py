@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 # Create your models here.
@@ -7,15 +8,111 @@ class Message(models.Model):
     room = models.CharField(max_length=255, db_index=True)
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='messages')
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so write-behind messages keep the
+    # timestamp they were broadcast with (see write_behind.py)
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # History pages: WHERE room = ? ORDER BY created_at, id
+            models.Index(fields=['room', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.room} | {self.sender} | {self.created_at}"
 
 
+class MessageIdAllocator(models.Model):
+    """
+    Hands out blocks of Message ids to write-behind writers, so a message
+    has its final id before it is inserted.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_id = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: next {self.next_id}"
+
+
+class MessageArchiveBlock(models.Model):
+    """
+    Messages of a room older than the hot window, moved out of Message by
+    the archive_messages command: a zlib-compressed JSON list of
+    [id, sender_id, content, created_at] records, oldest first (see archive.py).
+    """
+    room = models.CharField(max_length=255)
+    first_message_at = models.DateTimeField()
+    last_message_at = models.DateTimeField()
+    min_message_id = models.BigIntegerField()
+    max_message_id = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Paging back past the hot window: WHERE room = ? ORDER BY last_message_at
+            models.Index(fields=['room', 'last_message_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.room} | {self.message_count} messages until {self.last_message_at}"
+
+
+class Conversation(models.Model):
+    """
+    One row per chat room, with a pointer to its latest message.
+    Maintained on every message insert (see conversations.py).
+    """
+    room = models.CharField(max_length=255, unique=True)
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Set once some of the room's messages are moved to the archive (archive.py)
+    has_archive = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.room
+
+
+class ConversationParticipant(models.Model):
+    """
+    Membership of a user in a conversation.
+    last_message_at is copied from the conversation so a user's inbox is a
+    single (user, last_message_at) index range scan.
+    """
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='participants'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_memberships'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Messages from other participants since the user last saw the room
+    unread_count = models.PositiveIntegerField(default=0)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['conversation', 'user']
+        indexes = [
+            models.Index(fields=['user', '-last_message_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation}"
+
+
 class RoomLastSeen(models.Model):
     """
     Track when a user last saw messages in a room.
@@ -27,7 +124,8 @@ class RoomLastSeen(models.Model):
         related_name='room_last_seen'
     )
     room = models.CharField(max_length=255, db_index=True)
-    seen_at = models.DateTimeField(auto_now=True)
+    # Set explicitly: batched writes keep the time the room was seen
+    seen_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         unique_together = ['user', 'room']
@@ -39,6 +137,54 @@ class RoomLastSeen(models.Model):
         return f"{self.user} saw {self.room} at {self.seen_at}"
 
 
+class RoomResponseStat(models.Model):
+    """
+    First response of a guide in a room: the first message from someone else
+    and the guide's first reply after it. Filled in as messages are inserted.
+    """
+    room = models.CharField(max_length=255)
+    guide = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='room_response_stats'
+    )
+    first_message_at = models.DateTimeField()
+    first_reply_at = models.DateTimeField(null=True, blank=True)
+    # Null until answered, or when the reply falls outside the counted range
+    response_seconds = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['room', 'guide']
+
+    def __str__(self):
+        return f"{self.guide} in {self.room}"
+
+
+class GuideResponseStat(models.Model):
+    """
+    Running sum and count of a guide's first response times, so the
+    average is a single row read.
+    """
+    guide = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='response_stat'
+    )
+    total_seconds = models.FloatField(default=0)
+    response_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average_seconds(self):
+        if not self.response_count:
+            return None
+        return self.total_seconds / self.response_count
+
+    def __str__(self):
+        return f"{self.guide}: {self.response_count} responses"
+
+
 class Call(models.Model):
     """Model to store call history and manage active calls"""
     
@@ -101,4 +247,31 @@ class Call(models.Model):
             delta = self.ended_at - self.answered_at
             self.duration = int(delta.total_seconds())
             return self.duration
-        return None
\ No newline at end of file
+        return None
+
+class CallMonthlyStats(models.Model):
+    """
+    Monthly call totals per user, rolled up from Call rows removed by the
+    retention job so call history stats survive the raw rows.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='call_monthly_stats'
+    )
+    month = models.DateField()  # First day of the month
+    calls_made = models.PositiveIntegerField(default=0)
+    calls_received = models.PositiveIntegerField(default=0)
+    answered_calls = models.PositiveIntegerField(default=0)
+    total_duration = models.PositiveBigIntegerField(default=0)  # Seconds
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month'], name='unique_call_monthly_stats'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} calls in {self.month:%Y-%m}"
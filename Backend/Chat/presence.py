@@ -0,0 +1,157 @@
+"""
+Presence of users across all their open app connections.
+
+Each NotificationConsumer connection is tracked by its channel name in a
+per-user set, with its own expiry extended by that connection's heartbeats:
+a Redis sorted set scored by expiry time with RedisCache, a dict of channel
+name -> expiry in the cache otherwise. Connect, heartbeat and disconnect
+only touch their own member and recount the live ones, so closing one tab
+does not mark the user offline while another is still open, and a
+connection that died without disconnecting drops out on its own. The
+`user_online:<id>` key is kept as the online flag, so lookups stay a single
+cache get (or one get_many for a list of users).
+
+When a user comes online or goes offline, a presence event is pushed to the
+notification sockets of the users sharing a conversation with them, so
+clients don't need to poll the status endpoints.
+"""
+import time
+from django.core.cache import cache
+from .fanout import group_send_many, redis_client
+from .models import ConversationParticipant
+
+
+# Online flag and each connection expire unless refreshed by a heartbeat
+PRESENCE_TIMEOUT = 300
+
+# Users per bulk presence lookup
+MAX_PRESENCE_LOOKUP = 200
+
+
+class PresenceService:
+    """Service to track and query online status"""
+
+    @staticmethod
+    def _online_key(user_id):
+        return f"user_online:{user_id}"
+
+    @staticmethod
+    def _connections_key(user_id):
+        return f"presence_connections:{user_id}"
+
+    @staticmethod
+    def _update_connections(user_id, channel_name, connected):
+        """
+        Add (or extend) or remove one connection of a user.
+
+        Returns:
+            Number of the user's live connections afterwards
+        """
+        key = PresenceService._connections_key(user_id)
+        now = time.time()
+        client = redis_client()
+        if client is not None:
+            key = cache.make_and_validate_key(key)
+            pipe = client.pipeline()
+            pipe.zremrangebyscore(key, "-inf", now)
+            if connected:
+                pipe.zadd(key, {channel_name: now + PRESENCE_TIMEOUT})
+            else:
+                pipe.zrem(key, channel_name)
+            pipe.zcard(key)
+            pipe.expire(key, PRESENCE_TIMEOUT)
+            return pipe.execute()[-2]
+
+        connections = {
+            name: expires_at
+            for name, expires_at in (cache.get(key) or {}).items()
+            if expires_at > now
+        }
+        if connected:
+            connections[channel_name] = now + PRESENCE_TIMEOUT
+        else:
+            connections.pop(channel_name, None)
+        cache.set(key, connections, timeout=PRESENCE_TIMEOUT)
+        return len(connections)
+
+    @staticmethod
+    def connect(user_id, channel_name):
+        """
+        Register a new connection of a user.
+
+        Returns:
+            True if the user just came online (first open connection)
+        """
+        connections = PresenceService._update_connections(user_id, channel_name, True)
+        was_online = cache.get(PresenceService._online_key(user_id), False)
+        cache.set(PresenceService._online_key(user_id), True, timeout=PRESENCE_TIMEOUT)
+        return connections == 1 or not was_online
+
+    @staticmethod
+    def disconnect(user_id, channel_name):
+        """
+        Unregister a connection of a user.
+
+        Returns:
+            True if it was the user's last connection (user went offline)
+        """
+        if PresenceService._update_connections(user_id, channel_name, False) > 0:
+            return False
+        cache.delete_many(
+            [PresenceService._connections_key(user_id), PresenceService._online_key(user_id)]
+        )
+        return True
+
+    @staticmethod
+    def refresh(user_id, channel_name):
+        """Extend the online flag and this connection on a heartbeat."""
+        PresenceService._update_connections(user_id, channel_name, True)
+        cache.set(PresenceService._online_key(user_id), True, timeout=PRESENCE_TIMEOUT)
+
+    @staticmethod
+    def is_online(user_id):
+        if not user_id:
+            return False
+        return bool(cache.get(PresenceService._online_key(user_id), False))
+
+    @staticmethod
+    def get_many(user_ids):
+        """
+        Online status of several users with one cache round trip.
+
+        Returns:
+            Dict of user id (as given) -> bool
+        """
+        keys = {PresenceService._online_key(user_id): user_id for user_id in user_ids}
+        found = cache.get_many(list(keys))
+        return {user_id: bool(found.get(key, False)) for key, user_id in keys.items()}
+
+    @staticmethod
+    def get_contact_ids(user_id):
+        """Ids of the users sharing at least one conversation with the user."""
+        return set(
+            ConversationParticipant.objects.filter(
+                conversation__participants__user_id=user_id
+            )
+            .exclude(user_id=user_id)
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+
+
+def presence_payload(user_id, username, is_online):
+    return {
+        "type": "presence",
+        "user_id": user_id,
+        "username": username,
+        "is_online": is_online,
+    }
+
+
+async def push_presence_change(channel_layer, contact_ids, payload):
+    """Send a presence event to the notification socket of each contact."""
+    await group_send_many(
+        channel_layer,
+        [f"notify_user_{contact_id}" for contact_id in contact_ids],
+        {"type": "chat.notification", "payload": payload},
+    )
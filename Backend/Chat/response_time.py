@@ -1,20 +1,36 @@
 """
-Utility module to calculate guide's average first response time.
-Calculates the average time a guide takes to respond to the FIRST message 
-from a tourist in each conversation room.
+Utility module for guide's average first response time.
+The first response time in a room is the time between the first message
+from someone else and the guide's first reply after it.
+
+Stats are maintained as messages are inserted: RoomResponseStat keeps the
+first message / first reply per (room, guide) and GuideResponseStat keeps a
+running sum and count per guide, so reading the average is one row lookup
+and never needs invalidating. rebuild_response_stats() recomputes both from
+the message table and the message archive; it runs after migrate while no
+stats exist yet, so history from before the stats counts too. Guides
+without a GuideResponseStat row fall back to the scan over their rooms
+(cached for an hour).
 """
 from django.core.cache import cache
-from django.db.models import Min
-from .models import Message
+from django.db import transaction
+from django.db.models import F
+from .models import GuideResponseStat, Message, RoomResponseStat
+
+
+# Responses slower than this (7 days) are ignored
+MAX_RESPONSE_SECONDS = 604800
 
+# Cache timeout for the response tracking state of a room: 24 hours
+ROOM_RESPONSE_STATE_CACHE_TIMEOUT = 86400
 
-# Cache timeout: 1 hour (response time doesn't change frequently)
+# Cache timeout for response times computed without stats: 1 hour
 RESPONSE_TIME_CACHE_TIMEOUT = 3600
 
 
 def get_guide_first_response_time(guide_id: int) -> str | None:
     """
-    Get the cached or calculated average first response time for a guide.
+    Get the average first response time for a guide.
     
     Args:
         guide_id: The ID of the guide user
@@ -22,122 +38,332 @@ def get_guide_first_response_time(guide_id: int) -> str | None:
     Returns:
         Formatted response time string or None if no data available
     """
-    cache_key = f"guide_response_time:{guide_id}"
-    cached = cache.get(cache_key)
-    
-    if cached is not None:
-        return cached if cached != "" else None
-    
-    # Calculate and cache
-    response_time = _calculate_guide_first_response_time(guide_id)
-    
-    # Cache empty string for None to distinguish from cache miss
-    cache.set(cache_key, response_time or "", timeout=RESPONSE_TIME_CACHE_TIMEOUT)
-    
-    return response_time
+    return get_guide_first_response_times([guide_id]).get(guide_id)
 
 
-def _calculate_guide_first_response_time(guide_id: int) -> str | None:
+def get_guide_first_response_times(guide_ids) -> dict:
     """
-    Calculate the average time a guide takes to respond to the first message
-    from tourists across all conversation rooms.
-    
-    Algorithm:
-    1. Find all rooms where guide has sent messages
-    2. For each room, find the first message from a tourist
-    3. Find the guide's first reply after that tourist message
-    4. Calculate the response time for each room
-    5. Return the average
+    Get the average first response time of several guides in one query
+    (plus one cache read for guides without stats).
     
     Args:
-        guide_id: The ID of the guide user
+        guide_ids: IDs of the guide users
         
     Returns:
-        Formatted response time string or None if no data available
+        Dict of guide ID -> formatted response time (guides without data omitted)
     """
-    # Get all unique rooms where the guide has sent messages
-    guide_rooms = (
-        Message.objects
-        .filter(sender_id=guide_id)
-        .values_list('room', flat=True)
+    guide_ids = set(guide_ids)
+    stats = GuideResponseStat.objects.filter(guide_id__in=guide_ids)
+    response_times = {
+        stat.guide_id: _format_response_time(stat.average_seconds)
+        for stat in stats
+        if stat.response_count > 0
+    }
+    missing = guide_ids - {stat.guide_id for stat in stats}
+    if missing:
+        keys = {_fallback_cache_key(guide_id): guide_id for guide_id in missing}
+        cached = cache.get_many(list(keys))
+        computed = {}
+        for key, guide_id in keys.items():
+            if key in cached:
+                response_time = cached[key]
+            else:
+                response_time = _calculate_guide_first_response_time(guide_id) or ""
+                computed[key] = response_time
+            # Empty string caches "no data", to tell it apart from a miss
+            if response_time:
+                response_times[guide_id] = response_time
+        if computed:
+            cache.set_many(computed, timeout=RESPONSE_TIME_CACHE_TIMEOUT)
+    return response_times
+
+
+def _fallback_cache_key(guide_id: int) -> str:
+    return f"guide_response_time:{guide_id}"
+
+
+def _guide_rooms(guide_id: int) -> set:
+    """Rooms the guide participates in or has written in."""
+    from .models import ConversationParticipant
+
+    rooms = set(
+        ConversationParticipant.objects.filter(user_id=guide_id)
+        .values_list("conversation__room", flat=True)
+    )
+    rooms |= set(
+        Message.objects.filter(sender_id=guide_id)
+        .values_list("room", flat=True)
         .distinct()
     )
-    
-    if not guide_rooms:
-        return None
-    
+    return {room for room in rooms if 'chatbot' not in room.lower()}
+
+
+def _calculate_guide_first_response_time(guide_id: int) -> str | None:
+    """
+    Average first response time of a guide computed from the messages of
+    their rooms, for guides the stats don't cover.
+    """
     response_times_seconds = []
-    
-    for room in guide_rooms:
-        response_time = _calculate_room_first_response(room, guide_id)
-        if response_time is not None:
-            response_times_seconds.append(response_time)
-    
+    for room in _guide_rooms(guide_id):
+        first_response = _room_first_response(room, guide_id)
+        if first_response is None or first_response[1] is None:
+            continue
+        delta = (first_response[1] - first_response[0]).total_seconds()
+        if 0 <= delta <= MAX_RESPONSE_SECONDS:
+            response_times_seconds.append(delta)
+
     if not response_times_seconds:
         return None
+    return _format_response_time(sum(response_times_seconds) / len(response_times_seconds))
+
+
+def _room_state_cache_key(room: str) -> str:
+    return f"room_response_state:{room}"
+
+
+def _get_room_state(room: str, member_ids) -> tuple:
+    """
+    Guides of a room and which of them already have a first message or a
+    reply recorded (cached; recomputed when the membership changes).
     
-    # Calculate average
-    avg_seconds = sum(response_times_seconds) / len(response_times_seconds)
+    Returns:
+        (state, True if it was recomputed and needs caching)
+    """
+    from Authentication.models import User as AuthUser
+
+    member_ids = frozenset(member_ids)
+    state = cache.get(_room_state_cache_key(room))
+    if state is not None and state["members"] == member_ids:
+        return state, False
+
+    guide_ids = set(
+        AuthUser.objects.filter(id__in=member_ids, role=AuthUser.ROLE_GUIDE)
+        .values_list("id", flat=True)
+    )
+    seeded, replied = set(), set()
+    for guide_id, first_reply_at in RoomResponseStat.objects.filter(room=room).values_list(
+        "guide_id", "first_reply_at"
+    ):
+        seeded.add(guide_id)
+        if first_reply_at is not None:
+            replied.add(guide_id)
+    state = {"members": member_ids, "guides": guide_ids, "seeded": seeded, "replied": replied}
+    return state, True
+
+
+def _add_response(guide_id: int, seconds: float) -> None:
+    updated = GuideResponseStat.objects.filter(guide_id=guide_id).update(
+        total_seconds=F("total_seconds") + seconds,
+        response_count=F("response_count") + 1,
+    )
+    if not updated:
+        GuideResponseStat.objects.create(
+            guide_id=guide_id, total_seconds=seconds, response_count=1
+        )
+
+
+def record_response_times(messages, conversations) -> None:
+    """
+    Update the response stats with newly inserted messages.
+    Most messages cost only a cache read; a room's first message from
+    someone else and a guide's first reply write one row each.
     
-    return _format_response_time(avg_seconds)
+    Args:
+        messages: Saved Message objects
+        conversations: Dict of room name -> Conversation (from
+            ConversationService.register_messages)
+    """
+    from .conversations import ConversationService
 
+    states = {}
+    changed = set()
+    for message in sorted(messages, key=lambda m: (m.created_at, m.pk)):
+        room = message.room
+        # Skip chatbot rooms
+        if 'chatbot' in room.lower():
+            continue
+        if room not in states:
+            member_ids = ConversationService.get_member_ids(conversations[room])
+            states[room], recomputed = _get_room_state(room, member_ids)
+            if recomputed:
+                changed.add(room)
+        state = states[room]
 
-def _calculate_room_first_response(room: str, guide_id: int) -> float | None:
+        # First message from someone other than the guide
+        waiting = state["guides"] - state["seeded"] - {message.sender_id}
+        if waiting:
+            RoomResponseStat.objects.bulk_create(
+                [
+                    RoomResponseStat(room=room, guide_id=guide_id, first_message_at=message.created_at)
+                    for guide_id in waiting
+                ],
+                ignore_conflicts=True,
+            )
+            state["seeded"] |= waiting
+            changed.add(room)
+
+        # Guide's first reply after it
+        if message.sender_id in state["seeded"] - state["replied"]:
+            stat = RoomResponseStat.objects.filter(
+                room=room,
+                guide_id=message.sender_id,
+                first_reply_at__isnull=True,
+                first_message_at__lt=message.created_at,
+            ).first()
+            if stat is not None:
+                delta = (message.created_at - stat.first_message_at).total_seconds()
+                counted = 0 <= delta <= MAX_RESPONSE_SECONDS
+                # Only the writer that records the reply adds it to the sum
+                updated = RoomResponseStat.objects.filter(
+                    pk=stat.pk, first_reply_at__isnull=True
+                ).update(
+                    first_reply_at=message.created_at,
+                    response_seconds=delta if counted else None,
+                )
+                if updated == 1 and counted:
+                    _add_response(message.sender_id, delta)
+                state["replied"].add(message.sender_id)
+                changed.add(room)
+
+    # Cached only once the rows it describes are committed
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_room_state_cache_key(room): states[room] for room in changed},
+            timeout=ROOM_RESPONSE_STATE_CACHE_TIMEOUT,
+        )
+    )
+
+
+def _room_first_response(room: str, guide_id: int):
     """
-    Calculate the guide's first response time for a specific room.
+    Calculate the guide's first response in a specific room from the
+    archived and hot messages.
     
     Args:
         room: Room name
         guide_id: The ID of the guide user
         
     Returns:
-        Response time in seconds, or None if cannot be calculated
+        (first message time, first reply time or None), or None if nobody
+        else has written in the room
     """
-    # Skip chatbot rooms
-    if 'chatbot' in room.lower():
-        return None
-    
+    from .archive import iter_archived_records
+
+    # Archived messages are older than every message still in the table
+    first_tourist_msg = None
+    for _, sender_id, _, created_at in iter_archived_records(room):
+        if first_tourist_msg is None:
+            if sender_id != guide_id:
+                first_tourist_msg = created_at
+        elif sender_id == guide_id and created_at > first_tourist_msg:
+            return first_tourist_msg, created_at
+
     # Get the first message in this room that is NOT from the guide (tourist's message)
-    first_tourist_msg = (
-        Message.objects
-        .filter(room=room)
-        .exclude(sender_id=guide_id)
-        .order_by('created_at')
-        .values('created_at')
-        .first()
-    )
+    if first_tourist_msg is None:
+        first_tourist_msg = (
+            Message.objects
+            .filter(room=room)
+            .exclude(sender_id=guide_id)
+            .order_by('created_at')
+            .values_list('created_at', flat=True)
+            .first()
+        )
     
     if not first_tourist_msg:
         return None
     
-    tourist_msg_time = first_tourist_msg['created_at']
-    
     # Get the first message from guide AFTER the tourist's first message
     first_guide_reply = (
         Message.objects
         .filter(
             room=room,
             sender_id=guide_id,
-            created_at__gt=tourist_msg_time
+            created_at__gt=first_tourist_msg
         )
         .order_by('created_at')
-        .values('created_at')
+        .values_list('created_at', flat=True)
         .first()
     )
     
-    if not first_guide_reply:
-        return None
-    
-    guide_reply_time = first_guide_reply['created_at']
-    
-    # Calculate response time in seconds
-    delta = (guide_reply_time - tourist_msg_time).total_seconds()
-    
-    # Sanity check: ignore negative or extremely long response times (> 7 days)
-    if delta < 0 or delta > 604800:  # 7 days in seconds
-        return None
+    return first_tourist_msg, first_guide_reply
+
+
+def rebuild_response_stats() -> int:
+    """
+    Recompute RoomResponseStat and GuideResponseStat from the message table
+    and the message archive.
     
-    return delta
+    Returns:
+        Number of (room, guide) pairs with a first message
+    """
+    from Authentication.models import User as AuthUser
+    from .models import ConversationParticipant
+
+    pairs = set(
+        ConversationParticipant.objects.filter(user__role=AuthUser.ROLE_GUIDE)
+        .values_list("conversation__room", "user_id")
+    )
+    pairs |= set(
+        Message.objects.filter(sender__role=AuthUser.ROLE_GUIDE)
+        .values_list("room", "sender_id")
+        .distinct()
+    )
+
+    room_stats = []
+    totals = {}
+    for room, guide_id in pairs:
+        if 'chatbot' in room.lower():
+            continue
+        first_response = _room_first_response(room, guide_id)
+        if first_response is None:
+            continue
+        first_message_at, first_reply_at = first_response
+        seconds = None
+        if first_reply_at is not None:
+            delta = (first_reply_at - first_message_at).total_seconds()
+            if 0 <= delta <= MAX_RESPONSE_SECONDS:
+                seconds = delta
+                total, count = totals.get(guide_id, (0, 0))
+                totals[guide_id] = (total + delta, count + 1)
+        room_stats.append(
+            RoomResponseStat(
+                room=room,
+                guide_id=guide_id,
+                first_message_at=first_message_at,
+                first_reply_at=first_reply_at,
+                response_seconds=seconds,
+            )
+        )
+
+    with transaction.atomic():
+        RoomResponseStat.objects.all().delete()
+        GuideResponseStat.objects.all().delete()
+        RoomResponseStat.objects.bulk_create(room_stats, batch_size=500)
+        GuideResponseStat.objects.bulk_create(
+            [
+                GuideResponseStat(guide_id=guide_id, total_seconds=total, response_count=count)
+                for guide_id, (total, count) in totals.items()
+            ],
+            batch_size=500,
+        )
+
+    cache.delete_many(
+        [_room_state_cache_key(room) for room, _ in pairs]
+        + [_fallback_cache_key(guide_id) for _, guide_id in pairs]
+    )
+    return len(room_stats)
+
+
+def backfill_response_stats(**kwargs):
+    """
+    Build the response stats from the message history after migrate, as
+    long as none exist yet (post_migrate handler).
+    """
+    if RoomResponseStat.objects.exists() or GuideResponseStat.objects.exists():
+        return
+    if not Message.objects.exists():
+        return
+    rebuild_response_stats()
 
 
 def _format_response_time(seconds: float) -> str:
@@ -191,15 +417,3 @@ def _format_response_time(seconds: float) -> str:
         return f"~{round(days)} days"
     else:
         return "More than a week"
-
-
-def invalidate_guide_response_time_cache(guide_id: int) -> None:
-    """
-    Invalidate the cached response time for a guide.
-    Call this when a guide sends a new message.
-    
-    Args:
-        guide_id: The ID of the guide user
-    """
-    cache_key = f"guide_response_time:{guide_id}"
-    cache.delete(cache_key)
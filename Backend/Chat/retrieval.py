@@ -0,0 +1,315 @@
+"""
+In-process retrieval index for chatbot tour matching.
+
+Tours are indexed in memory once per process:
+- BM25 over diacritic-folded text (name counted twice, description, place
+  names / cities / provinces in Vietnamese and English, tags), so "Ha Noi",
+  "Hà Nội" and "hanoi" style queries hit the same terms
+- NumPy tag vectors (KNOWN_TAGS) and place vectors (one column per Place),
+  scored against the query with a single matrix-vector product
+
+Price, group size and guide name are applied as post-filters on the ranked
+candidates, so a chatbot query is a few dictionary lookups and array
+operations instead of a multi-join icontains scan.
+
+Tour, TourPlace, Place and Guide changes are logged in the shared cache by the
+signals in signals.py; each process replays the log before its next query
+and reindexes only the changed tours (or rebuilds when the log is gone).
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from Tour.models import Place, Tour
+
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Score added per matching tag and per matching place
+TAG_WEIGHT = 1.5
+PLACE_WEIGHT = 2.0
+
+# Changes replayed incrementally before falling back to a full rebuild
+MAX_INCREMENTAL_CHANGES = 200
+
+# How long change log entries are kept: 24 hours
+INDEX_CHANGE_TIMEOUT = 86400
+
+INDEX_GENERATION_KEY = "tour_index_generation"
+
+# Marker for changes that need a full rebuild (e.g. a renamed place)
+FULL_REBUILD = "all"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text):
+    """Lowercase and strip Vietnamese diacritics ("Đà Nẵng" -> "da nang")."""
+    text = (text or "").replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _as_number(value):
+    """Numeric filter value from LLM output (ints, floats or numeric strings)."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _place_text(place):
+    return " ".join(
+        [place.name, place.name_en, place.city, place.city_en, place.province, place.province_en]
+    )
+
+
+class _TourDocument:
+    """Indexed fields of one tour"""
+
+    __slots__ = ("tour_id", "terms", "length", "tags", "place_ids", "price",
+                 "min_people", "max_people", "guide_name", "rating")
+
+    def __init__(self, tour, known_tags):
+        places = list(tour.places.all())
+        tags = [str(tag) for tag in tour.tags or []]
+        text = " ".join(
+            [tour.name, tour.name, tour.description]
+            + [_place_text(place) for place in places]
+            + tags
+        )
+        tokens = tokenize(text)
+        self.tour_id = tour.id
+        self.terms = Counter(tokens)
+        self.length = len(tokens)
+        folded_tags = {fold(tag) for tag in tags}
+        self.tags = np.array([1.0 if tag in folded_tags else 0.0 for tag in known_tags])
+        self.place_ids = {place.id for place in places}
+        self.price = tour.price
+        self.min_people = tour.min_people
+        self.max_people = tour.max_people
+        self.guide_name = fold(tour.guide.name) if tour.guide else ""
+        self.rating = tour.average_rating()
+
+
+class TourIndex:
+    """BM25 + tag/place vector index over all tours"""
+
+    def __init__(self, known_tags):
+        self.known_tags = [fold(tag) for tag in known_tags]
+        self.generation = None
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.documents = {}
+        self.postings = defaultdict(dict)
+        self.places = {}
+        self._total_length = 0
+        self._arrays = None
+
+    # ==================== Building ====================
+
+    @staticmethod
+    def _tour_queryset():
+        return Tour.objects.select_related("guide").prefetch_related("places")
+
+    def _add(self, document):
+        self.documents[document.tour_id] = document
+        self._total_length += document.length
+        for term, count in document.terms.items():
+            self.postings[term][document.tour_id] = count
+
+    def _remove(self, tour_id):
+        document = self.documents.pop(tour_id, None)
+        if document is None:
+            return
+        self._total_length -= document.length
+        for term in document.terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(tour_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def _load_places(self):
+        self.places = {
+            place.id: fold(_place_text(place)) for place in Place.objects.all()
+        }
+
+    def rebuild(self, generation):
+        self._clear()
+        self._load_places()
+        for tour in self._tour_queryset().iterator(chunk_size=500):
+            self._add(_TourDocument(tour, self.known_tags))
+        self.generation = generation
+
+    def reindex(self, tour_ids, generation):
+        """Reindex changed tours (deleted tours are dropped)."""
+        for tour_id in tour_ids:
+            self._remove(tour_id)
+        for tour in self._tour_queryset().filter(id__in=tour_ids):
+            self._add(_TourDocument(tour, self.known_tags))
+        self._load_places()
+        self._arrays = None
+        self.generation = generation
+
+    def refresh(self):
+        """Catch up with the change log before a query."""
+        with self._lock:
+            current = cache.get(INDEX_GENERATION_KEY, 0)
+            if self.generation is not None and current == self.generation:
+                return
+
+            if self.generation is None or current < self.generation or (
+                current - self.generation > MAX_INCREMENTAL_CHANGES
+            ):
+                self.rebuild(current)
+                return
+
+            keys = [f"tour_index_change:{gen}" for gen in range(self.generation + 1, current + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys) or FULL_REBUILD in changes.values():
+                # Part of the log expired
+                self.rebuild(current)
+                return
+            self.reindex(set(changes.values()), current)
+
+    def _get_arrays(self):
+        """Tour ids and their tag / place matrices, aligned by row."""
+        if self._arrays is None:
+            tour_ids = list(self.documents)
+            place_columns = {place_id: i for i, place_id in enumerate(self.places)}
+            tag_matrix = np.zeros((len(tour_ids), len(self.known_tags)))
+            place_matrix = np.zeros((len(tour_ids), len(place_columns)))
+            for row, tour_id in enumerate(tour_ids):
+                document = self.documents[tour_id]
+                tag_matrix[row] = document.tags
+                for place_id in document.place_ids:
+                    if place_id in place_columns:
+                        place_matrix[row, place_columns[place_id]] = 1.0
+            self._arrays = (tour_ids, {t: i for i, t in enumerate(tour_ids)},
+                            tag_matrix, place_columns, place_matrix)
+        return self._arrays
+
+    # ==================== Querying ====================
+
+    def _bm25(self, terms, row_of, scores):
+        count = len(self.documents)
+        average_length = self._total_length / count if count else 0
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for tour_id, frequency in postings.items():
+                length = self.documents[tour_id].length
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (average_length or 1))
+                scores[row_of[tour_id]] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    def search(self, keywords=(), tags=(), min_price=None, max_price=None,
+               num_people=None, guide_names=(), limit=5):
+        """
+        Rank tours for the extracted search parameters.
+
+        Returns:
+            List of tour ids, best match first
+        """
+        min_price, max_price, num_people = (
+            _as_number(min_price), _as_number(max_price), _as_number(num_people)
+        )
+        self.refresh()
+        with self._lock:
+            tour_ids, row_of, tag_matrix, place_columns, place_matrix = self._get_arrays()
+            if not tour_ids:
+                return []
+
+            scores = np.zeros(len(tour_ids))
+            terms = [term for keyword in keywords for term in tokenize(keyword)]
+            self._bm25(terms, row_of, scores)
+
+            query_tags = {fold(tag) for tag in tags}
+            if query_tags:
+                tag_vector = np.array([1.0 if tag in query_tags else 0.0 for tag in self.known_tags])
+                scores += TAG_WEIGHT * (tag_matrix @ tag_vector)
+
+            phrases = [" ".join(tokenize(keyword)) for keyword in keywords]
+            phrases = [phrase for phrase in phrases if phrase]
+            if phrases and place_columns:
+                place_vector = np.zeros(len(place_columns))
+                for place_id, text in self.places.items():
+                    if any(phrase in text for phrase in phrases):
+                        place_vector[place_columns[place_id]] = 1.0
+                if place_vector.any():
+                    scores += PLACE_WEIGHT * (place_matrix @ place_vector)
+
+            # Without text or tags every tour is a candidate (filters only)
+            candidates = np.flatnonzero(scores > 0) if (terms or query_tags) else np.arange(len(tour_ids))
+
+            guide_names = [fold(name) for name in guide_names or [] if name]
+            results = []
+            for row in candidates:
+                document = self.documents[tour_ids[row]]
+                if min_price is not None and document.price < min_price:
+                    continue
+                if max_price is not None and document.price > max_price:
+                    continue
+                if num_people is not None and not (
+                    document.min_people <= num_people <= document.max_people
+                ):
+                    continue
+                if guide_names and not any(name in document.guide_name for name in guide_names):
+                    continue
+                results.append((-scores[row], -document.rating, document.tour_id))
+
+        results.sort()
+        return [tour_id for _, _, tour_id in results[:limit]]
+
+
+def mark_tours_changed(tour_ids):
+    """
+    Log changed tours (or FULL_REBUILD) for every process's index, once the
+    current transaction commits.
+    """
+    tour_ids = list(tour_ids)
+    if not tour_ids:
+        return
+
+    def log_changes():
+        cache.add(INDEX_GENERATION_KEY, 0, timeout=None)
+        changes = {}
+        for tour_id in tour_ids:
+            generation = cache.incr(INDEX_GENERATION_KEY)
+            changes[f"tour_index_change:{generation}"] = tour_id
+        cache.set_many(changes, timeout=INDEX_CHANGE_TIMEOUT)
+
+    transaction.on_commit(log_changes)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_tour_index():
+    """The process-wide tour index (built on first use)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from .ai_service import KNOWN_TAGS
+                _index = TourIndex(KNOWN_TAGS)
+    return _index
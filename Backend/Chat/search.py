@@ -0,0 +1,237 @@
+"""
+Full-text search over chat messages.
+
+On SQLite, Message.content is indexed by an FTS5 table (MESSAGE_FTS_TABLE)
+using the message table as external content: triggers keep it in sync with
+every insert, update and delete (including write-behind bulk_create), so the
+index stores no second copy of the text. The table and triggers are created
+after migrate (see ChatConfig.ready) and filled on first creation.
+
+Diacritics are removed by the tokenizer, so "ha noi" finds "Hà Nội". Other
+databases, or SQLite builds without FTS5, fall back to an icontains scan
+with the same response shape.
+
+Results are limited to the rooms the user participates in, newest first,
+and paged with the same before_id cursor as the message history.
+"""
+import html
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import ConversationParticipant, Message
+
+logger = logging.getLogger(__name__)
+
+
+MESSAGE_FTS_TABLE = "chat_message_fts"
+
+# Tokens of context on each side of a match in a snippet
+SNIPPET_TOKENS = 12
+
+# Characters of context on each side of a match in fallback snippets
+FALLBACK_SNIPPET_CHARS = 60
+
+# Query terms used at most
+MAX_QUERY_TERMS = 8
+
+# Highlight markers (private use characters) inside snippet() output,
+# replaced by <mark> tags after the snippet is HTML-escaped
+_MARK_START = "\ue000"
+_MARK_END = "\ue001"
+_ELLIPSIS = "…"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_available = None
+
+
+def query_terms(text):
+    return _TERM_RE.findall(text or "")[:MAX_QUERY_TERMS]
+
+
+def _match_expression(terms):
+    """
+    FTS5 query for the user's terms: all terms must match, the last one as
+    a prefix (search as you type). Terms are quoted, so user input never
+    reaches the FTS5 query syntax.
+    """
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _highlight(snippet):
+    """Escape a marked snippet and turn the markers into <mark> tags."""
+    return (
+        html.escape(snippet)
+        .replace(_MARK_START, "<mark>")
+        .replace(_MARK_END, "</mark>")
+    )
+
+
+def ensure_message_search_index(using="default", **kwargs):
+    """
+    Create the FTS5 table and its sync triggers if missing (post_migrate
+    handler). A new table is filled from the existing messages.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    table = Message._meta.db_table
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [MESSAGE_FTS_TABLE],
+            )
+            exists = cursor.fetchone() is not None
+            if not exists:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {MESSAGE_FTS_TABLE} USING fts5("
+                    f"content, content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {MESSAGE_FTS_TABLE}_ai "
+                f"AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); "
+                f"END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {MESSAGE_FTS_TABLE}_ad "
+                f"AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS_TABLE}({MESSAGE_FTS_TABLE}, rowid, content) "
+                f"VALUES ('delete', old.id, old.content); "
+                f"END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {MESSAGE_FTS_TABLE}_au "
+                f"AFTER UPDATE OF content ON {table} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS_TABLE}({MESSAGE_FTS_TABLE}, rowid, content) "
+                f"VALUES ('delete', old.id, old.content); "
+                f"INSERT INTO {MESSAGE_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); "
+                f"END"
+            )
+            if not exists:
+                cursor.execute(
+                    f"INSERT INTO {MESSAGE_FTS_TABLE}({MESSAGE_FTS_TABLE}) VALUES ('rebuild')"
+                )
+    except DatabaseError:
+        # SQLite compiled without FTS5: searches use the fallback
+        logger.warning("FTS5 is not available; message search falls back to icontains")
+
+
+def fts_available():
+    """Whether the FTS5 message index exists on the default database."""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != "sqlite":
+            _fts_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [MESSAGE_FTS_TABLE],
+                )
+                _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def _user_rooms(user, room=None):
+    rooms = ConversationParticipant.objects.filter(user=user)
+    if room is not None:
+        rooms = rooms.filter(conversation__room=room)
+    return rooms.values("conversation__room")
+
+
+def _fts_matches(user, room, terms, anchor, limit):
+    """[(message id, highlighted snippet)] from the FTS5 index"""
+    table = Message._meta.db_table
+    rooms_sql, rooms_params = _user_rooms(user, room).query.sql_with_params()
+    sql = (
+        f"SELECT m.id, snippet({MESSAGE_FTS_TABLE}, 0, %s, %s, %s, %s) "
+        f"FROM {MESSAGE_FTS_TABLE} JOIN {table} m ON m.id = {MESSAGE_FTS_TABLE}.rowid "
+        f"WHERE {MESSAGE_FTS_TABLE} MATCH %s AND m.room IN ({rooms_sql})"
+    )
+    params = [_MARK_START, _MARK_END, _ELLIPSIS, SNIPPET_TOKENS, _match_expression(terms)]
+    params += list(rooms_params)
+    if anchor is not None:
+        sql += " AND (m.created_at < %s OR (m.created_at = %s AND m.id < %s))"
+        created_at = connection.ops.adapt_datetimefield_value(anchor[0])
+        params += [created_at, created_at, anchor[1]]
+    sql += " ORDER BY m.created_at DESC, m.id DESC LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(message_id, _highlight(snippet)) for message_id, snippet in cursor.fetchall()]
+
+
+def _fallback_snippet(content, terms):
+    folded = content.lower()
+    positions = [folded.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    start = max(min(positions, default=0) - FALLBACK_SNIPPET_CHARS, 0)
+    end = min(max(positions, default=0) + FALLBACK_SNIPPET_CHARS, len(content))
+    pattern = "|".join(
+        re.escape(html.escape(term)) for term in sorted(terms, key=len, reverse=True)
+    )
+    snippet = re.sub(
+        pattern,
+        lambda match: f"<mark>{match.group(0)}</mark>",
+        html.escape(content[start:end]),
+        flags=re.IGNORECASE,
+    )
+    return (_ELLIPSIS if start else "") + snippet + (_ELLIPSIS if end < len(content) else "")
+
+
+def _fallback_matches(user, room, terms, anchor, limit):
+    """[(message id, highlighted snippet)] from an icontains scan"""
+    qs = Message.objects.filter(room__in=_user_rooms(user, room))
+    for term in terms:
+        qs = qs.filter(content__icontains=term)
+    if anchor is not None:
+        qs = qs.filter(
+            Q(created_at__lt=anchor[0]) | Q(created_at=anchor[0], id__lt=anchor[1])
+        )
+    rows = qs.order_by("-created_at", "-id").values_list("id", "content")[:limit]
+    return [(message_id, _fallback_snippet(content, terms)) for message_id, content in rows]
+
+
+def search_messages(user, query, limit, before=None, room=None):
+    """
+    Messages matching the query in the user's rooms, newest first.
+
+    Args:
+        before: (created_at, id) of the previous page's last result
+        room: only search this room (if the user participates in it)
+
+    Returns:
+        (list of Message with a `snippet` attribute, has_more)
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+
+    if fts_available():
+        matches = _fts_matches(user, room, terms, before, limit + 1)
+    else:
+        matches = _fallback_matches(user, room, terms, before, limit + 1)
+    has_more = len(matches) > limit
+    matches = matches[:limit]
+
+    messages = Message.objects.select_related(
+        "sender", "sender__tourist_profile", "sender__guide_profile"
+    ).in_bulk([message_id for message_id, _ in matches])
+    results = []
+    for message_id, snippet in matches:
+        message = messages.get(message_id)
+        if message is not None:
+            message.snippet = snippet
+            results.append(message)
+    return results, has_more
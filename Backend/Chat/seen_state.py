@@ -0,0 +1,123 @@
+"""
+Batched persistence of room seen state.
+
+Marking a room seen resets the unread counter and updates the
+`room_seen:<user>:<room>` cache key right away (readers already check it
+first), and queues the timestamp here. A single task per process writes the
+queue every CHAT_SEEN_FLUSH_INTERVAL seconds with one RoomLastSeen upsert
+for the whole batch, so scrolling through a room no longer costs a
+RoomLastSeen write per event. The queue is also flushed when a chat socket
+disconnects and at interpreter exit.
+
+Counters are not reset here: a message arriving between the mark and the
+flush must stay unread.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import RoomLastSeen
+
+logger = logging.getLogger(__name__)
+
+
+# Default delay between flushes, in seconds
+DEFAULT_SEEN_FLUSH_INTERVAL = 1.0
+
+
+class RoomSeenBuffer:
+    """Latest seen time per (user, room), written to the database in batches"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task = None
+        self._exit_hook = False
+
+    @property
+    def interval(self):
+        return getattr(settings, "CHAT_SEEN_FLUSH_INTERVAL", DEFAULT_SEEN_FLUSH_INTERVAL)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, user_id, room_name, seen_at):
+        """Queue a seen time; later marks of the same room replace it."""
+        with self._lock:
+            self._pending[(user_id, room_name)] = seen_at
+        if not self._exit_hook:
+            self._exit_hook = True
+            atexit.register(self.flush_at_exit)
+
+    def ensure_writer(self):
+        """Start the flush task on the running event loop if needed."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self.pending_count():
+            await asyncio.sleep(self.interval)
+            try:
+                await database_sync_to_async(self.flush)()
+            except Exception:
+                logger.exception("Room seen flush failed; retrying")
+
+    def flush(self):
+        """
+        Write every queued seen time.
+        A failed batch is queued again (newer marks win) and the error is raised.
+
+        Returns:
+            Number of (user, room) pairs written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                with self._lock:
+                    for key, seen_at in batch.items():
+                        self._pending.setdefault(key, seen_at)
+                raise
+        return len(batch)
+
+    async def aflush(self):
+        """flush() from the event loop."""
+        if self.pending_count():
+            await database_sync_to_async(self.flush)()
+
+    def _write(self, batch):
+        RoomLastSeen.objects.bulk_create(
+            [
+                RoomLastSeen(user_id=user_id, room=room_name, seen_at=seen_at)
+                for (user_id, room_name), seen_at in batch.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user", "room"],
+            update_fields=["seen_at"],
+        )
+
+    def flush_at_exit(self):
+        """atexit hook: persist whatever is still queued."""
+        if not self.pending_count():
+            return
+        try:
+            close_old_connections()
+            self.flush()
+        except Exception:
+            logger.exception(
+                "Lost %s room seen updates at shutdown", self.pending_count()
+            )
+
+
+room_seen_buffer = RoomSeenBuffer()
@@ -0,0 +1,56 @@
+# Signals keeping the chatbot tour index (retrieval.py) up to date, and
+# Message ids consistent with the write-behind allocator
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Message
+from .retrieval import FULL_REBUILD, mark_tours_changed
+from Profiles.models import Guide
+from Tour.models import Place, Tour, TourPlace
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_delete, sender=Tour)
+def reindex_tour(sender, instance, **kwargs):
+    mark_tours_changed([instance.pk])
+
+
+@receiver(post_save, sender=TourPlace)
+@receiver(post_delete, sender=TourPlace)
+def reindex_tour_places(sender, instance, **kwargs):
+    mark_tours_changed([instance.tour_id])
+
+
+@receiver(m2m_changed, sender=Tour.places.through)
+def reindex_tour_place_set(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        mark_tours_changed([instance.pk])
+    else:
+        # Tours of a place changed; the place's old tours are unknown on clear
+        mark_tours_changed(pk_set or [FULL_REBUILD])
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def reindex_place(sender, instance, **kwargs):
+    # A renamed place changes the text of every tour visiting it
+    mark_tours_changed([FULL_REBUILD])
+
+
+@receiver(post_save, sender=Guide)
+def reindex_guide_tours(sender, instance, created, update_fields=None, **kwargs):
+    # Only the guide name is indexed
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    mark_tours_changed(instance.tours.values_list("id", flat=True))
+
+
+# With write-behind on, inline inserts take their ids from the allocator too,
+# so they never land in a block reserved by a writer (see write_behind.py)
+@receiver(pre_save, sender=Message)
+def allocate_inline_message_id(sender, instance, raw=False, **kwargs):
+    from .write_behind import message_writer, write_behind_enabled
+
+    if instance.pk is None and not raw and write_behind_enabled():
+        instance.pk = message_writer.reserve_id()
@@ -1,3 +1,117 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from .models import ConversationParticipant, Message
+from .write_behind import (
+    WRITE_BEHIND_MAX_BATCH_FAILURES,
+    MessageWriteBehind,
+    allocate_message_ids,
+    message_writer,
+)
+
+
+class WriteBehindDurabilityTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com", password="x")
+        self.room = "alice__bob"
+        self.writer = MessageWriteBehind()
+
+    def test_queued_messages_are_persisted_on_flush(self):
+        queued = [
+            self.writer.add(self.room, self.alice, "hi"),
+            self.writer.add(self.room, self.alice, "are you there?"),
+            self.writer.add(self.room, self.bob, "yes"),
+        ]
+        self.assertFalse(Message.objects.exists())
+
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(self.writer.pending_count(), 0)
+
+        stored = list(Message.objects.order_by("id"))
+        self.assertEqual([m.id for m in stored], [m.id for m in queued])
+        # Stored timestamps are the ones that were broadcast
+        self.assertEqual([m.created_at for m in stored], [m.created_at for m in queued])
+
+        unread = dict(
+            ConversationParticipant.objects.filter(conversation__room=self.room)
+            .values_list("user_id", "unread_count")
+        )
+        self.assertEqual(unread, {self.alice.id: 1, self.bob.id: 2})
+
+    def test_exit_hook_flushes_pending_messages(self):
+        self.writer.add(self.room, self.alice, "sent just before shutdown")
+        self.writer.flush_at_exit()
+        self.assertEqual(self.writer.pending_count(), 0)
+        self.assertTrue(
+            Message.objects.filter(content="sent just before shutdown").exists()
+        )
+
+    def test_failed_flush_keeps_messages_queued(self):
+        message = self.writer.add(self.room, self.alice, "retry me")
+        with mock.patch.object(
+            Message.objects, "bulk_create", side_effect=RuntimeError("database is locked")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.writer.flush()
+        self.assertEqual(self.writer.pending_count(), 1)
+
+        self.writer.flush()
+        self.assertTrue(Message.objects.filter(pk=message.id).exists())
+
+    def test_id_blocks_start_above_existing_messages(self):
+        existing = Message.objects.create(room=self.room, sender=self.alice, content="old")
+        first = allocate_message_ids(10)
+        second = allocate_message_ids(10)
+        self.assertGreater(first.start, existing.id)
+        self.assertEqual(second.start, first.stop)
+
+    def test_inline_insert_after_flush_does_not_collide(self):
+        queued = self.writer.add(self.room, self.alice, "queued")
+        self.writer.flush()
+        inline = Message.objects.create(room=self.room, sender=self.bob, content="inline")
+        self.assertGreater(inline.id, queued.id)
+
+    def test_repeatedly_failing_batch_drops_only_bad_rows(self):
+        good = self.writer.add(self.room, self.alice, "fine")
+        bad = self.writer.add(self.room, self.bob, "poisoned")
+        original = Message.objects.bulk_create
+
+        def bulk_create(objs, *args, **kwargs):
+            if any(obj.id == bad.id for obj in objs):
+                raise RuntimeError("constraint failed")
+            return original(objs, *args, **kwargs)
+
+        with mock.patch.object(Message.objects, "bulk_create", side_effect=bulk_create):
+            for _ in range(WRITE_BEHIND_MAX_BATCH_FAILURES - 1):
+                with self.assertRaises(RuntimeError):
+                    self.writer.flush()
+            self.assertEqual(self.writer.flush(), 1)
+
+        self.assertEqual(self.writer.pending_count(), 0)
+        self.assertTrue(Message.objects.filter(pk=good.id).exists())
+        self.assertFalse(Message.objects.filter(pk=bad.id).exists())
+
+    @override_settings(CHAT_WRITE_BEHIND=True)
+    def test_inline_insert_takes_an_allocated_id(self):
+        queued = message_writer.add(self.room, self.alice, "reserved block")
+        inline = Message.objects.create(room=self.room, sender=self.bob, content="inline")
+        self.assertEqual(inline.id, queued.id + 1)
+        message_writer.flush()
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_seen_reset_applies_after_queued_messages(self):
+        self.writer.add(self.room, self.alice, "before the mark")
+        self.assertTrue(self.writer.reset_seen_after_pending(self.bob.id, self.room))
+        self.writer.add(self.room, self.alice, "after the mark")
+
+        self.assertEqual(self.writer.flush(), 2)
+        unread = ConversationParticipant.objects.get(
+            user=self.bob, conversation__room=self.room
+        ).unread_count
+        self.assertEqual(unread, 1)
+        # Nothing queued for the room: the caller resets the counter itself
+        self.assertFalse(self.writer.reset_seen_after_pending(self.bob.id, self.room))
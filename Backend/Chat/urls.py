@@ -4,9 +4,11 @@ from . import views
 urlpatterns = [
     # Chat endpoints
     path("conversations/", views.ConversationListView.as_view(), name="chat-conversation-list"),
+    path("search/", views.MessageSearchView.as_view(), name="chat-message-search"),
     path("<str:room_name>/messages/", views.MessageListView.as_view(), name="chat-message-list"),
     path("<str:room_name>/seen/", views.RoomSeenStatusView.as_view(), name="room-seen-status"),
     path("user/<str:user_id>/status/", views.UserOnlineStatusView.as_view(), name="user-online-status"),
+    path("presence/", views.BulkPresenceView.as_view(), name="bulk-presence"),
     path("username/<str:username>/status/", views.UserOnlineStatusByUsernameView.as_view(), name="user-online-status-by-username"),
     
     # Call endpoints
@@ -6,46 +6,193 @@ from django.db.models import Max, Prefetch, Q
 from django.core.cache import cache
 from .models import Message, Call
 from .serializers import MessageSerializer, CallSerializer
-from .response_time import get_guide_first_response_time
+from .response_time import get_guide_first_response_times
+from .conversations import ConversationService
+from .presence import MAX_PRESENCE_LOOKUP, PresenceService
+from .search import search_messages
+from .archive import find_archived_message, get_archived_messages, has_archive
+
+
+# Messages returned per history page
+DEFAULT_MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 200
+
+# Search results returned per page
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
 
 
 class MessageListView(generics.ListAPIView):
+    """
+    Message history of a room, oldest first.
+    GET /chat/{room_name}/messages/
+    Query params:
+    - limit: page size (default 100, max 200)
+    - before_id: only messages older than this message (scrolling back)
+    - after_id: only messages newer than this message (reconnect catch-up)
+    Without a cursor the newest page is returned. Pages running past the
+    oldest message in the Message table continue in the archive (archive.py)
+    for rooms that have one.
+    """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def _parse_id(self, name):
+        value = self.request.query_params.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "Must be a message id"})
+
+    def _anchor(self, room, message_id, name):
+        """
+        (created_at, id) position of the cursor message in the room, and
+        whether the message is archived
+        """
+        created_at = (
+            Message.objects.filter(room=room, pk=message_id)
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        if created_at is not None:
+            return (created_at, message_id), False
+        created_at = None
+        if has_archive(room):
+            created_at = find_archived_message(room, message_id)
+        if created_at is None:
+            raise ValidationError({name: "Message not found in this room"})
+        return (created_at, message_id), True
+
     def get_queryset(self):
         room = self.kwargs.get("room_name") or self.request.query_params.get("room")
         if not room:
             raise ValidationError({"room": "Room name is required"})
 
         limit = self.request.query_params.get("limit")
-        limit_num = 100  # default
+        limit_num = DEFAULT_MESSAGE_PAGE_SIZE
         if limit:
             try:
                 n = int(limit)
                 if n > 0:
-                    limit_num = n
+                    limit_num = min(n, MAX_MESSAGE_PAGE_SIZE)
             except ValueError:
                 pass
 
+        before_id = self._parse_id("before_id")
+        after_id = self._parse_id("after_id")
+        if before_id is not None and after_id is not None:
+            raise ValidationError({"detail": "Use either before_id or after_id, not both"})
+
         # Use select_related to avoid N+1 queries
-        qs = (
-            Message.objects.filter(room=room)
-            .select_related('sender', 'sender__tourist_profile', 'sender__guide_profile')
-            .order_by("-created_at")[:limit_num]
+        qs = Message.objects.filter(room=room).select_related(
+            'sender', 'sender__tourist_profile', 'sender__guide_profile'
         )
 
-        qs_list = list(qs)
+        if after_id is not None:
+            # Oldest messages after the cursor, served straight from the index
+            (created_at, message_id), archived = self._anchor(room, after_id, "after_id")
+            older = []
+            if archived:
+                older = get_archived_messages(room, limit_num, after=(created_at, message_id))
+            qs = qs.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+            )
+            return older + list(qs.order_by("created_at", "id")[: limit_num - len(older)])
+
+        anchor = None
+        if before_id is not None:
+            anchor, archived = self._anchor(room, before_id, "before_id")
+            if archived:
+                return get_archived_messages(room, limit_num, before=anchor)
+            created_at, message_id = anchor
+            qs = qs.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+
+        qs_list = list(qs.order_by("-created_at", "-id")[:limit_num])
         qs_list.reverse()
+        if len(qs_list) < limit_num and has_archive(room):
+            # Past the hot window: continue with the archive
+            if qs_list:
+                anchor = (qs_list[0].created_at, qs_list[0].id)
+            qs_list = get_archived_messages(
+                room, limit_num - len(qs_list), before=anchor
+            ) + qs_list
         return qs_list
 
 
+class MessageSearchView(APIView):
+    """
+    Full-text search over the messages of the user's rooms, newest first.
+    GET /chat/search/?q=meeting point
+    Query params:
+    - q: search text (all words must match, the last one as a prefix)
+    - room: only search this room
+    - limit: page size (default 20, max 50)
+    - before_id: next_before_id of the previous page
+    Each result is a message with a `snippet` of HTML-escaped content in
+    which the matches are wrapped in <mark> tags.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = (request.query_params.get("q") or "").strip()
+        if not query:
+            return Response(
+                {"error": "q is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        limit_num = DEFAULT_SEARCH_PAGE_SIZE
+        limit = request.query_params.get("limit")
+        if limit:
+            try:
+                n = int(limit)
+                if n > 0:
+                    limit_num = min(n, MAX_SEARCH_PAGE_SIZE)
+            except ValueError:
+                pass
+
+        before = None
+        before_id = request.query_params.get("before_id")
+        if before_id:
+            try:
+                before_id = int(before_id)
+            except ValueError:
+                raise ValidationError({"before_id": "Must be a message id"})
+            created_at = (
+                Message.objects.filter(pk=before_id)
+                .values_list("created_at", flat=True)
+                .first()
+            )
+            if created_at is None:
+                raise ValidationError({"before_id": "Message not found"})
+            before = (created_at, before_id)
+
+        messages, has_more = search_messages(
+            request.user,
+            query,
+            limit_num,
+            before=before,
+            room=request.query_params.get("room") or None,
+        )
+        results = []
+        for message, data in zip(messages, MessageSerializer(messages, many=True).data):
+            data["snippet"] = message.snippet
+            results.append(data)
+        return Response({
+            "results": results,
+            "next_before_id": messages[-1].id if has_more else None,
+        })
+
+
 class ConversationListView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        user_username = user.username
 
         # Try cache first
         cache_key = f"conversations:{user.id}"
@@ -53,86 +200,41 @@ class ConversationListView(generics.GenericAPIView):
         if cached_data:
             return Response(cached_data)
 
-        # Get all rooms containing the user's username
-        from django.db.models import Q
-
-        all_user_rooms = (
-            Message.objects.filter(Q(room__contains=user_username))
-            .values("room")
-            .distinct()
-        )
-
-        room_names = [r["room"] for r in all_user_rooms]
-
-        # Get last message time for each room
-        room_entries = (
-            Message.objects.filter(room__in=room_names)
-            .values("room")
-            .annotate(last_message_at=Max("created_at"))
-            .order_by("-last_message_at")
-        )
-
-        # Prefetch last messages efficiently
-        last_messages = {}
-        other_user_messages = {}
-
-        for room_name in room_names:
-            # Get last message
-            last_msg = (
-                Message.objects.filter(room=room_name)
-                .select_related('sender', 'sender__tourist_profile', 'sender__guide_profile')
-                .order_by("-created_at")
-                .first()
+        # One indexed query over the user's memberships (newest first), plus
+        # one prefetch for the other participants and their profiles
+        memberships = ConversationService.get_user_conversations(user)
+
+        # Online status of every contact with one cache round trip
+        memberships = list(memberships)
+        contact_ids = [
+            str(membership.conversation.other_participants[0].user_id)
+            for membership in memberships
+            if membership.conversation.other_participants
+        ]
+        online = PresenceService.get_many(contact_ids)
+
+        # Response time badges of guide contacts, for tourists only
+        from Authentication.models import User as AuthUser
+        response_times = {}
+        if user.role == AuthUser.ROLE_TOURIST:
+            response_times = get_guide_first_response_times(
+                membership.conversation.other_participants[0].user_id
+                for membership in memberships
+                if membership.conversation.other_participants
+                and membership.conversation.other_participants[0].user.role == AuthUser.ROLE_GUIDE
             )
-            if last_msg:
-                last_messages[room_name] = last_msg
-
-            # Get other user message
-            other_msg = (
-                Message.objects.filter(room=room_name)
-                .exclude(sender=user)
-                .select_related('sender', 'sender__tourist_profile', 'sender__guide_profile')
-                .order_by("-created_at")
-                .first()
-            )
-            if other_msg:
-                other_user_messages[room_name] = other_msg
-
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
 
         conversations = []
-        for entry in room_entries:
-            room_name = entry["room"]
-            last_message = last_messages.get(room_name)
-            other_user_message = other_user_messages.get(room_name)
+        for membership in memberships:
+            conversation = membership.conversation
+            room_name = conversation.room
+            last_message = conversation.last_message
+            others = conversation.other_participants
 
             contact_name = f"Room: {room_name}"
             contact_id = None
             contact_avatar = None
-            contact_user = None
-
-            # Try to get contact info from other user's message first
-            if other_user_message and other_user_message.sender:
-                contact_user = other_user_message.sender
-            else:
-                # If no message from other user, parse room name to find them
-                # Room name format: username1__username2
-                if "__" in room_name:
-                    parts = room_name.split("__")
-                    other_username = None
-                    for part in parts:
-                        if part and part.lower() != user_username.lower():
-                            other_username = part
-                            break
-                    
-                    if other_username:
-                        try:
-                            contact_user = User.objects.select_related(
-                                'tourist_profile', 'guide_profile'
-                            ).get(username__iexact=other_username)
-                        except User.DoesNotExist:
-                            pass
+            contact_user = others[0].user if others else None
 
             # Extract contact info from contact_user
             if contact_user:
@@ -148,32 +250,13 @@ class ConversationListView(generics.GenericAPIView):
                     contact_avatar = img.url if hasattr(img, 'url') else str(img) if img else None
 
             # Check if contact is online
-            is_online = False
-            if contact_id:
-                is_online = bool(cache.get(f"user_online:{contact_id}", False))
-
-            # Check if there are unread messages
-            from .last_seen import LastSeenService
-            has_unread = False
-            if last_message:
-                # Only check unread if last message is NOT from current user
-                is_my_message = last_message.sender_id == user.id
-                if not is_my_message:
-                    my_last_seen = LastSeenService.get_room_last_seen(user.id, room_name)
-                    if my_last_seen:
-                        # Has unread if last message is after my last seen time
-                        has_unread = last_message.created_at > my_last_seen
-                    else:
-                        # Never seen this room, so messages from others are unread
-                        has_unread = True
-
-            # Calculate response time for guide contacts
-            # Only show response time if current user is a tourist and contact is a guide
-            response_time = None
-            if contact_user and hasattr(contact_user, 'role'):
-                from Authentication.models import User as AuthUser
-                if user.role == AuthUser.ROLE_TOURIST and contact_user.role == AuthUser.ROLE_GUIDE:
-                    response_time = get_guide_first_response_time(contact_user.id)
+            is_online = online.get(contact_id, False)
+
+            # Unread counter is maintained on every message / mark_seen
+            unread_count = membership.unread_count
+
+            # Response time of guide contacts (looked up above)
+            response_time = response_times.get(contact_user.id) if contact_user else None
 
             conversations.append({
                 "room": room_name,
@@ -181,7 +264,8 @@ class ConversationListView(generics.GenericAPIView):
                 "contactId": contact_id,
                 "contactAvatar": contact_avatar,
                 "isOnline": is_online,
-                "hasUnread": has_unread,
+                "hasUnread": unread_count > 0,
+                "unreadCount": unread_count,
                 "lastMessage": last_message.content if last_message else "No message yet",
                 "lastMessageTime": last_message.created_at.isoformat() if last_message else None,
                 "responseTime": response_time,
@@ -200,9 +284,58 @@ class UserOnlineStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, user_id):
-        cache_key = f"user_online:{user_id}"
-        is_online = cache.get(cache_key, False)
-        return Response({"user_id": user_id, "is_online": bool(is_online)})
+        is_online = PresenceService.is_online(user_id)
+        return Response({"user_id": user_id, "is_online": is_online})
+
+
+class BulkPresenceView(APIView):
+    """
+    Online status of several users in one request.
+    GET /chat/presence/?user_ids=1,2,3
+    GET /chat/presence/?usernames=alice,bob
+    Live changes are pushed as "presence" events on the notification socket.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _split(self, name):
+        value = self.request.query_params.get(name) or ""
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    def get(self, request):
+        user_ids = self._split("user_ids")
+        usernames = self._split("usernames")
+        if not user_ids and not usernames:
+            return Response(
+                {"error": "user_ids or usernames is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(user_ids) + len(usernames) > MAX_PRESENCE_LOOKUP:
+            return Response(
+                {"error": f"At most {MAX_PRESENCE_LOOKUP} users per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        usernames_by_id = {}
+        if usernames:
+            from django.contrib.auth import get_user_model
+            User = get_user_model()
+            query = Q()
+            for username in usernames:
+                query |= Q(username__iexact=username)
+            for user_id, username in User.objects.filter(query).values_list("id", "username"):
+                usernames_by_id[str(user_id)] = username
+
+        user_ids = list(dict.fromkeys(user_ids + list(usernames_by_id)))
+        online = PresenceService.get_many(user_ids)
+        users = [
+            {
+                "user_id": user_id,
+                "username": usernames_by_id.get(user_id),
+                "is_online": online[user_id],
+            }
+            for user_id in user_ids
+        ]
+        return Response({"users": users})
 
 
 class UserOnlineStatusByUsernameView(APIView):
@@ -215,12 +348,10 @@ class UserOnlineStatusByUsernameView(APIView):
         
         try:
             user = User.objects.get(username__iexact=username)
-            cache_key = f"user_online:{user.id}"
-            is_online = cache.get(cache_key, False)
             return Response({
                 "user_id": str(user.id),
                 "username": user.username,
-                "is_online": bool(is_online)
+                "is_online": PresenceService.is_online(user.id)
             })
         except User.DoesNotExist:
             return Response({
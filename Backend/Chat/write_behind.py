@@ -0,0 +1,374 @@
+"""
+Write-behind persistence for chat messages.
+
+With CHAT_WRITE_BEHIND = True, ChatConsumer no longer inserts every message
+in its own thread before broadcasting. A message gets its final id from a
+block pre-allocated in MessageIdAllocator, is broadcast right away, and is
+queued in memory; a single writer task per process inserts the queue with
+bulk_create every CHAT_WRITE_BEHIND_INTERVAL seconds, together with the
+conversation updates for the whole batch.
+
+Chat notifications go through the same queue: the writer numbers them in
+the recipients' replay streams and logs them (Management/replay.py) with
+one sequence update per user per batch, then sends them to the recipients'
+notification sockets once the batch is committed. With write-behind on, a
+chat message therefore costs no synchronous database write at all.
+
+Marking a room seen while some of its messages are still queued does not
+flush: a reset marker is queued behind them (reset_seen_after_pending) and
+the writer zeroes the unread counter right after inserting them, so the
+counter ends up as if every message had been written inline.
+
+The queue is flushed when a chat socket disconnects and at interpreter exit,
+so a graceful shutdown loses nothing. A batch
+that keeps failing is retried row by row, and only the rows that still fail
+are logged and dropped.
+
+Enable it on every process or none: ids are only collision-free while every
+Message insert goes through the allocator. With write-behind on, a Message
+saved without an id (inline consumer path, shell, other commands) is given
+one from the allocator by a pre_save handler (see signals.py); bulk_create
+callers must set ids with reserve_id() themselves.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+from collections import namedtuple
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Message, MessageIdAllocator
+
+logger = logging.getLogger(__name__)
+
+
+# Ids reserved per allocator round trip
+MESSAGE_ID_BLOCK_SIZE = 1000
+
+# Messages inserted per bulk_create
+WRITE_BEHIND_BATCH_SIZE = 500
+
+# Default delay between flushes, in seconds
+DEFAULT_WRITE_BEHIND_INTERVAL = 0.02
+
+# Queued behind a room's pending messages: reset the user's unread counter
+# once they are inserted
+SeenReset = namedtuple("SeenReset", ["user_id", "room"])
+
+# A chat notification for several recipients, logged with the next flush
+ChatNotification = namedtuple("ChatNotification", ["user_ids", "room", "payload"])
+
+# Upper bound for the retry delay after a failed flush, in seconds
+WRITE_BEHIND_MAX_BACKOFF = 5
+
+# Failed attempts of a batch before it is written row by row
+# (about 5 seconds of backoff at the default interval)
+WRITE_BEHIND_MAX_BATCH_FAILURES = 8
+
+
+def write_behind_enabled():
+    """Whether chat messages are persisted by the write-behind writer."""
+    return getattr(settings, "CHAT_WRITE_BEHIND", False)
+
+
+def allocate_message_ids(size=MESSAGE_ID_BLOCK_SIZE):
+    """
+    Reserve a block of Message ids. The allocator starts above the largest
+    existing id, so messages inserted before write-behind was enabled are
+    never reused.
+
+    Every process inserting messages while write-behind is enabled must take
+    its ids from here: an autoincrement insert may land inside a block that
+    another process has reserved but not flushed yet.
+
+    Returns:
+        range of reserved ids
+    """
+    with transaction.atomic():
+        floor = (Message.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        MessageIdAllocator.objects.get_or_create(
+            name="message", defaults={"next_id": floor}
+        )
+        MessageIdAllocator.objects.filter(name="message").update(
+            next_id=Greatest(F("next_id"), Value(floor)) + size
+        )
+        end = MessageIdAllocator.objects.values_list("next_id", flat=True).get(
+            name="message"
+        )
+    return range(end - size, end)
+
+
+class MessageWriteBehind:
+    """In-memory message queue drained by one writer task per process"""
+
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._pending = []
+        # Batch being written by flush(), still counted as pending per room
+        self._inflight = []
+        # (user id, stamped payload) logged by flush(), not sent yet
+        self._outgoing = []
+        self._ids = iter(())
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task = None
+        self._exit_hook = False
+        self._failures = 0
+
+    @property
+    def interval(self):
+        return getattr(
+            settings, "CHAT_WRITE_BEHIND_INTERVAL", DEFAULT_WRITE_BEHIND_INTERVAL
+        )
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def reset_seen_after_pending(self, user_id, room):
+        """
+        Queue a reset of the user's unread counter behind the room's pending
+        messages.
+
+        Returns:
+            False (nothing queued) if no message of the room is pending: the
+            caller resets the counter itself
+        """
+        with self._lock:
+            if not any(
+                isinstance(item, Message) and item.room == room
+                for item in self._inflight + self._pending
+            ):
+                return False
+            self._pending.append(SeenReset(user_id, room))
+            return True
+
+    async def enqueue_notification(self, user_ids, room, payload):
+        """
+        Queue a chat notification (from the event loop); it is logged and
+        sent by the writer task.
+        """
+        with self._lock:
+            self._pending.append(ChatNotification(list(user_ids), room, payload))
+        self._ensure_writer()
+
+    def _next_id(self):
+        with self._lock:
+            return next(self._ids, None)
+
+    def _refill_ids(self):
+        block = allocate_message_ids()
+        with self._lock:
+            self._ids = iter(block)
+
+    def reserve_id(self):
+        """
+        Next id of this process's block (sync callers). Only touches the
+        database when the block is used up.
+        """
+        message_id = self._next_id()
+        while message_id is None:
+            self._refill_ids()
+            message_id = self._next_id()
+        return message_id
+
+    def add(self, room, sender, content):
+        """
+        Queue a message (sync callers).
+
+        Returns:
+            The unsaved Message, with its id and created_at already set
+        """
+        return self._queue(self.reserve_id(), room, sender, content)
+
+    async def enqueue(self, room, sender, content):
+        """
+        Queue a message from the event loop and make sure the writer task
+        is running.
+
+        Returns:
+            (message id, ISO created_at) for the broadcast payload
+        """
+        message_id = self._next_id()
+        while message_id is None:
+            await database_sync_to_async(self._refill_ids)()
+            message_id = self._next_id()
+        message = self._queue(message_id, room, sender, content)
+        self._ensure_writer()
+        return message.id, message.created_at.isoformat()
+
+    def _queue(self, message_id, room, sender, content):
+        message = Message(
+            id=message_id,
+            room=room,
+            sender=sender,
+            content=content,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(message)
+        if not self._exit_hook:
+            self._exit_hook = True
+            atexit.register(self.flush_at_exit)
+        return message
+
+    def _ensure_writer(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        delay = self.interval
+        while self.pending_count():
+            await asyncio.sleep(delay)
+            try:
+                await database_sync_to_async(self.flush)()
+                delay = self.interval
+            except Exception:
+                logger.exception("Chat write-behind flush failed; retrying")
+                delay = min(max(delay, self.interval) * 2, WRITE_BEHIND_MAX_BACKOFF)
+            await self.send_notifications()
+
+    async def send_notifications(self):
+        """Send the notifications logged by the last flushes."""
+        from .fanout import send_many
+
+        with self._lock:
+            outgoing, self._outgoing = self._outgoing, []
+        if outgoing:
+            await send_many(
+                get_channel_layer(),
+                [
+                    (f"notify_user_{user_id}", {"type": "chat.notification", "payload": payload})
+                    for user_id, payload in outgoing
+                ],
+            )
+
+    def flush(self):
+        """
+        Insert every queued message. A failed batch is put back at the
+        front of the queue and the error is raised; after
+        WRITE_BEHIND_MAX_BATCH_FAILURES failures in a row it is written row
+        by row instead.
+
+        Returns:
+            Number of messages inserted
+        """
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[: self.batch_size]
+                    del self._pending[: self.batch_size]
+                    self._inflight = batch
+                if not batch:
+                    return flushed
+                try:
+                    self._send_later(self._write(batch))
+                    self._failures = 0
+                except Exception:
+                    self._failures += 1
+                    if self._failures < WRITE_BEHIND_MAX_BATCH_FAILURES:
+                        with self._lock:
+                            self._pending[:0] = batch
+                            self._inflight = []
+                        raise
+                    self._failures = 0
+                    flushed += self._write_rows(batch)
+                else:
+                    flushed += sum(isinstance(item, Message) for item in batch)
+                with self._lock:
+                    self._inflight = []
+
+    async def aflush(self):
+        """flush() from the event loop, then send the logged notifications."""
+        if self.pending_count():
+            await database_sync_to_async(self.flush)()
+        await self.send_notifications()
+
+    def _send_later(self, stamped):
+        with self._lock:
+            self._outgoing.extend(stamped)
+
+    def _write(self, batch):
+        """
+        Insert the messages of a batch and apply its seen resets in order
+        (a reset only waits for the messages of its own room queued before
+        it), and log its notifications.
+
+        Returns:
+            List of (user id, stamped payload) to send once committed
+        """
+        from Management.replay import record_event_batch
+        from .conversations import ConversationService
+
+        with transaction.atomic():
+            messages = []
+            events = []
+            for item in batch:
+                if isinstance(item, SeenReset):
+                    if any(message.room == item.room for message in messages):
+                        self._write_messages(messages)
+                        messages = []
+                    ConversationService.mark_seen(item.user_id, item.room)
+                elif isinstance(item, ChatNotification):
+                    events += [(user_id, "chat", item.payload) for user_id in item.user_ids]
+                else:
+                    messages.append(item)
+            self._write_messages(messages)
+            return record_event_batch(events) if events else []
+
+    def _write_messages(self, messages):
+        from .conversations import ConversationService
+        from .response_time import record_response_times
+
+        if not messages:
+            return
+        Message.objects.bulk_create(messages)
+        conversations = ConversationService.register_messages(messages)
+        record_response_times(messages, conversations)
+
+    def _write_rows(self, batch):
+        """
+        Insert a batch one message (or seen reset) at a time, so one bad row
+        (e.g. an id collision or a deleted sender) no longer holds back the
+        others. Rows that fail are logged and dropped.
+
+        Returns:
+            Number of messages inserted
+        """
+        written = 0
+        for item in batch:
+            try:
+                self._send_later(self._write([item]))
+                written += isinstance(item, Message)
+            except Exception:
+                if isinstance(item, Message):
+                    dropped = f"message {item.id}"
+                elif isinstance(item, SeenReset):
+                    dropped = f"seen reset of user {item.user_id}"
+                else:
+                    dropped = "notification"
+                logger.exception("Chat write-behind dropped %s in room %s", dropped, item.room)
+        return written
+
+    def flush_at_exit(self):
+        """atexit hook: persist whatever is still queued."""
+        if not self.pending_count():
+            return
+        try:
+            close_old_connections()
+            self.flush()
+        except Exception:
+            logger.exception(
+                "Chat write-behind lost %s messages at shutdown", self.pending_count()
+            )
+
+
+message_writer = MessageWriteBehind()
@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import Booking, BookingNotification, PastTour
+from .models import (
+    Booking,
+    BookingEvent,
+    BookingNotification,
+    GuideBusyInterval,
+    GuideDailyRevenue,
+    GuideDashboardCounter,
+    NotificationOutbox,
+    PastTour,
+    ProjectorOffset,
+)
 
 
 @admin.register(Booking)
@@ -70,6 +80,67 @@ class BookingAdmin(admin.ModelAdmin):
         return queryset
 
 
+@admin.register(GuideBusyInterval)
+class GuideBusyIntervalAdmin(admin.ModelAdmin):
+    """
+    Admin interface for GuideBusyInterval model (maintained automatically)
+    """
+    list_display = [
+        'id',
+        'guide',
+        'booking',
+        'start_at',
+        'end_at',
+    ]
+    search_fields = [
+        'guide__user__username',
+    ]
+    readonly_fields = [
+        'booking',
+        'guide',
+        'start_at',
+        'end_at',
+    ]
+    ordering = ['-start_at']
+    date_hierarchy = 'start_at'
+
+    def get_queryset(self, request):
+        """Optimize queryset with select_related"""
+        queryset = super().get_queryset(request)
+        queryset = queryset.select_related('guide', 'booking')
+        return queryset
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """
+    Admin interface for NotificationOutbox model (pending WebSocket deliveries)
+    """
+    list_display = [
+        'id',
+        'group',
+        'message_type',
+        'attempts',
+        'next_attempt_at',
+        'dispatched_at',
+        'created_at',
+    ]
+    list_filter = [
+        'message_type',
+        'dispatched_at',
+    ]
+    search_fields = [
+        'group',
+        'last_error',
+    ]
+    readonly_fields = [
+        'notification',
+        'payload',
+        'created_at',
+    ]
+    ordering = ['-created_at']
+
+
 @admin.register(BookingNotification)
 class BookingNotificationAdmin(admin.ModelAdmin):
     """
@@ -182,3 +253,94 @@ class PastTourAdmin(admin.ModelAdmin):
         queryset = super().get_queryset(request)
         queryset = queryset.select_related('tourist', 'guide', 'tour', 'booking')
         return queryset
+
+
+@admin.register(GuideDailyRevenue)
+class GuideDailyRevenueAdmin(admin.ModelAdmin):
+    """
+    Admin interface for GuideDailyRevenue rollups (maintained automatically)
+    """
+    list_display = [
+        'id',
+        'guide',
+        'tour_name',
+        'day',
+        'revenue',
+        'guests',
+        'completed_tours',
+    ]
+    list_filter = [
+        'day',
+    ]
+    search_fields = [
+        'guide__user__username',
+        'tour_name',
+    ]
+    ordering = ['-day']
+    date_hierarchy = 'day'
+
+    def get_queryset(self, request):
+        """Optimize queryset with select_related"""
+        queryset = super().get_queryset(request)
+        queryset = queryset.select_related('guide', 'tour')
+        return queryset
+
+
+@admin.register(BookingEvent)
+class BookingEventAdmin(admin.ModelAdmin):
+    """
+    Admin interface for BookingEvent model (append-only, read only)
+    """
+    list_display = [
+        'id',
+        'event_type',
+        'booking_id',
+        'guide_id',
+        'tour_name',
+        'tour_date',
+        'total_price',
+        'occurred_at',
+    ]
+    list_filter = [
+        'event_type',
+    ]
+    search_fields = [
+        'tour_name',
+    ]
+    ordering = ['-id']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(GuideDashboardCounter)
+class GuideDashboardCounterAdmin(admin.ModelAdmin):
+    """
+    Admin interface for GuideDashboardCounter model (projected from BookingEvent)
+    """
+    list_display = [
+        'guide',
+        'total_requests',
+        'accepted',
+        'declined',
+        'cancelled',
+        'completed',
+        'revenue',
+        'updated_at',
+    ]
+    search_fields = [
+        'guide__user__username',
+    ]
+    ordering = ['-revenue']
+
+
+@admin.register(ProjectorOffset)
+class ProjectorOffsetAdmin(admin.ModelAdmin):
+    """
+    Admin interface for ProjectorOffset model
+    """
+    list_display = [
+        'name',
+        'last_event_id',
+        'updated_at',
+    ]
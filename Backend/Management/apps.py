@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ManagementConfig(AppConfig):
@@ -7,4 +8,11 @@ class ManagementConfig(AppConfig):
     
     def ready(self):
         """Import signals when the app is ready"""
-        import Management.signals
\ No newline at end of file
+        import Management.signals
+        from .availability import backfill_busy_intervals
+        from .projections import backfill_after_migrate
+
+        # Accepted bookings from before GuideBusyInterval existed
+        post_migrate.connect(backfill_busy_intervals, sender=self)
+        # Booking history from before the event log existed
+        post_migrate.connect(backfill_after_migrate, sender=self)
@@ -0,0 +1,300 @@
+"""
+Guide availability calendar.
+Computes the busy and free intervals of a guide for each day from their
+ACCEPTED bookings, and caches the result per guide and day so the booking UI
+can grey out taken slots without trial-and-error booking requests.
+"""
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import BookingStatus, GuideBusyInterval
+
+
+# Cache timeout: 1 hour (entries are invalidated explicitly on booking changes)
+AVAILABILITY_CACHE_TIMEOUT = 3600
+
+# Tours can run past midnight; a booking invalidates at most this many
+# following days of cached availability.
+AVAILABILITY_LOOKBACK_DAYS = 7
+
+# Maximum number of days that can be requested in one call
+MAX_AVAILABILITY_RANGE_DAYS = 62
+
+
+def _availability_cache_key(guide_id, day):
+    return f"guide_availability:{guide_id}:{day.isoformat()}"
+
+
+def booking_interval(tour_date, tour_time, duration_hours):
+    """
+    Return the (start, end) naive local datetimes covered by a booking.
+    """
+    start = datetime.combine(tour_date, tour_time)
+    return start, start + timedelta(hours=duration_hours or 0)
+
+
+def aware_booking_interval(tour_date, tour_time, duration_hours):
+    """
+    Same as booking_interval, but timezone-aware in the current timezone.
+    """
+    start, end = booking_interval(tour_date, tour_time, duration_hours)
+    tz = timezone.get_current_timezone()
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping or touching (start, end) intervals.
+    Returns a sorted list of disjoint intervals.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _format_bound(value, day_start):
+    """Format an interval bound as HH:MM, using 24:00 for the end of the day."""
+    if value - day_start >= timedelta(days=1):
+        return "24:00"
+    return value.strftime("%H:%M")
+
+
+def _build_day(day, intervals):
+    """
+    Clip intervals to a single day and return its busy/free representation.
+    """
+    day_start = datetime.combine(day, time.min)
+    day_end = day_start + timedelta(days=1)
+
+    busy = merge_intervals(
+        (max(start, day_start), min(end, day_end))
+        for start, end in intervals
+        if start < day_end and end > day_start
+    )
+
+    free = []
+    cursor = day_start
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < day_end:
+        free.append((cursor, day_end))
+
+    return {
+        "date": day.isoformat(),
+        "busy": [
+            {"start": _format_bound(s, day_start), "end": _format_bound(e, day_start)}
+            for s, e in busy
+        ],
+        "free": [
+            {"start": _format_bound(s, day_start), "end": _format_bound(e, day_start)}
+            for s, e in free
+        ],
+    }
+
+
+def _compute_days(guide_id, days):
+    """
+    Compute availability for the given days with a single indexed range query.
+    """
+    tz = timezone.get_current_timezone()
+    range_start = timezone.make_aware(datetime.combine(min(days), time.min), tz)
+    range_end = timezone.make_aware(
+        datetime.combine(max(days) + timedelta(days=1), time.min), tz
+    )
+    busy = GuideBusyInterval.objects.filter(
+        guide_id=guide_id, start_at__lt=range_end, end_at__gt=range_start
+    ).values_list("start_at", "end_at")
+
+    intervals = merge_intervals(
+        (
+            timezone.localtime(start_at, tz).replace(tzinfo=None),
+            timezone.localtime(end_at, tz).replace(tzinfo=None),
+        )
+        for start_at, end_at in busy
+    )
+    return {day: _build_day(day, intervals) for day in days}
+
+
+def get_guide_availability(guide_id, start_date, end_date):
+    """
+    Get a guide's busy/free intervals for every day in [start_date, end_date].
+    Cached days are served from the cache; missing days are computed together
+    and cached per guide and day.
+
+    Returns:
+        List of {"date", "busy", "free"} dicts ordered by date
+    """
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    keys = {day: _availability_cache_key(guide_id, day) for day in days}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [day for day in days if keys[day] not in cached]
+    if missing:
+        computed = _compute_days(guide_id, missing)
+        cache.set_many(
+            {keys[day]: value for day, value in computed.items()},
+            timeout=AVAILABILITY_CACHE_TIMEOUT,
+        )
+        for day, value in computed.items():
+            cached[keys[day]] = value
+
+    return [cached[keys[day]] for day in days]
+
+
+def invalidate_guide_availability(guide_id, tour_date, tour_time, duration_hours):
+    """
+    Invalidate the cached days covered by a booking for a guide.
+    Call this when an accepted booking is created, cancelled, declined or moved.
+    """
+    if not guide_id or not tour_date:
+        return
+
+    start, end = booking_interval(tour_date, tour_time or time.min, duration_hours)
+    span_days = min((end.date() - start.date()).days, AVAILABILITY_LOOKBACK_DAYS)
+    cache.delete_many(
+        [
+            _availability_cache_key(guide_id, tour_date + timedelta(days=offset))
+            for offset in range(span_days + 1)
+        ]
+    )
+
+
+def sync_busy_interval(booking):
+    """
+    Keep the GuideBusyInterval row of a booking in line with its status.
+    Accepted bookings occupy their guide's time; any other status frees it.
+    """
+    if booking.status != BookingStatus.ACCEPTED:
+        GuideBusyInterval.objects.filter(booking_id=booking.pk).delete()
+        return
+
+    start_at, end_at = aware_booking_interval(
+        booking.tour_date, booking.tour_time, booking.tour.duration
+    )
+    GuideBusyInterval.objects.update_or_create(
+        booking_id=booking.pk,
+        defaults={
+            "guide_id": booking.guide_id,
+            "start_at": start_at,
+            "end_at": end_at,
+        },
+    )
+
+
+def resync_tour_intervals(tour, old_duration):
+    """
+    Move the end of every accepted booking of a tour after its duration
+    changed, and invalidate the cached days of both the old and new spans.
+    """
+    bookings = tour.bookings.filter(status=BookingStatus.ACCEPTED)
+    for booking in bookings:
+        booking.tour = tour
+        sync_busy_interval(booking)
+        invalidate_guide_availability(
+            booking.guide_id,
+            booking.tour_date,
+            booking.tour_time,
+            max(old_duration or 0, tour.duration or 0),
+        )
+
+
+def backfill_busy_intervals(**kwargs):
+    """
+    Create the missing GuideBusyInterval rows of accepted bookings, e.g.
+    bookings accepted before the table existed (post_migrate handler).
+    Existing rows are left alone, so this is safe to run on every migrate.
+
+    Returns:
+        Number of intervals created
+    """
+    from .models import Booking
+
+    missing = (
+        Booking.objects.filter(status=BookingStatus.ACCEPTED)
+        .exclude(Exists(GuideBusyInterval.objects.filter(booking_id=OuterRef("pk"))))
+        .select_related("tour")
+        .order_by("id")
+    )
+    intervals = []
+    for booking in missing.iterator(chunk_size=500):
+        start_at, end_at = aware_booking_interval(
+            booking.tour_date, booking.tour_time, booking.tour.duration
+        )
+        intervals.append(
+            GuideBusyInterval(
+                booking_id=booking.id,
+                guide_id=booking.guide_id,
+                start_at=start_at,
+                end_at=end_at,
+            )
+        )
+    GuideBusyInterval.objects.bulk_create(intervals, batch_size=500, ignore_conflicts=True)
+    return len(intervals)
+
+
+def find_guide_conflict(guide_id, start_at, end_at, exclude_booking_id=None):
+    """
+    Return the first busy interval of a guide overlapping [start_at, end_at),
+    or None if the guide is free.
+    """
+    conflicts = GuideBusyInterval.objects.filter(
+        guide_id=guide_id, start_at__lt=end_at, end_at__gt=start_at
+    )
+    if exclude_booking_id is not None:
+        conflicts = conflicts.exclude(booking_id=exclude_booking_id)
+    return conflicts.select_related("booking__tour").order_by("start_at").first()
+
+
+def filter_tours_available_at(tours_queryset, day, at_time=None):
+    """
+    Exclude tours whose guide has an overlapping accepted booking.
+
+    With at_time, a tour needs its guide free for [day at_time, + tour duration).
+    Without at_time, the guide must be free for the whole day.
+
+    Implemented as an anti-join (NOT EXISTS) against GuideBusyInterval. With
+    at_time, the distinct tour durations are read first (one small query);
+    tours have few of them, so one subquery per duration keeps the filter
+    itself a single SQL query without DB-specific date arithmetic.
+    """
+    tz = timezone.get_current_timezone()
+    requested_start = timezone.make_aware(
+        datetime.combine(day, at_time or time.min), tz
+    )
+
+    def busy_between(end_at):
+        return Exists(
+            GuideBusyInterval.objects.filter(
+                guide_id=OuterRef("guide_id"),
+                start_at__lt=end_at,
+                end_at__gt=requested_start,
+            )
+        )
+
+    if at_time is None:
+        day_end = timezone.make_aware(
+            datetime.combine(day + timedelta(days=1), time.min), tz
+        )
+        return tours_queryset.exclude(busy_between(day_end))
+
+    durations = (
+        tours_queryset.order_by()
+        .values_list("duration", flat=True)
+        .distinct()
+    )
+    available = Q(pk__in=[])
+    for duration in durations:
+        end_at = requested_start + timedelta(hours=duration or 0)
+        available |= Q(duration=duration) & ~busy_between(end_at)
+    return tours_queryset.filter(available)
@@ -0,0 +1,175 @@
+"""
+Booking event log.
+Every booking transition (created, accepted, declined, cancelled, expired,
+completed) is appended to BookingEvent from the model signals, so derived
+views can be maintained incrementally instead of rescanning Booking and
+PastTour.
+"""
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Booking, BookingEvent, BookingStatus, PastTour
+from Tour.models import Tour
+
+
+# ProjectorOffset row recording the last event id of the backfill; projected
+# views are complete once their projector has passed it
+BACKFILL_MARKER = "booking_events_backfill"
+
+# Status a booking moved to -> event type
+STATUS_EVENT_TYPES = {
+    BookingStatus.ACCEPTED: "accepted",
+    BookingStatus.DECLINED: "declined",
+    BookingStatus.CANCELLED: "cancelled",
+}
+
+
+def _tour_name(booking):
+    try:
+        return booking.tour.name if booking.tour_id else ""
+    except Tour.DoesNotExist:
+        # Tour is being deleted together with its bookings
+        return ""
+
+
+def _booking_event(booking, event_type):
+    return BookingEvent(
+        event_type=event_type,
+        booking_id=booking.pk,
+        guide_id=booking.guide_id,
+        tourist_id=booking.tourist_id,
+        tour_id=booking.tour_id,
+        tour_name=_tour_name(booking),
+        tour_date=booking.tour_date,
+        tour_time=booking.tour_time,
+        number_of_guests=booking.number_of_guests,
+        total_price=booking.total_price,
+    )
+
+
+def _completion_event(past_tour):
+    return BookingEvent(
+        event_type="completed",
+        booking_id=past_tour.booking_id,
+        guide_id=past_tour.guide_id,
+        tourist_id=past_tour.tourist_id,
+        tour_id=past_tour.tour_id,
+        tour_name=past_tour.tour_name,
+        tour_date=past_tour.tour_date,
+        tour_time=past_tour.tour_time,
+        number_of_guests=past_tour.number_of_guests,
+        total_price=past_tour.total_price,
+    )
+
+
+def record_booking_event(booking, event_type):
+    """Append a transition of a booking to the event log."""
+    from .projections import schedule_projectors
+
+    event = _booking_event(booking, event_type)
+    event.save()
+    transaction.on_commit(schedule_projectors)
+    return event
+
+
+def record_completion_event(past_tour):
+    """Append the completion of a tour to the event log."""
+    from .projections import schedule_projectors
+
+    event = _completion_event(past_tour)
+    event.save()
+    transaction.on_commit(schedule_projectors)
+    return event
+
+
+def deletion_event_type(booking):
+    """
+    Event type for a deleted booking, or None if the deletion is not a
+    transition (e.g. cleanup of bookings that are already finished).
+    """
+    if booking.status not in (BookingStatus.PENDING, BookingStatus.ACCEPTED):
+        return None
+
+    starts_at = timezone.make_aware(
+        datetime.combine(booking.tour_date, booking.tour_time),
+        timezone.get_current_timezone(),
+    )
+    if starts_at >= timezone.now():
+        # Tourist cancelled an upcoming booking
+        return "cancelled"
+    if booking.status == BookingStatus.PENDING:
+        # Guide never answered before the tour date
+        return "expired"
+    return None
+
+
+def _completion_key(guide_id, tourist_id, tour_date, tour_time):
+    return guide_id, tourist_id, tour_date, tour_time
+
+
+def backfill_booking_events(batch_size=500):
+    """
+    Add the events missing from the log for the current Booking and PastTour
+    rows, e.g. history from before the log existed. Bookings get a "created"
+    event plus one for their current status, past tours a "completed" event,
+    each only if the log does not have it yet, so transitions logged since
+    the deploy are not counted twice and the backfill can be run again.
+    Records BACKFILL_MARKER once done.
+
+    Returns:
+        Number of events created
+    """
+    from .models import ProjectorOffset
+
+    created = 0
+    bookings = Booking.objects.select_related("tour").order_by("created_at", "id")
+    batch = []
+    for booking in bookings.iterator(chunk_size=batch_size):
+        batch.append(booking)
+        if len(batch) >= batch_size:
+            created += _backfill_bookings(batch, batch_size)
+            batch = []
+    if batch:
+        created += _backfill_bookings(batch, batch_size)
+
+    logged = {
+        _completion_key(*row)
+        for row in BookingEvent.objects.filter(event_type="completed").values_list(
+            "guide_id", "tourist_id", "tour_date", "tour_time"
+        )
+    }
+    events = []
+    past_tours = PastTour.objects.order_by("completed_at", "id")
+    for past_tour in past_tours.iterator(chunk_size=batch_size):
+        key = _completion_key(
+            past_tour.guide_id, past_tour.tourist_id, past_tour.tour_date, past_tour.tour_time
+        )
+        if key not in logged:
+            logged.add(key)
+            events.append(_completion_event(past_tour))
+    BookingEvent.objects.bulk_create(events, batch_size=batch_size)
+    created += len(events)
+
+    ProjectorOffset.objects.update_or_create(
+        name=BACKFILL_MARKER,
+        defaults={"last_event_id": BookingEvent.objects.aggregate(last=Max("id"))["last"] or 0},
+    )
+    return created
+
+
+def _backfill_bookings(bookings, batch_size):
+    logged = set(
+        BookingEvent.objects.filter(
+            booking_id__in=[booking.pk for booking in bookings]
+        ).values_list("booking_id", "event_type")
+    )
+    events = []
+    for booking in bookings:
+        if (booking.pk, "created") not in logged:
+            events.append(_booking_event(booking, "created"))
+        event_type = STATUS_EVENT_TYPES.get(booking.status)
+        if event_type and (booking.pk, event_type) not in logged:
+            events.append(_booking_event(booking, event_type))
+    BookingEvent.objects.bulk_create(events, batch_size=batch_size)
+    return len(events)
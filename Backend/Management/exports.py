@@ -0,0 +1,125 @@
+"""
+Streaming exports of a guide's bookings and past tours.
+Rows are read with .values_list().iterator(chunk_size=...) and written one
+line at a time into a StreamingHttpResponse, so memory use stays constant
+no matter how much history is exported.
+"""
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .models import Booking, PastTour
+
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+# Column name -> model field lookup
+BOOKING_EXPORT_COLUMNS = {
+    "id": "id",
+    "tour_id": "tour_id",
+    "tour_name": "tour__name",
+    "tourist_name": "tourist__name",
+    "number_of_guests": "number_of_guests",
+    "tour_date": "tour_date",
+    "tour_time": "tour_time",
+    "status": "status",
+    "total_price": "total_price",
+    "created_at": "created_at",
+    "responded_at": "responded_at",
+}
+
+PAST_TOUR_EXPORT_COLUMNS = {
+    "id": "id",
+    "booking_id": "booking_id",
+    "tour_id": "tour_id",
+    "tour_name": "tour_name",
+    "tourist_name": "tourist_name",
+    "number_of_guests": "number_of_guests",
+    "tour_date": "tour_date",
+    "tour_time": "tour_time",
+    "duration": "duration",
+    "total_price": "total_price",
+    "completed_at": "completed_at",
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def _filter_by_tour_date(queryset, start_date=None, end_date=None):
+    if start_date:
+        queryset = queryset.filter(tour_date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(tour_date__lte=end_date)
+    return queryset
+
+
+def stream_export(queryset, columns, output, filename):
+    """
+    Build a streaming response exporting `columns` of every row in queryset.
+
+    Args:
+        queryset: Ordered queryset to export
+        columns: Dict of column name -> field lookup
+        output: "csv" or "jsonl"
+        filename: Download name without extension
+    """
+    content_type, extension = EXPORT_FORMATS[output]
+    rows = queryset.values_list(*columns.values()).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    lines = (_csv_lines if output == "csv" else _jsonl_lines)(list(columns), rows)
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+def export_guide_bookings(guide, output, start_date=None, end_date=None, status=None):
+    """Streaming export of a guide's bookings, ordered by tour date."""
+    queryset = _filter_by_tour_date(
+        Booking.objects.filter(guide=guide), start_date, end_date
+    )
+    if status:
+        queryset = queryset.filter(status=status)
+    return stream_export(
+        queryset.order_by("tour_date", "tour_time", "id"),
+        BOOKING_EXPORT_COLUMNS,
+        output,
+        "bookings",
+    )
+
+
+def export_guide_past_tours(guide, output, start_date=None, end_date=None):
+    """Streaming export of a guide's completed tours, ordered by tour date."""
+    queryset = _filter_by_tour_date(
+        PastTour.objects.filter(guide=guide), start_date, end_date
+    )
+    return stream_export(
+        queryset.order_by("tour_date", "tour_time", "id"),
+        PAST_TOUR_EXPORT_COLUMNS,
+        output,
+        "past_tours",
+    )
@@ -0,0 +1,124 @@
+"""
+Idempotency-Key support for retry-prone POST endpoints.
+The first request with a given key runs normally and its response is stored
+in the cache; retries with the same key and payload get the stored response
+back without re-running validation queries or inserts.
+"""
+import hashlib
+import json
+from functools import wraps
+from django.core.cache import cache
+from django.http import HttpRequest
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+
+# Stored responses are kept for 24 hours
+IDEMPOTENCY_TTL = 86400
+
+# In-flight lock timeout, in seconds (released as soon as the request ends)
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def _request_fingerprint(request):
+    """Hash of the method, path and parsed payload (files by name and size)."""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = {key: values for key, values in data.lists()}
+    files = sorted(
+        (field, upload.name, upload.size)
+        for field, uploads in request.FILES.lists()
+        for upload in uploads
+    )
+    raw = json.dumps(
+        [request.method, request.path, data, files], sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _find_request(args):
+    for arg in args:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    return None
+
+
+def idempotent(scope):
+    """
+    Decorator making a view idempotent per (user, scope, Idempotency-Key).
+    Works for function views (inside @api_view) and viewset methods.
+
+    - No header: the view runs as usual.
+    - Same key and payload: the stored response is returned with an
+      Idempotent-Replayed: true header.
+    - Same key, different payload: 422.
+    - Same key while the first request is still running: 409.
+
+    Only responses with a status below 500 are stored, so server errors
+    can be retried.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            key = request.META.get(IDEMPOTENCY_HEADER) if request else None
+            user = getattr(request, "user", None)
+            if not key or not getattr(user, "is_authenticated", False):
+                return view(*args, **kwargs)
+
+            if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                return Response(
+                    {"error": f"Idempotency-Key cannot exceed {MAX_IDEMPOTENCY_KEY_LENGTH} characters"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            key_hash = hashlib.sha256(key.encode()).hexdigest()
+            cache_key = f"idempotency:{scope}:{user.pk}:{key_hash}"
+            lock_key = f"{cache_key}:lock"
+            fingerprint = _request_fingerprint(request)
+
+            stored = cache.get(cache_key)
+            if stored is None:
+                if not cache.add(lock_key, True, timeout=IDEMPOTENCY_LOCK_TIMEOUT):
+                    return Response(
+                        {"error": "A request with this Idempotency-Key is still being processed"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                try:
+                    # Re-check: the first request may have finished in between
+                    stored = cache.get(cache_key)
+                    if stored is None:
+                        response = view(*args, **kwargs)
+                        if response.status_code < 500 and hasattr(response, "data"):
+                            cache.set(
+                                cache_key,
+                                {
+                                    "fingerprint": fingerprint,
+                                    "status": response.status_code,
+                                    "data": response.data,
+                                },
+                                timeout=IDEMPOTENCY_TTL,
+                            )
+                        return response
+                finally:
+                    cache.delete(lock_key)
+
+            if stored["fingerprint"] != fingerprint:
+                return Response(
+                    {"error": "Idempotency-Key was already used with a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            return Response(
+                stored["data"],
+                status=stored["status"],
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from Management.retention import (
+    RETENTION_CHUNK_SIZE,
+    RETENTION_POLICIES,
+    apply_retention,
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete or compact expired notifications, events, outbox rows, calls and seen markers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--policy',
+            action='append',
+            dest='policies',
+            help=f'Policy to run (repeatable). Available: {", ".join(RETENTION_POLICIES)}',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RETENTION_CHUNK_SIZE,
+            help=f'Rows deleted per transaction (default: {RETENTION_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows are expired',
+        )
+
+    def handle(self, *args, **options):
+        policies = options['policies']
+        unknown = set(policies or []) - set(RETENTION_POLICIES)
+        if unknown:
+            raise CommandError(f'Unknown policy: {", ".join(sorted(unknown))}')
+
+        def progress(policy, deleted):
+            self.stdout.write(f'  {policy}: {deleted} rows deleted')
+
+        report = apply_retention(
+            policies=policies,
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+
+        for policy, stats in report.items():
+            self.stdout.write(
+                f'{policy}: {stats["expired"]} expired, {stats["deleted"]} deleted '
+                f'in {stats["chunks"]} chunks ({stats["seconds"]}s)'
+            )
+        total = sum(stats['deleted'] for stats in report.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Dry run: nothing deleted' if options['dry_run'] else f'Deleted {total} rows'
+            )
+        )
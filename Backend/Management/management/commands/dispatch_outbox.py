@@ -0,0 +1,65 @@
+import time
+from django.core.management.base import BaseCommand
+from Management.outbox import OUTBOX_BATCH_SIZE, dead_letters, dispatch_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending WebSocket notifications from the notification outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of draining it once',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls in --loop mode (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help=f'Rows sent per channel layer round (default: {OUTBOX_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dead-letters',
+            action='store_true',
+            help='Only report the rows given up on after too many failed attempts',
+        )
+
+    def handle(self, *args, **options):
+        if options['dead_letters']:
+            self.report_dead_letters()
+            return
+
+        while True:
+            dispatched, failed = dispatch_pending(batch_size=options['batch_size'])
+            if dispatched or failed or not options['loop']:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Dispatched {dispatched} notifications')
+                    if not failed
+                    else self.style.WARNING(
+                        f'Dispatched {dispatched} notifications, {failed} failed (will retry)'
+                    )
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report_dead_letters(self):
+        entries = dead_letters().order_by('id')
+        count = entries.count()
+        if not count:
+            self.stdout.write(self.style.SUCCESS('No dead letters in the outbox'))
+            return
+        self.stdout.write(self.style.WARNING(f'{count} outbox rows were given up on:'))
+        for entry in entries[:50]:
+            self.stdout.write(
+                f'  #{entry.id} {entry.group} created {entry.created_at:%Y-%m-%d %H:%M} '
+                f'after {entry.attempts} attempts: {entry.last_error or "no error recorded"}'
+            )
+        if count > 50:
+            self.stdout.write(f'  ... and {count - 50} more')
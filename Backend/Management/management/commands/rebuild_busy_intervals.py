@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from Management.models import Booking, BookingStatus, GuideBusyInterval
+from Management.availability import aware_booking_interval
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the GuideBusyInterval table from accepted bookings (used by availability checks and search)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of intervals to insert per batch',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        deleted_count = GuideBusyInterval.objects.all().delete()[0]
+        self.stdout.write(f'Removed {deleted_count} existing busy intervals')
+
+        accepted = (
+            Booking.objects.filter(status=BookingStatus.ACCEPTED)
+            .select_related('tour')
+            .order_by('id')
+        )
+
+        batch = []
+        created_count = 0
+        for booking in accepted.iterator(chunk_size=batch_size):
+            start_at, end_at = aware_booking_interval(
+                booking.tour_date, booking.tour_time, booking.tour.duration
+            )
+            batch.append(
+                GuideBusyInterval(
+                    booking_id=booking.id,
+                    guide_id=booking.guide_id,
+                    start_at=start_at,
+                    end_at=end_at,
+                )
+            )
+            if len(batch) >= batch_size:
+                GuideBusyInterval.objects.bulk_create(batch)
+                created_count += len(batch)
+                batch = []
+
+        if batch:
+            GuideBusyInterval.objects.bulk_create(batch)
+            created_count += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {created_count} busy intervals from accepted bookings')
+        )
+        self.stdout.write(
+            'Cached availability refreshes within AVAILABILITY_CACHE_TIMEOUT'
+        )
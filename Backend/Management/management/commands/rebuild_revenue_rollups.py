@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Management.projections import reset_projector
+from Management.rollups import rebuild_revenue_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the GuideDailyRevenue rollup table from PastTour history'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created_count = rebuild_revenue_rollups()
+            # The rollup now covers every event logged so far
+            reset_projector('revenue_rollup', to_latest=True)
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {created_count} daily revenue rollup rows')
+        )
@@ -0,0 +1,72 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from Management.events import backfill_booking_events
+from Management.projections import (
+    PROJECTOR_BATCH_SIZE,
+    PROJECTORS,
+    rebuild_projection,
+    run_projectors,
+)
+
+
+class Command(BaseCommand):
+    help = 'Apply new BookingEvent rows to the dashboard counters and revenue rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--projector',
+            action='append',
+            dest='projectors',
+            help=f'Projector to run (repeatable). Available: {", ".join(PROJECTORS)}',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PROJECTOR_BATCH_SIZE,
+            help=f'Events applied per transaction (default: {PROJECTOR_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Add missing events for existing bookings and past tours first',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep applying new events (with BOOKING_PROJECTORS_AUTORUN = False)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between runs in --loop mode (default: 1)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Clear the derived views and replay the whole event log',
+        )
+
+    def handle(self, *args, **options):
+        projectors = options['projectors'] or list(PROJECTORS)
+        unknown = set(projectors) - set(PROJECTORS)
+        if unknown:
+            raise CommandError(f'Unknown projector: {", ".join(sorted(unknown))}')
+
+        if options['backfill']:
+            created = backfill_booking_events()
+            self.stdout.write(f'Backfilled {created} booking events')
+
+        if options['rebuild']:
+            applied = {name: rebuild_projection(name) for name in projectors}
+        else:
+            applied = run_projectors(projectors, batch_size=options['batch_size'])
+
+        while True:
+            for name, count in applied.items():
+                if count or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(f'{name}: applied {count} events'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+            applied = run_projectors(projectors, batch_size=options['batch_size'])
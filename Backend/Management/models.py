@@ -123,6 +123,38 @@ class Booking(models.Model):
         return self.is_past()
 
 
+class GuideBusyInterval(models.Model):
+    """
+    Time interval during which a guide is busy with an accepted booking.
+    Maintained from Booking signals so schedule checks can use an indexed
+    range query instead of scanning every booking in Python.
+    """
+
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name="busy_interval",
+        help_text="Accepted booking that occupies this interval",
+    )
+    guide = models.ForeignKey(
+        Guide,
+        on_delete=models.CASCADE,
+        related_name="busy_intervals",
+        help_text="Guide who is busy during this interval",
+    )
+    start_at = models.DateTimeField(help_text="When the tour starts")
+    end_at = models.DateTimeField(help_text="When the tour ends (start + duration)")
+
+    class Meta:
+        ordering = ["start_at"]
+        indexes = [
+            models.Index(fields=["guide", "start_at", "end_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.guide} busy {self.start_at} - {self.end_at}"
+
+
 class BookingNotification(models.Model):
     """
     Model to track notifications related to bookings
@@ -149,6 +181,8 @@ class BookingNotification(models.Model):
     )
     message = models.TextField(max_length=500)
     is_read = models.BooleanField(default=False, db_index=True)
+    # Position in the recipient's notification stream (see NotificationEvent)
+    seq = models.PositiveBigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -167,6 +201,94 @@ class BookingNotification(models.Model):
         self.save()
 
 
+class NotificationSequence(models.Model):
+    """
+    Last notification sequence number handed out to each user.
+    """
+
+    user = models.OneToOneField(
+        "Authentication.User",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_sequence",
+    )
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.last_seq}"
+
+
+class NotificationEvent(models.Model):
+    """
+    Per-user log of notification socket payloads (booking and chat
+    notifications), numbered by a monotonic sequence so a reconnecting
+    client can replay exactly what it missed.
+    """
+
+    KIND_CHOICES = [
+        ("booking", "Booking Notification"),
+        ("chat", "Chat Notification"),
+    ]
+
+    recipient = models.ForeignKey(
+        "Authentication.User",
+        on_delete=models.CASCADE,
+        related_name="notification_events",
+    )
+    seq = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["recipient", "seq"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipient", "seq"], name="unique_notification_event_seq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id}#{self.seq} ({self.kind})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Pending WebSocket messages, written in the same transaction as the
+    notification they announce and delivered by the outbox dispatcher.
+    Delivery is at-least-once: a row is retried until dispatched_at is set.
+    """
+
+    notification = models.ForeignKey(
+        BookingNotification,
+        on_delete=models.CASCADE,
+        related_name="outbox_entries",
+        null=True,
+        blank=True,
+    )
+    group = models.CharField(max_length=100)
+    message_type = models.CharField(max_length=50, default="chat.notification")
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["dispatched_at", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        state = "sent" if self.dispatched_at else f"pending ({self.attempts} attempts)"
+        return f"Outbox #{self.pk} -> {self.group} [{state}]"
+
+
 class PastTour(models.Model):
     """
     Model to store completed tours (accepted bookings that have passed)
@@ -292,4 +414,130 @@ class PastTour(models.Model):
             original_booking_date=booking.created_at,
         )
 
-        return past_tour
\ No newline at end of file
+        return past_tour
+
+
+class GuideDailyRevenue(models.Model):
+    """
+    Daily rollup of completed tours per guide and tour.
+    Maintained incrementally whenever a PastTour is recorded so dashboards
+    can chart revenue from a few rollup rows instead of the raw history.
+    """
+
+    guide = models.ForeignKey(
+        Guide,
+        on_delete=models.CASCADE,
+        related_name="daily_revenue",
+        help_text="Guide who led the tours",
+    )
+    tour = models.ForeignKey(
+        Tour,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="daily_revenue",
+        help_text="Reference to tour (nullable if tour is deleted)",
+    )
+    tour_name = models.CharField(max_length=100, help_text="Tour name at time of rollup")
+    day = models.DateField(help_text="Date the tours took place")
+
+    revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, help_text="Sum of total_price"
+    )
+    guests = models.PositiveIntegerField(default=0, help_text="Sum of number_of_guests")
+    completed_tours = models.PositiveIntegerField(
+        default=0, help_text="Number of completed tours"
+    )
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["guide", "tour", "day"], name="unique_guide_tour_day_revenue"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["guide", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.guide_id} / {self.tour_name} on {self.day}: {self.revenue}"
+
+
+class BookingEvent(models.Model):
+    """
+    Append-only log of booking state transitions.
+    Ids are stored as plain integers (no foreign keys) so the log survives
+    the deletion of bookings, tours and profiles. Projectors consume it in
+    id order to maintain derived views (see projections.py).
+    """
+
+    EVENT_TYPE_CHOICES = [
+        ("created", "Created"),
+        ("accepted", "Accepted"),
+        ("declined", "Declined"),
+        ("cancelled", "Cancelled"),
+        ("expired", "Expired"),
+        ("completed", "Completed"),
+    ]
+
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    booking_id = models.IntegerField(null=True, blank=True, db_index=True)
+    guide_id = models.IntegerField(db_index=True)
+    tourist_id = models.IntegerField()
+    tour_id = models.IntegerField(null=True, blank=True)
+    tour_name = models.CharField(max_length=100, blank=True)
+    tour_date = models.DateField()
+    tour_time = models.TimeField()
+    number_of_guests = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    occurred_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"#{self.pk} booking {self.booking_id} {self.event_type}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("BookingEvent is append-only")
+        super().save(*args, **kwargs)
+
+
+class ProjectorOffset(models.Model):
+    """
+    Last BookingEvent id applied by each projector.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+class GuideDashboardCounter(models.Model):
+    """
+    Per-guide booking counters projected from BookingEvent.
+    """
+
+    guide = models.OneToOneField(
+        Guide,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="dashboard_counter",
+    )
+    total_requests = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    declined = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    expired = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    completed_guests = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Counters for {self.guide}"
@@ -0,0 +1,284 @@
+"""
+Transactional outbox for booking WebSocket notifications.
+
+Notifications are written together with a NotificationOutbox row inside one
+transaction. After commit, a single background worker drains due rows and
+sends them through the channel layer in concurrent batches, retrying failed
+sends with exponential backoff. When failed rows remain, a timer schedules
+the next drain for the earliest retry, so retries do not wait for another
+notification to be enqueued. Request latency no longer depends on the
+channel layer, and a notification is never lost because Redis was slow.
+
+Set NOTIFICATION_OUTBOX_AUTODISPATCH = False to disable the in-process worker
+and run `python manage.py dispatch_outbox --loop` instead.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import BookingNotification, NotificationOutbox
+from .replay import allocate_seq, record_event
+
+
+# Rows sent per channel layer round
+OUTBOX_BATCH_SIZE = 100
+
+# Give up on a row after this many failed attempts (kept for inspection:
+# `dispatch_outbox --dead-letters`, pruned by the outbox_dead_letters
+# retention policy)
+OUTBOX_MAX_ATTEMPTS = 8
+
+# Seconds before a single group_send is considered failed
+OUTBOX_SEND_TIMEOUT = 5
+
+# Upper bound for the retry backoff, in seconds
+OUTBOX_MAX_BACKOFF = 300
+
+# Lower bound for the delay of a scheduled retry drain, in seconds
+OUTBOX_MIN_RETRY_DELAY = 1
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification-outbox")
+_drain_lock = threading.Lock()
+_drain_scheduled = False
+_retry_timer = None
+_retry_at = None
+
+
+def notification_group(user_id):
+    """Channel layer group of a user's notification socket."""
+    return f"notify_user_{user_id}"
+
+
+def build_notification_payload(notification):
+    """
+    Build the WebSocket payload of a BookingNotification.
+    Computed at enqueue time so the dispatcher does not need any joins.
+    """
+    booking = notification.booking
+    return {
+        "type": "booking_notification",
+        "id": notification.id,
+        "booking_id": notification.booking_id,
+        "tour_name": booking.tour.name if booking and booking.tour else "",
+        "notification_type": notification.notification_type,
+        "message": notification.message,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def enqueue(group, payload, notification=None, message_type="chat.notification"):
+    """
+    Add a message to the outbox and schedule a drain once the current
+    transaction commits.
+    """
+    entry = NotificationOutbox.objects.create(
+        notification=notification,
+        group=group,
+        message_type=message_type,
+        payload=payload,
+    )
+    transaction.on_commit(schedule_dispatch)
+    return entry
+
+
+def enqueue_notification(notification):
+    """
+    Queue the realtime delivery of an existing BookingNotification.
+    The payload is also logged in the recipient's replay stream.
+    """
+    with transaction.atomic():
+        if notification.seq is None:
+            notification.seq = allocate_seq(notification.recipient_id)
+            BookingNotification.objects.filter(pk=notification.pk).update(
+                seq=notification.seq
+            )
+        payload = record_event(
+            notification.recipient_id,
+            "booking",
+            build_notification_payload(notification),
+            seq=notification.seq,
+        )
+        return enqueue(
+            notification_group(notification.recipient_id),
+            payload,
+            notification=notification,
+        )
+
+
+def create_booking_notification(booking, recipient, notification_type, message):
+    """
+    Create a BookingNotification, its replay event and its outbox row
+    atomically.
+
+    Returns:
+        The created BookingNotification
+    """
+    with transaction.atomic():
+        notification = BookingNotification.objects.create(
+            booking=booking,
+            recipient=recipient,
+            notification_type=notification_type,
+            message=message,
+            seq=allocate_seq(recipient.pk),
+        )
+        enqueue_notification(notification)
+    return notification
+
+
+def schedule_dispatch():
+    """
+    Ask the background worker to drain the outbox.
+    Calls made while a drain is already queued are coalesced into it.
+    """
+    global _drain_scheduled
+    if not getattr(settings, "NOTIFICATION_OUTBOX_AUTODISPATCH", True):
+        return
+    with _drain_lock:
+        if _drain_scheduled:
+            return
+        _drain_scheduled = True
+    _executor.submit(_drain_in_background)
+
+
+def _drain_in_background():
+    global _drain_scheduled
+    with _drain_lock:
+        _drain_scheduled = False
+    try:
+        dispatch_pending()
+    except Exception as e:
+        # Rows stay pending and are picked up by the next drain
+        print(f"Error dispatching notification outbox: {str(e)}")
+    try:
+        _schedule_retry()
+    except Exception as e:
+        print(f"Error scheduling notification outbox retry: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def _schedule_retry():
+    """
+    Start a timer that drains the outbox again when the earliest failed
+    row becomes due. An earlier pending timer is kept.
+    """
+    global _retry_timer, _retry_at
+    if not get_channel_layer():
+        return
+    next_attempt_at = (
+        NotificationOutbox.objects.filter(
+            dispatched_at__isnull=True, attempts__lt=OUTBOX_MAX_ATTEMPTS
+        )
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+    if next_attempt_at is None:
+        return
+
+    with _drain_lock:
+        if _retry_timer is not None and _retry_timer.is_alive() and _retry_at <= next_attempt_at:
+            return
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        delay = max((next_attempt_at - timezone.now()).total_seconds(), OUTBOX_MIN_RETRY_DELAY)
+        _retry_at = next_attempt_at
+        _retry_timer = threading.Timer(delay, schedule_dispatch)
+        _retry_timer.daemon = True
+        _retry_timer.start()
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2 ** attempts, OUTBOX_MAX_BACKOFF))
+
+
+async def _send_batch(channel_layer, entries):
+    """
+    Send a batch of outbox rows concurrently.
+
+    Returns:
+        List with None for each delivered row, or the raised exception
+    """
+
+    async def send(entry):
+        await asyncio.wait_for(
+            channel_layer.group_send(
+                entry.group, {"type": entry.message_type, "payload": entry.payload}
+            ),
+            timeout=OUTBOX_SEND_TIMEOUT,
+        )
+
+    return await asyncio.gather(
+        *(send(entry) for entry in entries), return_exceptions=True
+    )
+
+
+def dead_letters():
+    """Outbox rows given up on after OUTBOX_MAX_ATTEMPTS failed sends."""
+    return NotificationOutbox.objects.filter(
+        dispatched_at__isnull=True, attempts__gte=OUTBOX_MAX_ATTEMPTS
+    )
+
+
+def dispatch_pending(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Deliver every due outbox row, batch by batch.
+
+    Returns:
+        Tuple of (dispatched count, failed count)
+    """
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return 0, 0
+
+    dispatched_total = failed_total = 0
+    last_id = 0
+
+    while True:
+        now = timezone.now()
+        entries = list(
+            NotificationOutbox.objects.filter(
+                id__gt=last_id,
+                dispatched_at__isnull=True,
+                next_attempt_at__lte=now,
+                attempts__lt=OUTBOX_MAX_ATTEMPTS,
+            ).order_by("id")[:batch_size]
+        )
+        if not entries:
+            break
+        last_id = entries[-1].id
+
+        results = async_to_sync(_send_batch)(channel_layer, entries)
+
+        sent_ids = []
+        failed = []
+        for entry, result in zip(entries, results):
+            if isinstance(result, BaseException):
+                entry.attempts += 1
+                entry.next_attempt_at = now + _backoff(entry.attempts)
+                entry.last_error = repr(result)[:1000]
+                failed.append(entry)
+            else:
+                sent_ids.append(entry.id)
+
+        if sent_ids:
+            NotificationOutbox.objects.filter(id__in=sent_ids).update(
+                dispatched_at=timezone.now()
+            )
+        if failed:
+            NotificationOutbox.objects.bulk_update(
+                failed, ["attempts", "next_attempt_at", "last_error"]
+            )
+
+        dispatched_total += len(sent_ids)
+        failed_total += len(failed)
+
+    return dispatched_total, failed_total
@@ -0,0 +1,244 @@
+"""
+Projectors over the BookingEvent log.
+Each projector applies new events in id order and stores the last applied id
+in ProjectorOffset, in the same transaction as its changes, so every event
+is applied exactly once and catching up only reads the tail of the log.
+
+Projectors:
+- dashboard_counters: GuideDashboardCounter rows (requests, accepted,
+  declined, cancelled, expired, completed, guests, revenue)
+- revenue_rollup: GuideDailyRevenue rows (see rollups.py)
+
+Projectors never run on the read path: a background worker catches them up
+after each event commits. Set BOOKING_PROJECTORS_AUTORUN = False to disable
+it and run `python manage.py run_projectors --loop` instead. Readers check
+projection_ready() and fall back to the source tables until the projection
+includes the backfilled history.
+"""
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F, Max
+from .models import BookingEvent, GuideDailyRevenue, GuideDashboardCounter, ProjectorOffset
+from .rollups import add_completed_tour
+from Profiles.models import Guide
+from Tour.models import Tour
+
+
+# Events applied per transaction
+PROJECTOR_BATCH_SIZE = 500
+
+# Lock timeout, in seconds (released as soon as the run ends)
+PROJECTOR_LOCK_TIMEOUT = 300
+
+# Seconds before a failed background run is retried
+PROJECTOR_RETRY_DELAY = 5
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="booking-projectors")
+_run_lock = threading.Lock()
+_run_scheduled = False
+
+# Event type -> GuideDashboardCounter field incremented by one
+COUNTER_FIELDS = {
+    "created": "total_requests",
+    "accepted": "accepted",
+    "declined": "declined",
+    "cancelled": "cancelled",
+    "expired": "expired",
+    "completed": "completed",
+}
+
+
+def apply_dashboard_counters(events):
+    """Add a batch of events to the per-guide dashboard counters."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for event in events:
+        guide_deltas = deltas[event.guide_id]
+        guide_deltas[COUNTER_FIELDS[event.event_type]] += 1
+        if event.event_type == "completed":
+            guide_deltas["completed_guests"] += event.number_of_guests
+            guide_deltas["revenue"] += event.total_price or Decimal("0")
+
+    # Events keep the ids of deleted guides; their counters are gone
+    existing_guides = set(
+        Guide.objects.filter(pk__in=list(deltas)).values_list("pk", flat=True)
+    )
+    for guide_id, fields in deltas.items():
+        if guide_id not in existing_guides:
+            continue
+        updated = GuideDashboardCounter.objects.filter(guide_id=guide_id).update(
+            **{field: F(field) + value for field, value in fields.items()}
+        )
+        if not updated:
+            GuideDashboardCounter.objects.create(guide_id=guide_id, **fields)
+
+
+def apply_revenue_rollup(events):
+    """Add the completed tours of a batch of events to GuideDailyRevenue."""
+    completed = [event for event in events if event.event_type == "completed"]
+    if not completed:
+        return
+
+    # Events keep the ids of deleted tours; the rollup row keeps only the name
+    existing_tours = set(
+        Tour.objects.filter(
+            id__in={event.tour_id for event in completed if event.tour_id}
+        ).values_list("id", flat=True)
+    )
+    for event in completed:
+        add_completed_tour(
+            event.guide_id,
+            event.tour_id if event.tour_id in existing_tours else None,
+            event.tour_name,
+            event.tour_date,
+            event.total_price,
+            event.number_of_guests,
+        )
+
+
+PROJECTORS = {
+    "dashboard_counters": apply_dashboard_counters,
+    "revenue_rollup": apply_revenue_rollup,
+}
+
+
+def run_projector(name, batch_size=PROJECTOR_BATCH_SIZE):
+    """
+    Apply every event newer than the projector's offset.
+    Returns immediately if another process is already running it.
+
+    Returns:
+        Number of events applied
+    """
+    apply = PROJECTORS[name]
+    lock_key = f"projector_lock:{name}"
+    if not cache.add(lock_key, True, timeout=PROJECTOR_LOCK_TIMEOUT):
+        return 0
+
+    applied = 0
+    try:
+        offset, _ = ProjectorOffset.objects.get_or_create(name=name)
+        last_event_id = offset.last_event_id
+        while True:
+            events = list(
+                BookingEvent.objects.filter(id__gt=last_event_id).order_by("id")[:batch_size]
+            )
+            if not events:
+                break
+            with transaction.atomic():
+                apply(events)
+                last_event_id = events[-1].id
+                ProjectorOffset.objects.filter(name=name).update(last_event_id=last_event_id)
+            applied += len(events)
+    finally:
+        cache.delete(lock_key)
+
+    return applied
+
+
+def run_projectors(names=None, batch_size=PROJECTOR_BATCH_SIZE):
+    """
+    Catch up the given projectors (default: all).
+
+    Returns:
+        Dict of projector name -> events applied
+    """
+    return {
+        name: run_projector(name, batch_size=batch_size)
+        for name in names or PROJECTORS
+    }
+
+
+def reset_projector(name, to_latest=False):
+    """
+    Move a projector's offset back to the start of the log, or forward to
+    the latest event (after its derived view was rebuilt by other means).
+    """
+    last_event_id = 0
+    if to_latest:
+        last_event_id = BookingEvent.objects.aggregate(last=Max("id"))["last"] or 0
+    ProjectorOffset.objects.update_or_create(
+        name=name, defaults={"last_event_id": last_event_id}
+    )
+
+
+def rebuild_projection(name):
+    """
+    Clear a projector's derived view and replay the whole log into it.
+
+    Returns:
+        Number of events applied
+    """
+    with transaction.atomic():
+        if name == "dashboard_counters":
+            GuideDashboardCounter.objects.all().delete()
+        elif name == "revenue_rollup":
+            GuideDailyRevenue.objects.all().delete()
+        reset_projector(name)
+    return run_projector(name)
+
+
+def schedule_projectors():
+    """
+    Ask the background worker to catch up every projector.
+    Calls made while a run is already queued are coalesced into it.
+    """
+    global _run_scheduled
+    if not getattr(settings, "BOOKING_PROJECTORS_AUTORUN", True):
+        return
+    with _run_lock:
+        if _run_scheduled:
+            return
+        _run_scheduled = True
+    _executor.submit(_run_in_background)
+
+
+def _run_in_background():
+    global _run_scheduled
+    with _run_lock:
+        _run_scheduled = False
+    try:
+        run_projectors()
+    except Exception as e:
+        # Offsets only move with applied events; retry the rest later
+        print(f"Error running booking projectors: {str(e)}")
+        retry = threading.Timer(PROJECTOR_RETRY_DELAY, schedule_projectors)
+        retry.daemon = True
+        retry.start()
+    finally:
+        close_old_connections()
+
+
+def projection_ready(name):
+    """
+    Whether a projector's view includes the backfilled history, i.e. its
+    offset has passed the backfill marker.
+    """
+    from .events import BACKFILL_MARKER
+
+    offsets = dict(
+        ProjectorOffset.objects.filter(name__in=[name, BACKFILL_MARKER]).values_list(
+            "name", "last_event_id"
+        )
+    )
+    if BACKFILL_MARKER not in offsets:
+        return False
+    return offsets.get(name, 0) >= offsets[BACKFILL_MARKER]
+
+
+def backfill_after_migrate(**kwargs):
+    """
+    post_migrate handler: the first migrate with the event log backfills it
+    from the existing bookings and applies it, so projected views are
+    complete right after deploy.
+    """
+    from .events import BACKFILL_MARKER, backfill_booking_events
+
+    if ProjectorOffset.objects.filter(name=BACKFILL_MARKER).exists():
+        return
+    backfill_booking_events()
+    run_projectors()
@@ -0,0 +1,137 @@
+"""
+Sequenced notification stream for WebSocket replay.
+Every booking and chat notification sent to a user's notification socket is
+numbered with a per-user monotonic sequence and logged in NotificationEvent.
+A reconnecting client passes the last sequence it saw (?since_seq=N) and gets
+only the missed events from one indexed range query.
+"""
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import NotificationEvent, NotificationSequence
+
+
+# Maximum number of events replayed on connect; clients further behind
+# are told to resync over REST instead.
+REPLAY_MAX_EVENTS = 200
+
+
+def allocate_seq(user_id, count=1):
+    """
+    Reserve `count` consecutive sequence numbers for a user.
+    The row update holds the sequence row lock until the surrounding
+    transaction ends, so numbers are handed out in commit order.
+
+    Returns:
+        The first reserved sequence number
+    """
+    with transaction.atomic():
+        updated = NotificationSequence.objects.filter(user_id=user_id).update(
+            last_seq=F("last_seq") + count
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    NotificationSequence.objects.create(user_id=user_id, last_seq=count)
+                return 1
+            except IntegrityError:
+                # Created concurrently; take the regular path
+                NotificationSequence.objects.filter(user_id=user_id).update(
+                    last_seq=F("last_seq") + count
+                )
+        last_seq = NotificationSequence.objects.values_list("last_seq", flat=True).get(
+            user_id=user_id
+        )
+    return last_seq - count + 1
+
+
+def record_event(user_id, kind, payload, seq=None):
+    """
+    Log a notification payload in the user's stream.
+    The payload is stamped with its sequence number.
+
+    Returns:
+        The stamped payload
+    """
+    if seq is None:
+        seq = allocate_seq(user_id)
+    payload = {**payload, "seq": seq}
+    NotificationEvent.objects.create(
+        recipient_id=user_id, seq=seq, kind=kind, payload=payload
+    )
+    return payload
+
+
+def record_events(user_ids, kind, payload):
+    """
+    Log the same payload in several users' streams.
+
+    Returns:
+        Dict of user id -> stamped payload
+    """
+    return dict(record_event_batch([(user_id, kind, payload) for user_id in user_ids]))
+
+
+def record_event_batch(events):
+    """
+    Log several notifications with one sequence update per user.
+
+    Args:
+        events: List of (user id, kind, payload)
+
+    Returns:
+        List of (user id, stamped payload), in the order of events
+    """
+    counts = Counter(user_id for user_id, _, _ in events)
+    stamped = []
+    with transaction.atomic():
+        next_seq = {
+            user_id: allocate_seq(user_id, count) for user_id, count in counts.items()
+        }
+        rows = []
+        for user_id, kind, payload in events:
+            seq = next_seq[user_id]
+            next_seq[user_id] += 1
+            data = {**payload, "seq": seq}
+            rows.append(
+                NotificationEvent(recipient_id=user_id, seq=seq, kind=kind, payload=data)
+            )
+            stamped.append((user_id, data))
+        NotificationEvent.objects.bulk_create(rows)
+    return stamped
+
+
+def get_latest_seq(user_id):
+    """Return the last sequence number handed out to a user (0 if none)."""
+    return (
+        NotificationSequence.objects.filter(user_id=user_id)
+        .values_list("last_seq", flat=True)
+        .first()
+        or 0
+    )
+
+
+def get_events_since(user_id, since_seq, limit=REPLAY_MAX_EVENTS):
+    """
+    Get the payloads a user missed after since_seq, oldest first.
+
+    Returns:
+        Tuple of (payloads, latest_seq, complete). complete is False when more
+        than `limit` events were missed, or when older events were already
+        removed by retention; the client should then resync over REST.
+    """
+    latest_seq = get_latest_seq(user_id)
+    if since_seq >= latest_seq:
+        return [], latest_seq, True
+
+    events = list(
+        NotificationEvent.objects.filter(recipient_id=user_id, seq__gt=since_seq)
+        .order_by("seq")
+        .values_list("seq", "payload")[: limit + 1]
+    )
+    complete = (
+        len(events) <= limit
+        and bool(events)
+        and events[0][0] == since_seq + 1
+    )
+    return [payload for _, payload in events[:limit]], latest_seq, complete
@@ -0,0 +1,213 @@
+"""
+Retention and compaction for tables that grow with usage.
+
+Each policy selects expired rows and deletes them in small chunks by primary
+key, one short transaction per chunk, so SQLite never holds its write lock
+for long and concurrent requests keep flowing. Call rows are rolled up into
+CallMonthlyStats in the same transaction as their deletion.
+
+PastTour is tour history shown to users (and the source of reviews and
+revenue rollups), so it is never pruned here.
+
+Retention windows can be tuned in settings, e.g. RETENTION_READ_NOTIFICATION_DAYS.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from Chat.models import Call, CallMonthlyStats, Message, RoomLastSeen
+from .models import BookingNotification, NotificationEvent, NotificationOutbox
+from .outbox import dead_letters
+
+
+# Rows deleted per transaction
+RETENTION_CHUNK_SIZE = 500
+
+# Default retention windows, in days (overridable in settings)
+DEFAULT_RETENTION_DAYS = {
+    "READ_NOTIFICATION": 90,
+    "NOTIFICATION_EVENT": 30,
+    "OUTBOX": 7,
+    "OUTBOX_DEAD_LETTER": 30,
+    "CALL": 180,
+}
+
+FINISHED_CALL_STATUSES = ["rejected", "missed", "ended", "failed"]
+
+
+def retention_days(name):
+    """Retention window for a policy, e.g. retention_days("CALL")."""
+    return getattr(settings, f"RETENTION_{name}_DAYS", DEFAULT_RETENTION_DAYS[name])
+
+
+def _cutoff(name, now):
+    return now - timedelta(days=retention_days(name))
+
+
+def delete_in_chunks(queryset, chunk_size=RETENTION_CHUNK_SIZE, on_chunk=None, before_delete=None):
+    """
+    Delete every row of a queryset, chunk by chunk.
+
+    Args:
+        queryset: Rows to delete
+        chunk_size: Rows per transaction
+        on_chunk: Optional callback(deleted_so_far) called after each chunk
+        before_delete: Optional callback(ids) run inside each chunk's
+            transaction before the rows are deleted (used for rollups)
+
+    Returns:
+        Tuple of (deleted rows, chunks)
+    """
+    model = queryset.model
+    deleted = chunks = 0
+
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            if before_delete:
+                before_delete(ids)
+            # Count rows of this model only, not cascaded rows
+            count = model.objects.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+        if not count:
+            break
+        deleted += count
+        chunks += 1
+        if on_chunk:
+            on_chunk(deleted)
+        if len(ids) < chunk_size:
+            break
+
+    return deleted, chunks
+
+
+def _month_start(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def rollup_calls(call_ids):
+    """
+    Add the given Call rows to their participants' CallMonthlyStats.
+    Must run in the same transaction as the deletion of those calls.
+
+    Returns:
+        Number of stats rows touched
+    """
+    totals = defaultdict(lambda: {"calls_made": 0, "calls_received": 0, "answered_calls": 0, "total_duration": 0})
+
+    calls = Call.objects.filter(pk__in=call_ids).values_list(
+        "caller_id", "callee_id", "created_at", "answered_at", "duration"
+    )
+    for caller_id, callee_id, created_at, answered_at, duration in calls:
+        month = _month_start(created_at)
+        for user_id, field in ((caller_id, "calls_made"), (callee_id, "calls_received")):
+            row = totals[(user_id, month)]
+            row[field] += 1
+            if answered_at:
+                row["answered_calls"] += 1
+                row["total_duration"] += duration or 0
+
+    for (user_id, month), row in totals.items():
+        updated = CallMonthlyStats.objects.filter(user_id=user_id, month=month).update(
+            **{field: F(field) + value for field, value in row.items()}
+        )
+        if not updated:
+            CallMonthlyStats.objects.create(user_id=user_id, month=month, **row)
+
+    return len(totals)
+
+
+def _read_notifications(now):
+    return BookingNotification.objects.filter(
+        is_read=True, created_at__lt=_cutoff("READ_NOTIFICATION", now)
+    )
+
+
+def _notification_events(now):
+    return NotificationEvent.objects.filter(
+        created_at__lt=_cutoff("NOTIFICATION_EVENT", now)
+    )
+
+
+def _dispatched_outbox(now):
+    return NotificationOutbox.objects.filter(
+        dispatched_at__lt=_cutoff("OUTBOX", now)
+    )
+
+
+def _dead_letter_outbox(now):
+    # Never dispatched: aged out by creation time instead
+    return dead_letters().filter(
+        created_at__lt=_cutoff("OUTBOX_DEAD_LETTER", now)
+    )
+
+
+def _finished_calls(now):
+    return Call.objects.filter(
+        status__in=FINISHED_CALL_STATUSES, created_at__lt=_cutoff("CALL", now)
+    )
+
+
+def _orphan_room_last_seen(now):
+    # Seen markers of rooms that no longer have any message
+    return RoomLastSeen.objects.filter(
+        ~Exists(Message.objects.filter(room=OuterRef("room")))
+    )
+
+
+# Policy name -> (queryset builder, rollup run before each deleted chunk)
+RETENTION_POLICIES = {
+    "read_notifications": (_read_notifications, None),
+    "notification_events": (_notification_events, None),
+    "notification_outbox": (_dispatched_outbox, None),
+    "outbox_dead_letters": (_dead_letter_outbox, None),
+    "calls": (_finished_calls, rollup_calls),
+    "room_last_seen": (_orphan_room_last_seen, None),
+}
+
+
+def apply_retention(policies=None, chunk_size=RETENTION_CHUNK_SIZE, dry_run=False, progress=None, now=None):
+    """
+    Apply retention policies.
+
+    Args:
+        policies: Policy names to run (default: all of RETENTION_POLICIES)
+        chunk_size: Rows deleted per transaction
+        dry_run: Only count the expired rows
+        progress: Optional callback(policy, deleted_so_far)
+
+    Returns:
+        Dict of policy -> {"expired", "deleted", "chunks", "seconds"}
+    """
+    now = now or timezone.now()
+    report = {}
+
+    for name in policies or RETENTION_POLICIES:
+        build_queryset, rollup = RETENTION_POLICIES[name]
+        queryset = build_queryset(now)
+        started = time.monotonic()
+
+        expired = queryset.count()
+        deleted = chunks = 0
+        if expired and not dry_run:
+            deleted, chunks = delete_in_chunks(
+                queryset,
+                chunk_size=chunk_size,
+                on_chunk=(lambda count, name=name: progress(name, count)) if progress else None,
+                before_delete=rollup,
+            )
+
+        report[name] = {
+            "expired": expired,
+            "deleted": deleted,
+            "chunks": chunks,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+
+    return report
@@ -0,0 +1,143 @@
+"""
+Incrementally maintained revenue rollups for the guide dashboard.
+Each completed tour is added to its (guide, tour, day) row in
+GuideDailyRevenue by the "revenue_rollup" projector (see projections.py),
+so charts read a few hundred rollup rows instead of re-aggregating the
+whole PastTour history.
+"""
+from datetime import date
+from django.utils import timezone
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncMonth
+from .models import GuideDailyRevenue, PastTour
+
+
+def add_completed_tour(guide_id, tour_id, tour_name, day, revenue, guests):
+    """
+    Add one completed tour to its (guide, tour, day) rollup row.
+    """
+    increments = {
+        "revenue": F("revenue") + (revenue or 0),
+        "guests": F("guests") + guests,
+        "completed_tours": F("completed_tours") + 1,
+    }
+    lookup = {
+        "guide_id": guide_id,
+        "tour_id": tour_id,
+        "day": day,
+    }
+
+    if GuideDailyRevenue.objects.filter(**lookup).update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            GuideDailyRevenue.objects.create(
+                **lookup,
+                tour_name=tour_name,
+                revenue=revenue or 0,
+                guests=guests,
+                completed_tours=1,
+            )
+    except IntegrityError:
+        # Row was created concurrently - fall back to incrementing it
+        GuideDailyRevenue.objects.filter(**lookup).update(**increments)
+
+
+def rebuild_revenue_rollups():
+    """
+    Recompute every rollup row from PastTour with a single grouped query.
+
+    Returns:
+        Number of rollup rows created
+    """
+    grouped = (
+        PastTour.objects.values("guide_id", "tour_id", "tour_date")
+        .annotate(
+            revenue_sum=Sum("total_price"),
+            guests_sum=Sum("number_of_guests"),
+            completed=Count("id"),
+            last_tour_name=Max("tour_name"),
+        )
+        .order_by()
+    )
+
+    rows = [
+        GuideDailyRevenue(
+            guide_id=entry["guide_id"],
+            tour_id=entry["tour_id"],
+            tour_name=entry["last_tour_name"],
+            day=entry["tour_date"],
+            revenue=entry["revenue_sum"] or 0,
+            guests=entry["guests_sum"] or 0,
+            completed_tours=entry["completed"],
+        )
+        for entry in grouped
+    ]
+
+    with transaction.atomic():
+        GuideDailyRevenue.objects.all().delete()
+        GuideDailyRevenue.objects.bulk_create(rows, batch_size=500)
+
+    return len(rows)
+
+
+def get_monthly_revenue(guide, months=12, today=None, from_rollup=True):
+    """
+    Monthly revenue series for a guide over the last `months` months,
+    including months without any completed tour.
+
+    Args:
+        from_rollup: Read GuideDailyRevenue; False aggregates PastTour
+            directly (while the rollup is not complete yet)
+
+    Returns:
+        List of {"month", "revenue", "guests", "completed_tours"} dicts, oldest first
+    """
+    today = today or timezone.localdate()
+    first_month = _shift_month(today.replace(day=1), -(months - 1))
+
+    if from_rollup:
+        rows = (
+            GuideDailyRevenue.objects.filter(guide=guide, day__gte=first_month)
+            .annotate(month=TruncMonth("day"))
+            .values("month")
+            .annotate(
+                revenue_sum=Sum("revenue"),
+                guests_sum=Sum("guests"),
+                completed_sum=Sum("completed_tours"),
+            )
+        )
+    else:
+        rows = (
+            PastTour.objects.filter(guide=guide, tour_date__gte=first_month)
+            .annotate(month=TruncMonth("tour_date"))
+            .values("month")
+            .annotate(
+                revenue_sum=Sum("total_price"),
+                guests_sum=Sum("number_of_guests"),
+                completed_sum=Count("id"),
+            )
+        )
+    totals = {entry["month"]: entry for entry in rows.order_by("month")}
+
+    series = []
+    for offset in range(months):
+        month = _shift_month(first_month, offset)
+        entry = totals.get(month, {})
+        series.append(
+            {
+                "month": month.strftime("%Y-%m"),
+                "revenue": float(entry.get("revenue_sum") or 0),
+                "guests": entry.get("guests_sum") or 0,
+                "completed_tours": entry.get("completed_sum") or 0,
+            }
+        )
+    return series
+
+
+def _shift_month(month_start, offset):
+    """Return the first day of the month `offset` months from month_start."""
+    index = month_start.year * 12 + month_start.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
@@ -4,38 +4,24 @@ from Tour.models import Tour
 from Profiles.models import Tourist, Guide
 from django.utils import timezone
 from datetime import datetime
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .outbox import create_booking_notification
 
 
-def send_booking_ws_notification(notification):
-    """Send a realtime WebSocket notification for a BookingNotification instance."""
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        return
-
-    try:
-        payload = {
-            "type": "booking_notification",
-            "id": notification.id,
-            "booking_id": notification.booking_id,
-            "tour_name": notification.booking.tour.name if notification.booking and notification.booking.tour else "",
-            "notification_type": notification.notification_type,
-            "message": notification.message,
-            "is_read": notification.is_read,
-            "created_at": notification.created_at.isoformat() if notification.created_at else None,
-        }
-
-        async_to_sync(channel_layer.group_send)(
-            f"notify_user_{notification.recipient_id}",
-            {
-                "type": "chat.notification",
-                "payload": payload,
-            },
-        )
-    except Exception:
-        # Fail silently - notifications should not break main flow
-        pass
+def get_tour_thumbnail_url(tour, request):
+    """
+    Return the absolute URL of a tour's thumbnail image.
+    Iterates tour.tour_images.all() instead of filtering, so a
+    prefetch_related("tour__tour_images") is reused rather than issuing
+    one query per serialized row.
+    """
+    if not tour or not request:
+        return None
+    thumbnail = next(
+        (image for image in tour.tour_images.all() if image.isthumbnail), None
+    )
+    if thumbnail and thumbnail.image:
+        return request.build_absolute_uri(thumbnail.image.url)
+    return None
 
 
 class BookingSerializer(serializers.ModelSerializer):
@@ -190,15 +176,13 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         
         booking = Booking.objects.create(**validated_data)
         
-        # Create notification for guide
-        notification = BookingNotification.objects.create(
-            booking=booking,
-            recipient=booking.guide.user,
-            notification_type='new_booking',
-            message=f"New booking request from {tourist.user.username} for {tour.name}"
+        # Create notification for guide (realtime delivery via the outbox)
+        create_booking_notification(
+            booking,
+            booking.guide.user,
+            'new_booking',
+            f"New booking request from {tourist.user.username} for {tour.name}",
         )
-        # Send realtime WebSocket notification 
-        send_booking_ws_notification(notification)
         
         return booking
 
@@ -251,12 +235,7 @@ class BookingListSerializer(serializers.ModelSerializer):
     
     def get_tour_thumbnail(self, obj):
         """Get tour thumbnail image URL"""
-        thumbnail = obj.tour.tour_images.filter(isthumbnail=True).first()
-        if thumbnail and thumbnail.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(thumbnail.image.url)
-        return None
+        return get_tour_thumbnail_url(obj.tour, self.context.get('request'))
 
 
 class BookingNotificationSerializer(serializers.ModelSerializer):
@@ -275,9 +254,10 @@ class BookingNotificationSerializer(serializers.ModelSerializer):
             'notification_type',
             'message',
             'is_read',
+            'seq',
             'created_at',
         ]
-        read_only_fields = ['id', 'booking_id', 'tour_name', 'notification_type', 'message', 'created_at']
+        read_only_fields = ['id', 'booking_id', 'tour_name', 'notification_type', 'message', 'seq', 'created_at']
 
 
 class PastTourSerializer(serializers.ModelSerializer):
@@ -316,13 +296,7 @@ class PastTourSerializer(serializers.ModelSerializer):
     
     def get_tour_thumbnail(self, obj):
         """Get tour thumbnail image URL if tour still exists"""
-        if obj.tour:
-            thumbnail = obj.tour.tour_images.filter(isthumbnail=True).first()
-            if thumbnail and thumbnail.image:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(thumbnail.image.url)
-        return None
+        return get_tour_thumbnail_url(obj.tour, self.context.get('request'))
 
 
 class PastTourListSerializer(serializers.ModelSerializer):
@@ -354,13 +328,7 @@ class PastTourListSerializer(serializers.ModelSerializer):
     
     def get_tour_thumbnail(self, obj):
         """Get tour thumbnail image URL if tour still exists"""
-        if obj.tour:
-            thumbnail = obj.tour.tour_images.filter(isthumbnail=True).first()
-            if thumbnail and thumbnail.image:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(thumbnail.image.url)
-        return None
+        return get_tour_thumbnail_url(obj.tour, self.context.get('request'))
 
 
 class FrontendBookingCardSerializer(serializers.ModelSerializer):
@@ -406,12 +374,7 @@ class FrontendBookingCardSerializer(serializers.ModelSerializer):
 
     def get_image(self, obj):
         """Return the same thumbnail logic used elsewhere"""
-        thumbnail = obj.tour.tour_images.filter(isthumbnail=True).first()
-        if thumbnail and thumbnail.image:
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(thumbnail.image.url)
-        return None
+        return get_tour_thumbnail_url(obj.tour, self.context.get("request"))
 
     def get_totalPrice(self, obj):
         return float(obj.total_price)
@@ -465,11 +428,5 @@ class FrontendPastTourCardSerializer(serializers.ModelSerializer):
         return None
 
     def get_image(self, obj):
-        if obj.tour:
-            thumbnail = obj.tour.tour_images.filter(isthumbnail=True).first()
-            if thumbnail and thumbnail.image:
-                request = self.context.get("request")
-                if request:
-                    return request.build_absolute_uri(thumbnail.image.url)
-        return None
+        return get_tour_thumbnail_url(obj.tour, self.context.get("request"))
 
@@ -1,3 +1,145 @@
 # Signals for automatic booking management
 # Note: Declined bookings are deleted immediately in the view,
 # no need for post_save signal
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Booking, BookingNotification, BookingStatus, PastTour
+from .availability import (
+    invalidate_guide_availability,
+    resync_tour_intervals,
+    sync_busy_interval,
+)
+from .events import (
+    STATUS_EVENT_TYPES,
+    deletion_event_type,
+    record_booking_event,
+    record_completion_event,
+)
+from .unread import adjust_unread_count
+from Tour.models import Tour
+
+
+def _booking_state(instance):
+    """Snapshot of the booking fields that affect guide availability."""
+    # Read from __dict__ so deferred fields are not loaded on post_init
+    fields = instance.__dict__
+    return (
+        fields.get("guide_id"),
+        fields.get("tour_date"),
+        fields.get("tour_time"),
+        fields.get("status"),
+    )
+
+
+def _invalidate_for_state(instance, state):
+    guide_id, tour_date, tour_time, booking_status = state
+    if booking_status != BookingStatus.ACCEPTED:
+        return
+    try:
+        duration = instance.tour.duration
+    except Tour.DoesNotExist:
+        duration = 0
+    invalidate_guide_availability(guide_id, tour_date, tour_time, duration)
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_state(sender, instance, **kwargs):
+    """
+    Remember the loaded state so post_save can tell what changed.
+    """
+    instance._original_state = _booking_state(instance)
+
+
+@receiver(post_save, sender=Booking)
+def log_booking_transition(sender, instance, created, **kwargs):
+    """
+    Append booking creations and status transitions to the event log.
+    Registered before sync_availability_on_save, which resets _original_state.
+    """
+    if created:
+        record_booking_event(instance, "created")
+        if instance.status in STATUS_EVENT_TYPES:
+            record_booking_event(instance, STATUS_EVENT_TYPES[instance.status])
+        return
+
+    original = getattr(instance, "_original_state", None)
+    if original and original[3] != instance.status and instance.status in STATUS_EVENT_TYPES:
+        record_booking_event(instance, STATUS_EVENT_TYPES[instance.status])
+
+
+@receiver(post_save, sender=Booking)
+def sync_availability_on_save(sender, instance, created, **kwargs):
+    """
+    Keep the guide's busy interval in sync and invalidate the availability
+    cache when a booking becomes accepted, stops being accepted
+    (cancel/decline), or an accepted booking is moved.
+    """
+    original = getattr(instance, "_original_state", None)
+    current = _booking_state(instance)
+
+    if created or original != current:
+        sync_busy_interval(instance)
+        if original and not created:
+            _invalidate_for_state(instance, original)
+        _invalidate_for_state(instance, current)
+
+    instance._original_state = current
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_availability_on_delete(sender, instance, **kwargs):
+    """
+    Deleting a booking (tourist cancel) frees the guide's slot.
+    The busy interval row is removed by the CASCADE.
+    Cancellations and expirations are appended to the event log.
+    """
+    _invalidate_for_state(instance, _booking_state(instance))
+
+    event_type = deletion_event_type(instance)
+    if event_type:
+        record_booking_event(instance, event_type)
+
+
+@receiver(post_init, sender=Tour)
+def remember_tour_duration(sender, instance, **kwargs):
+    instance._original_duration = instance.__dict__.get("duration")
+
+
+@receiver(post_save, sender=Tour)
+def resync_intervals_on_duration_change(sender, instance, created, **kwargs):
+    """
+    A new tour duration moves the end of its accepted bookings' busy
+    intervals (and the cached availability days they cover).
+    """
+    original = getattr(instance, "_original_duration", None)
+    if not created and original is not None and original != instance.duration:
+        resync_tour_intervals(instance, original)
+    instance._original_duration = instance.duration
+
+
+@receiver(post_save, sender=PastTour)
+def log_tour_completion(sender, instance, created, **kwargs):
+    """
+    Append each newly completed tour to the event log; the revenue rollup
+    and dashboard counters are projected from it.
+    """
+    if created:
+        record_completion_event(instance)
+
+
+@receiver(post_save, sender=BookingNotification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """
+    Count a new unread notification in the recipient's unread counter.
+    """
+    if created and not instance.is_read:
+        adjust_unread_count(instance.recipient_id, 1)
+
+
+@receiver(post_delete, sender=BookingNotification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """
+    Unread notifications removed with their booking leave the counter too.
+    """
+    if not instance.is_read:
+        adjust_unread_count(instance.recipient_id, -1)
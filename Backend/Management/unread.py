@@ -0,0 +1,78 @@
+"""
+Per-user unread notification counter.
+The count lives in the shared cache (Redis, see CACHES) and is adjusted
+incrementally when notifications are created, read or deleted, so badge
+refreshes do not query the database.
+A cache miss falls back to a single COUNT query. Every change is pushed to the
+user's notification socket through the outbox.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from .models import BookingNotification
+from .outbox import enqueue, notification_group
+
+
+# Cache timeout: 1 hour (any drift heals once the entry expires)
+UNREAD_COUNT_CACHE_TIMEOUT = 3600
+
+
+def _unread_cache_key(user_id):
+    return f"notification_unread:{user_id}"
+
+
+def _count_from_db(user_id):
+    count = BookingNotification.objects.filter(
+        recipient_id=user_id, is_read=False
+    ).count()
+    cache.set(_unread_cache_key(user_id), count, timeout=UNREAD_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def get_unread_count(user_id):
+    """
+    Get the number of unread notifications of a user.
+
+    Returns:
+        int: Cached count, or a fresh count from the database on a cache miss
+    """
+    count = cache.get(_unread_cache_key(user_id))
+    if count is None:
+        count = _count_from_db(user_id)
+    return count
+
+
+def publish_unread_count(user_id, count):
+    """Push the current unread count to the user's notification socket."""
+    enqueue(notification_group(user_id), {"type": "unread_count", "count": count})
+
+
+def adjust_unread_count(user_id, delta):
+    """
+    Add delta to a user's cached unread count once the current transaction
+    commits, then push the new value.
+    """
+
+    def apply():
+        key = _unread_cache_key(user_id)
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            # Not cached: recount, which already includes this change
+            count = _count_from_db(user_id)
+        if count < 0:
+            count = _count_from_db(user_id)
+        publish_unread_count(user_id, count)
+
+    transaction.on_commit(apply)
+
+
+def reset_unread_count(user_id):
+    """
+    Set a user's unread count to zero after all their notifications were read.
+    """
+
+    def apply():
+        cache.set(_unread_cache_key(user_id), 0, timeout=UNREAD_COUNT_CACHE_TIMEOUT)
+        publish_unread_count(user_id, 0)
+
+    transaction.on_commit(apply)
@@ -26,15 +26,38 @@ urlpatterns = [
     # STATISTICS
     # ============================================
     path("statistics/", views.booking_statistics, name="booking-statistics"),
+    path(
+        "statistics/revenue/",
+        views.revenue_statistics,
+        name="revenue-statistics",
+    ),
     path(
         "frontend/snapshot/",
         views.frontend_management_snapshot,
         name="frontend-management-snapshot",
     ),
     # ============================================
+    # EXPORTS (streamed CSV / JSONL)
+    # ============================================
+    path("exports/bookings/", views.export_bookings, name="export-bookings"),
+    path("exports/past-tours/", views.export_past_tours, name="export-past-tours"),
+    # ============================================
+    # AVAILABILITY
+    # ============================================
+    path(
+        "guides/<int:guide_id>/availability/",
+        views.guide_availability,
+        name="guide-availability",
+    ),
+    # ============================================
     # NOTIFICATIONS
     # ============================================
     path("notifications/", views.notifications, name="notifications"),
+    path(
+        "notifications/unread-count/",
+        views.unread_notification_count,
+        name="unread-notification-count",
+    ),
     path(
         "notifications/<int:notification_id>/read/",
         views.mark_notification_read,
@@ -2,13 +2,22 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 
 from .models import Booking, BookingNotification, BookingStatus, PastTour
+from .projections import projection_ready
+from .rollups import get_monthly_revenue
+from .availability import (
+    aware_booking_interval,
+    find_guide_conflict,
+    get_guide_availability,
+    MAX_AVAILABILITY_RANGE_DAYS,
+)
 from .serializers import (
     BookingSerializer,
     BookingCreateSerializer,
@@ -19,10 +28,13 @@ from .serializers import (
     PastTourListSerializer,
     FrontendBookingCardSerializer,
     FrontendPastTourCardSerializer,
-    send_booking_ws_notification,
 )
+from .idempotency import idempotent
+from .exports import EXPORT_FORMATS, export_guide_bookings, export_guide_past_tours
+from .outbox import create_booking_notification
+from .unread import adjust_unread_count, get_unread_count, reset_unread_count
 from Profiles.models import Tourist, Guide
-from Tour.models import Tour
+from Tour.models import Tour, TourImage
 
 
 class BookingPagination(PageNumberPagination):
@@ -31,6 +43,52 @@ class BookingPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class SnapshotCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the management snapshot lists.
+    Cursors stay stable while new bookings arrive, unlike page numbers.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def paginate_snapshot_list(request, queryset, cursor_param, ordering):
+    """
+    Paginate one of the snapshot lists with its own cursor query param, so
+    bookings and past tours can be paged independently in the same request.
+    Without a cursor the first page is returned.
+
+    Returns:
+        Tuple of (page items, {"next": url, "previous": url})
+    """
+    paginator = SnapshotCursorPagination()
+    paginator.cursor_query_param = cursor_param
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request)
+    return page, {
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+    }
+
+
+def snapshot_thumbnail_prefetch():
+    """Prefetch only thumbnail images for snapshot cards."""
+    return Prefetch(
+        "tour__tour_images",
+        queryset=TourImage.objects.filter(isthumbnail=True),
+    )
+
+
+def future_booking_q(now=None):
+    """
+    Q object matching bookings whose tour date+time has not passed yet.
+    tour_date/tour_time are stored in local time, so compare against local now.
+    """
+    now = timezone.localtime(now or timezone.now())
+    return Q(tour_date__gt=now.date()) | Q(tour_date=now.date(), tour_time__gte=now.time())
+
+
 def get_future_booking_ids(bookings_queryset):
     """
     Helper function to filter bookings that haven't started yet.
@@ -61,28 +119,18 @@ def cleanup_expired_pending_bookings():
     their tour date+time (never accepted by guide).
     This prevents "zombie" pending requests from accumulating in the database.
     """
-    now = timezone.now()
-
-    # Find all pending bookings
-    pending_bookings = Booking.objects.filter(
-        status=BookingStatus.PENDING,
-    ).select_related("tourist", "guide", "tour")
+    # Only expired rows are loaded; the date/time comparison runs in SQL
+    expired_pending = Booking.objects.filter(status=BookingStatus.PENDING).exclude(
+        future_booking_q()
+    )
 
     deleted_count = 0
 
-    for booking in pending_bookings:
+    for booking in expired_pending:
         try:
-            # Combine date and time into timezone-aware datetime
-            booking_datetime = timezone.make_aware(
-                datetime.combine(booking.tour_date, booking.tour_time),
-                timezone.get_current_timezone(),
-            )
-
-            # Check if the booking datetime has passed
-            if booking_datetime < now:
-                # Delete expired pending booking
-                booking.delete()
-                deleted_count += 1
+            # Delete expired pending booking
+            booking.delete()
+            deleted_count += 1
         except Exception as e:
             # Log error but continue processing other bookings
             print(f"Error deleting expired pending booking {booking.id}: {str(e)}")
@@ -97,54 +145,52 @@ def migrate_past_bookings_to_history():
     their tour date+time into PastTour records.
     This uses timezone-aware datetime comparison to respect Vietnam timezone.
     """
-    now = timezone.now()
-
-    # Find all accepted bookings where the tour datetime has passed
-    past_bookings = Booking.objects.filter(
-        status=BookingStatus.ACCEPTED,
-    ).select_related("tourist", "guide", "tour")
+    # Find accepted bookings whose tour datetime has passed and that still
+    # miss their PastTour record or review reminder. Bookings that were fully
+    # processed by an earlier run are filtered out in SQL.
+    past_bookings = (
+        Booking.objects.filter(status=BookingStatus.ACCEPTED)
+        .exclude(future_booking_q())
+        .annotate(
+            has_past_tour=Exists(PastTour.objects.filter(booking=OuterRef("pk"))),
+            has_reminder=Exists(
+                BookingNotification.objects.filter(
+                    booking=OuterRef("pk"), notification_type="booking_reminder"
+                )
+            ),
+        )
+        .filter(Q(has_past_tour=False) | Q(has_reminder=False))
+        .select_related("tourist", "guide", "tour")
+    )
 
     migrated_count = 0
 
     for booking in past_bookings:
         try:
-            # Combine date and time into a timezone-aware datetime
-            booking_datetime = timezone.make_aware(
-                datetime.combine(booking.tour_date, booking.tour_time),
-                timezone.get_current_timezone(),
-            )
+            # Check if already migrated
+            if not booking.has_past_tour:
+                PastTour.create_from_booking(booking)
+                migrated_count += 1
 
-            # Check if the booking datetime has passed
-            if booking_datetime < now:
-                # Check if already migrated
-                if not PastTour.objects.filter(booking=booking).exists():
-                    PastTour.create_from_booking(booking)
-                    migrated_count += 1
-
-                # Create "review your tour" reminder notification once per booking
-                try:
-                    has_reminder = BookingNotification.objects.filter(
-                        booking=booking,
-                        notification_type="booking_reminder",
-                    ).exists()
-                    if not has_reminder:
-                        reminder_message = (
-                            f"Your tour '{booking.tour.name}' on {booking.tour_date} has completed. "
-                            f"Please leave a review for your guide {booking.guide.name}."
-                        )
-                        notification = BookingNotification.objects.create(
-                            booking=booking,
-                            recipient=booking.tourist.user,
-                            notification_type="booking_reminder",
-                            message=reminder_message,
-                        )
-                        # Send realtime WebSocket reminder 
-                        send_booking_ws_notification(notification)
-                except Exception as e:
-                    # Log error but keep processing other bookings
-                    print(
-                        f"Error creating review reminder for booking {booking.id}: {str(e)}"
+            # Create "review your tour" reminder notification once per booking
+            try:
+                if not booking.has_reminder:
+                    reminder_message = (
+                        f"Your tour '{booking.tour.name}' on {booking.tour_date} has completed. "
+                        f"Please leave a review for your guide {booking.guide.name}."
+                    )
+                    # Realtime WebSocket reminder is delivered via the outbox
+                    create_booking_notification(
+                        booking,
+                        booking.tourist.user,
+                        "booking_reminder",
+                        reminder_message,
                     )
+            except Exception as e:
+                # Log error but keep processing other bookings
+                print(
+                    f"Error creating review reminder for booking {booking.id}: {str(e)}"
+                )
         except Exception as e:
             # Log error but continue processing other bookings
             print(f"Error migrating booking {booking.id}: {str(e)}")
@@ -209,10 +255,12 @@ class BookingViewSet(viewsets.ModelViewSet):
             return BookingListSerializer
         return BookingSerializer
 
+    @method_decorator(idempotent("booking_create"))
     def create(self, request, *args, **kwargs):
         """
         Operation 1: Tourist sends a booking request
         POST /management/bookings/
+        Send an Idempotency-Key header to make client retries safe.
         """
         # Only tourists can create bookings
         if request.user.role != "tourist":
@@ -289,23 +337,19 @@ class BookingViewSet(viewsets.ModelViewSet):
         # Pending bookings for the guide do not block, as they can be declined.
         guide = tour.guide
         if guide:
-            guide_confirmed_bookings = Booking.objects.filter(
-                guide=guide,
-                status=BookingStatus.ACCEPTED
-            ).select_related('tour')
-
-            for confirmed in guide_confirmed_bookings:
-                confirmed_start = datetime.combine(confirmed.tour_date, confirmed.tour_time)
-                confirmed_duration = confirmed.tour.duration
-                confirmed_end = confirmed_start + timedelta(hours=confirmed_duration)
-
-                if new_start < confirmed_end and confirmed_start < new_end:
-                        return Response(
-                        {
-                            "error": f"The guide is not available at this time. They have a confirmed tour '{confirmed.tour.name}' from {confirmed.tour_time} to {confirmed_end.time()}."
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+            new_start_at, new_end_at = aware_booking_interval(
+                tour_date, tour_time, tour_duration
+            )
+            conflict = find_guide_conflict(guide.pk, new_start_at, new_end_at)
+            if conflict:
+                confirmed = conflict.booking
+                confirmed_end = timezone.localtime(conflict.end_at)
+                return Response(
+                    {
+                        "error": f"The guide is not available at this time. They have a confirmed tour '{confirmed.tour.name}' from {confirmed.tour_time} to {confirmed_end.time()}."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
         # --- VALIDATION LOGIC END ---
 
         booking = serializer.save()
@@ -413,45 +457,32 @@ class BookingViewSet(viewsets.ModelViewSet):
             # A guide cannot accept a booking if it overlaps with another ACCEPTED booking.
             
             # Calculate time range for the booking being accepted
-            current_start = datetime.combine(booking.tour_date, booking.tour_time)
-            from datetime import timedelta
-            current_duration = booking.tour.duration
-            current_end = current_start + timedelta(hours=current_duration)
-            
+            current_start_at, current_end_at = aware_booking_interval(
+                booking.tour_date, booking.tour_time, booking.tour.duration
+            )
+
             # Check against other ACCEPTED bookings for this guide
-            guide_schedule_conflicts = Booking.objects.filter(
-                guide=guide,
-                status=BookingStatus.ACCEPTED
-            ).exclude(id=booking.id).select_related('tour') # Exclude self just in case
-            
-            for confirmed in guide_schedule_conflicts:
-                confirmed_start = datetime.combine(confirmed.tour_date, confirmed.tour_time)
-                confirmed_duration = confirmed.tour.duration
-                confirmed_end = confirmed_start + timedelta(hours=confirmed_duration)
-                
-                if current_start < confirmed_end and confirmed_start < current_end:
-                     return Response(
-                        {
-                            "error": f"You cannot accept this booking because it overlaps with confirmed booking for '{confirmed.tour.name}' at {confirmed.tour_time}."
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+            conflict = find_guide_conflict(
+                guide.pk, current_start_at, current_end_at, exclude_booking_id=booking.id
+            )
+            if conflict:
+                confirmed = conflict.booking
+                return Response(
+                    {
+                        "error": f"You cannot accept this booking because it overlaps with confirmed booking for '{confirmed.tour.name}' at {confirmed.tour_time}."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             # --- GUIDE OVERLAP VALIDATION END ---
 
             booking.accept()
             message = f"Your booking for {booking.tour.name} on {booking.tour_date} has been accepted!"
 
-            # Create notification for tourist
-            notification = BookingNotification.objects.create(
-                booking=booking,
-                recipient=booking.tourist.user,
-                notification_type="booking_accepted",
-                message=message,
+            # Create notification for tourist (realtime delivery via the outbox)
+            create_booking_notification(
+                booking, booking.tourist.user, "booking_accepted", message
             )
 
-            # Send realtime WebSocket notification (best-effort)
-            send_booking_ws_notification(notification)
-
             serializer = BookingSerializer(booking)
             return Response(
                 {"message": "Booking accepted successfully", "booking": serializer.data}
@@ -473,15 +504,10 @@ class BookingViewSet(viewsets.ModelViewSet):
 
             # Create persistent notification in database
             try:
-                notification = BookingNotification.objects.create(
-                    booking=booking,
-                    recipient=booking.tourist.user,
-                    notification_type="booking_declined",
-                    message=message,
+                # Realtime WebSocket notification is delivered via the outbox
+                create_booking_notification(
+                    booking, booking.tourist.user, "booking_declined", message
                 )
-                
-                # Send realtime WebSocket notification
-                send_booking_ws_notification(notification)
             except Exception as e:
                 print(f"Error creating decline notification for booking {booking.id}: {str(e)}")
 
@@ -779,6 +805,19 @@ class BookingViewSet(viewsets.ModelViewSet):
         )
 
 
+def _future_booking_stats(bookings_queryset):
+    """
+    Count future bookings by status with a single aggregate query.
+    """
+    counts = bookings_queryset.filter(future_booking_q()).aggregate(
+        total_bookings=Count("id"),
+        pending=Count("id", filter=Q(status=BookingStatus.PENDING)),
+        accepted=Count("id", filter=Q(status=BookingStatus.ACCEPTED)),
+    )
+    counts["upcoming"] = counts["accepted"]
+    return counts
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def booking_statistics(request):
@@ -793,59 +832,27 @@ def booking_statistics(request):
     if user.role == "tourist":
         try:
             tourist = user.tourist_profile
-            all_bookings = Booking.objects.filter(tourist=tourist).select_related(
-                "tourist", "guide", "tour"
-            )
-            future_ids = get_future_booking_ids(all_bookings)
-            future_bookings = Booking.objects.filter(id__in=future_ids)
-
-            # Count past tours from PastTour model instead
-            past_tours_count = PastTour.objects.filter(tourist=tourist).count()
-
-            stats = {
-                "total_bookings": future_bookings.count(),
-                "pending": future_bookings.filter(status=BookingStatus.PENDING).count(),
-                "accepted": future_bookings.filter(
-                    status=BookingStatus.ACCEPTED
-                ).count(),
-                "upcoming": future_bookings.filter(
-                    status=BookingStatus.ACCEPTED
-                ).count(),
-                "past_tours": past_tours_count,
-            }
         except Tourist.DoesNotExist:
             return Response(
                 {"error": "Tourist profile not found"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        stats = _future_booking_stats(Booking.objects.filter(tourist=tourist))
+        # Count past tours from PastTour model instead
+        stats["past_tours"] = PastTour.objects.filter(tourist=tourist).count()
+
     elif user.role == "guide":
         try:
             guide = user.guide_profile
-            all_bookings = Booking.objects.filter(guide=guide).select_related(
-                "tourist", "guide", "tour"
-            )
-            future_ids = get_future_booking_ids(all_bookings)
-            future_bookings = Booking.objects.filter(id__in=future_ids)
-
-            # Count past tours from PastTour model instead
-            past_tours_count = PastTour.objects.filter(guide=guide).count()
-
-            stats = {
-                "total_bookings": future_bookings.count(),
-                "pending": future_bookings.filter(status=BookingStatus.PENDING).count(),
-                "accepted": future_bookings.filter(
-                    status=BookingStatus.ACCEPTED
-                ).count(),
-                "upcoming": future_bookings.filter(
-                    status=BookingStatus.ACCEPTED
-                ).count(),
-                "past_tours": past_tours_count,
-            }
         except Guide.DoesNotExist:
             return Response(
                 {"error": "Guide profile not found"}, status=status.HTTP_400_BAD_REQUEST
             )
+
+        stats = _future_booking_stats(Booking.objects.filter(guide=guide))
+        # Count past tours from PastTour model instead
+        stats["past_tours"] = PastTour.objects.filter(guide=guide).count()
     else:
         return Response(
             {"error": "Invalid user role"}, status=status.HTTP_400_BAD_REQUEST
@@ -854,6 +861,198 @@ def booking_statistics(request):
     return Response(stats)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def revenue_statistics(request):
+    """
+    Monthly revenue chart data for the authenticated guide
+    GET /management/statistics/revenue/
+    Query params:
+    - months: number of months to return (default 12, max 36)
+    Reads the GuideDailyRevenue rollup instead of the raw PastTour history
+    (once the rollup includes the backfilled history).
+    """
+    if request.user.role != "guide":
+        return Response(
+            {"error": "This endpoint is only for guides"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    try:
+        guide = request.user.guide_profile
+    except Guide.DoesNotExist:
+        return Response(
+            {"error": "Guide profile not found"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        months = int(request.query_params.get("months", 12))
+    except ValueError:
+        months = 12
+    months = max(1, min(months, 36))
+
+    series = get_monthly_revenue(
+        guide, months=months, from_rollup=projection_ready("revenue_rollup")
+    )
+
+    return Response(
+        {
+            "months": series,
+            "totals": {
+                "revenue": sum(entry["revenue"] for entry in series),
+                "guests": sum(entry["guests"] for entry in series),
+                "completed_tours": sum(entry["completed_tours"] for entry in series),
+            },
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def guide_availability(request, guide_id):
+    """
+    Get a guide's busy and free intervals per day, computed from accepted bookings
+    GET /management/guides/{guide_id}/availability/
+    Query params:
+    - start: first day (YYYY-MM-DD), defaults to today
+    - end: last day (YYYY-MM-DD), defaults to start + 13 days
+    Times are local (Asia/Ho_Chi_Minh); a busy interval ending at midnight is "24:00".
+    """
+    guide = get_object_or_404(Guide, pk=guide_id)
+
+    try:
+        start_param = request.query_params.get("start")
+        start_date = (
+            datetime.strptime(start_param, "%Y-%m-%d").date()
+            if start_param
+            else timezone.localdate()
+        )
+        end_param = request.query_params.get("end")
+        end_date = (
+            datetime.strptime(end_param, "%Y-%m-%d").date()
+            if end_param
+            else start_date + timedelta(days=13)
+        )
+    except ValueError:
+        return Response(
+            {"error": "Dates must use the YYYY-MM-DD format"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if end_date < start_date:
+        return Response(
+            {"error": "end must be on or after start"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if (end_date - start_date).days + 1 > MAX_AVAILABILITY_RANGE_DAYS:
+        return Response(
+            {"error": f"Date range cannot exceed {MAX_AVAILABILITY_RANGE_DAYS} days"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    days = get_guide_availability(guide.pk, start_date, end_date)
+
+    return Response(
+        {
+            "guide_id": guide.pk,
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
+            "days": days,
+        }
+    )
+
+
+def _parse_export_request(request):
+    """
+    Validate the common export query params.
+
+    Returns:
+        Tuple of (guide, output, start_date, end_date, error_response)
+    """
+    if request.user.role != "guide":
+        return None, None, None, None, Response(
+            {"error": "Only guides can export their bookings"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    try:
+        guide = request.user.guide_profile
+    except Guide.DoesNotExist:
+        return None, None, None, None, Response(
+            {"error": "Guide profile not found"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # "format" is reserved by DRF for renderer selection
+    output = request.query_params.get("output", "csv").lower()
+    if output not in EXPORT_FORMATS:
+        return None, None, None, None, Response(
+            {"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        start_param = request.query_params.get("start")
+        end_param = request.query_params.get("end")
+        start_date = datetime.strptime(start_param, "%Y-%m-%d").date() if start_param else None
+        end_date = datetime.strptime(end_param, "%Y-%m-%d").date() if end_param else None
+    except ValueError:
+        return None, None, None, None, Response(
+            {"error": "Dates must use the YYYY-MM-DD format"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if start_date and end_date and end_date < start_date:
+        return None, None, None, None, Response(
+            {"error": "end must be on or after start"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return guide, output, start_date, end_date, None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_bookings(request):
+    """
+    Stream all bookings of the authenticated guide (Guide only)
+    GET /management/exports/bookings/
+    Query params:
+    - output: csv (default) or jsonl
+    - start, end: tour date range (YYYY-MM-DD), both optional
+    - status: only bookings with this status
+    """
+    guide, output, start_date, end_date, error = _parse_export_request(request)
+    if error:
+        return error
+
+    booking_status = request.query_params.get("status")
+    if booking_status and booking_status not in BookingStatus.values:
+        return Response(
+            {"error": f"status must be one of: {', '.join(BookingStatus.values)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return export_guide_bookings(guide, output, start_date, end_date, booking_status)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_past_tours(request):
+    """
+    Stream the completed tours of the authenticated guide (Guide only)
+    GET /management/exports/past-tours/
+    Query params:
+    - output: csv (default) or jsonl
+    - start, end: tour date range (YYYY-MM-DD), both optional
+    """
+    guide, output, start_date, end_date, error = _parse_export_request(request)
+    if error:
+        return error
+
+    return export_guide_past_tours(guide, output, start_date, end_date)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def frontend_management_snapshot(request):
@@ -862,6 +1061,11 @@ def frontend_management_snapshot(request):
     GET /management/frontend/snapshot/
 
     Automatically migrates past bookings to PastTour and cleans up expired pending bookings.
+
+    Bookings and past tours can be cursor-paginated independently:
+    ?bookings_cursor=...&past_tours_cursor=...&page_size=20
+    Next/previous links are returned under "pagination". Without a cursor
+    each list starts with its first page (page_size defaults to 20).
     """
     user = request.user
     context = {"request": request}
@@ -872,125 +1076,72 @@ def frontend_management_snapshot(request):
     # Auto-migrate past accepted bookings to PastTour (timezone-aware)
     migrate_past_bookings_to_history()
 
+    if user.role not in ("tourist", "guide"):
+        return Response(
+            {"error": "Invalid user role"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     if user.role == "tourist":
         try:
-            tourist = user.tourist_profile
+            profile_filter = {"tourist": user.tourist_profile}
         except Tourist.DoesNotExist:
             return Response(
                 {"error": "Tourist profile not found"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        # Filter bookings: only show future bookings (using timezone-aware comparison)
-        now = timezone.now()
-        all_bookings = Booking.objects.filter(tourist=tourist).select_related(
-            "tourist", "guide", "tour"
-        )
-
-        future_bookings = []
-        for booking in all_bookings:
-            booking_datetime = timezone.make_aware(
-                datetime.combine(booking.tour_date, booking.tour_time),
-                timezone.get_current_timezone(),
-            )
-            if booking_datetime >= now:
-                future_bookings.append(booking.id)
-
-        # Date cutoff for hiding declined/cancelled bookings
-        cutoff_time = timezone.now() - timedelta(hours=24)
-
-        bookings = (
-            Booking.objects.filter(id__in=future_bookings)
-            .exclude(
-                status__in=[BookingStatus.DECLINED, BookingStatus.CANCELLED],
-                responded_at__lt=cutoff_time
-            )
-            .select_related("tourist", "guide", "tour")
-            .prefetch_related("tour__tour_images")
-            .order_by("-created_at")
-        )
-
-        past_tours = (
-            PastTour.objects.filter(tourist=tourist)
-            .select_related("tourist", "guide", "tour")
-            .prefetch_related("tour__tour_images")
-            .order_by("-tour_date", "-tour_time")
-        )
-
-        return Response(
-            {
-                "role": "tourist",
-                "bookings": FrontendBookingCardSerializer(
-                    bookings, many=True, context=context
-                ).data,
-                "incomingRequests": [],
-                "pastTours": FrontendPastTourCardSerializer(
-                    past_tours, many=True, context=context
-                ).data,
-            }
-        )
-
-    if user.role == "guide":
+    else:
         try:
-            guide = user.guide_profile
+            profile_filter = {"guide": user.guide_profile}
         except Guide.DoesNotExist:
             return Response(
                 {"error": "Guide profile not found"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Filter bookings: only show future bookings (using timezone-aware comparison)
-        now = timezone.now()
-        all_bookings = Booking.objects.filter(guide=guide).select_related(
-            "tourist", "guide", "tour"
-        )
-
-        future_bookings = []
-        for booking in all_bookings:
-            booking_datetime = timezone.make_aware(
-                datetime.combine(booking.tour_date, booking.tour_time),
-                timezone.get_current_timezone(),
-            )
-            if booking_datetime >= now:
-                future_bookings.append(booking.id)
-
-        # Date cutoff for hiding declined/cancelled bookings
-        cutoff_time = timezone.now() - timedelta(hours=24)
+    # Date cutoff for hiding declined/cancelled bookings
+    cutoff_time = timezone.now() - timedelta(hours=24)
 
-        incoming = (
-            Booking.objects.filter(id__in=future_bookings)
-            .exclude(
-                status__in=[BookingStatus.DECLINED, BookingStatus.CANCELLED],
-                responded_at__lt=cutoff_time
-            )
-            .select_related("tourist", "guide", "tour")
-            .prefetch_related("tour__tour_images")
-            .order_by("-created_at")
+    # Only future bookings; the date/time comparison runs in SQL
+    bookings = (
+        Booking.objects.filter(future_booking_q(), **profile_filter)
+        .exclude(
+            status__in=[BookingStatus.DECLINED, BookingStatus.CANCELLED],
+            responded_at__lt=cutoff_time
         )
+        .select_related("tourist", "guide", "tour")
+        .prefetch_related(snapshot_thumbnail_prefetch())
+    )
+    bookings_page, bookings_links = paginate_snapshot_list(
+        request, bookings, "bookings_cursor", ("-created_at", "-id")
+    )
 
-        past_tours = (
-            PastTour.objects.filter(guide=guide)
-            .select_related("tourist", "guide", "tour")
-            .prefetch_related("tour__tour_images")
-            .order_by("-tour_date", "-tour_time")
-        )
+    past_tours = (
+        PastTour.objects.filter(**profile_filter)
+        .select_related("tourist", "guide", "tour")
+        .prefetch_related(snapshot_thumbnail_prefetch())
+    )
+    past_tours_page, past_tours_links = paginate_snapshot_list(
+        request, past_tours, "past_tours_cursor", ("-tour_date", "-tour_time", "-id")
+    )
 
-        return Response(
-            {
-                "role": "guide",
-                "bookings": [],
-                "incomingRequests": FrontendBookingCardSerializer(
-                    incoming, many=True, context=context
-                ).data,
-                "pastTours": FrontendPastTourCardSerializer(
-                    past_tours, many=True, context=context
-                ).data,
-            }
-        )
+    booking_cards = FrontendBookingCardSerializer(
+        bookings_page, many=True, context=context
+    ).data
 
     return Response(
-        {"error": "Invalid user role"},
-        status=status.HTTP_400_BAD_REQUEST,
+        {
+            "role": user.role,
+            "bookings": booking_cards if user.role == "tourist" else [],
+            "incomingRequests": booking_cards if user.role == "guide" else [],
+            "pastTours": FrontendPastTourCardSerializer(
+                past_tours_page, many=True, context=context
+            ).data,
+            "pagination": {
+                "bookings": bookings_links,
+                "pastTours": past_tours_links,
+            },
+        }
     )
 
 
@@ -1033,7 +1184,9 @@ def mark_notification_read(request, notification_id):
         BookingNotification, id=notification_id, recipient=user
     )
 
-    notification.mark_as_read()
+    if not notification.is_read:
+        notification.mark_as_read()
+        adjust_unread_count(user.id, -1)
 
     serializer = BookingNotificationSerializer(notification)
     return Response(
@@ -1053,6 +1206,7 @@ def mark_all_notifications_read(request):
     updated_count = BookingNotification.objects.filter(
         recipient=user, is_read=False
     ).update(is_read=True)
+    reset_unread_count(user.id)
 
     return Response(
         {
@@ -1060,3 +1214,15 @@ def mark_all_notifications_read(request):
             "count": updated_count,
         }
     )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    """
+    Get the number of unread notifications for the badge
+    GET /management/notifications/unread-count/
+
+    Served from the cached per-user counter; no database query on a cache hit.
+    """
+    return Response({"unread_count": get_unread_count(request.user.id)})
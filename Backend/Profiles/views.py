@@ -20,7 +20,8 @@ from .serializers import (
 from django.db.models import Count, F, Avg
 from Tour.models import TourRating, Tour
 from Tour.serializers import TourRatingSerializer
-from Management.models import PastTour
+from Management.models import GuideDashboardCounter, PastTour
+from Management.projections import projection_ready
 from Management.serializers import FrontendPastTourCardSerializer
 import json
 User = get_user_model()
@@ -225,7 +226,13 @@ class GuideAchievementView(APIView):
             achievements.append("Polygot")
 
         # --- Past tours ---
-        guide_past_count = PastTour.objects.filter(guide=guide).count()
+        # Read from the projected dashboard counter once it includes the
+        # backfilled history; count PastTour rows until then
+        if projection_ready("dashboard_counters"):
+            counter = GuideDashboardCounter.objects.filter(guide=guide).first()
+            guide_past_count = counter.completed if counter else 0
+        else:
+            guide_past_count = PastTour.objects.filter(guide=guide).count()
 
         if guide_past_count >= 1:
             achievements.append("Rookie Guide")
@@ -2,6 +2,9 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.utils import timezone
 from Management.models import Booking, PastTour, BookingStatus
+from Management.availability import filter_tours_available_at
+from Management.idempotency import idempotent
+from datetime import datetime
 from Profiles.models import Guide, Tourist
 import json
 from rest_framework import status
@@ -411,9 +414,11 @@ def tour_achievements(request, tour_id):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
+@idempotent("tour_rate")
 def tour_rate(request, tour_id):
     """
     Create a rating for a tour, with optional images.
+    Send an Idempotency-Key header to make client retries safe.
     Expected form-data:
       - user: string
       - rating: integer (1-5)
@@ -639,6 +644,10 @@ def get_all_tours(request):
         guide_gender = request.GET.get('guide_gender')
         guide_language = request.GET.get('guide_language')
 
+        # Availability: only tours whose guide is free at date (+ time)
+        available_date = request.GET.get('date')
+        available_time = request.GET.get('time')
+
         # Filters
         # if search_term:
         #     tours_queryset = tours_queryset.filter(
@@ -704,6 +713,18 @@ def get_all_tours(request):
         if guide_language:
             tours_queryset = tours_queryset.filter(guide__languages__icontains=guide_language)
 
+        if available_date:
+            # Anti-join against the indexed GuideBusyInterval table
+            try:
+                day = datetime.strptime(available_date, '%Y-%m-%d').date()
+                at_time = datetime.strptime(available_time, '%H:%M').time() if available_time else None
+            except ValueError:
+                return Response(
+                    {'success': False, 'error': 'Invalid date or time. Use YYYY-MM-DD and HH:MM.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            tours_queryset = filter_tours_available_at(tours_queryset, day, at_time)
+
         # -------------------
         # Sorting
         # -------------------
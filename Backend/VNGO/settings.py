@@ -79,15 +79,36 @@ INSTALLED_APPS = [
 # daphne
 ASGI_APPLICATION = "VNGO.asgi.application"
 
+REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
 
+# Shared by Daphne and every WSGI worker: unread counters, presence, room
+# sets and the chatbot tour index change log must be visible to all processes
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        "KEY_PREFIX": "vngo",
+    },
+}
+
+# Single-process development without Redis (counters are per process)
+if os.getenv("CACHE_BACKEND") == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -208,7 +229,7 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 # Expose headers
-CORS_EXPOSE_HEADERS = ["Content-Type", "Authorization"]
+CORS_EXPOSE_HEADERS = ["Content-Type", "Authorization", "Idempotent-Replayed"]
 
 # Preflight cache duration
 CORS_PREFLIGHT_MAX_AGE = 86400
@@ -220,6 +241,7 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "idempotency-key",
     "origin",
     "user-agent",
     "x-csrftoken",
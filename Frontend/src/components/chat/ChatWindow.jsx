@@ -334,6 +334,11 @@ export default function ChatWindow({
             newMessages = newMessages.filter(m => !m.isLoading);
           }
 
+          // Streamed reply: the saved message replaces its draft
+          if (data.stream_id) {
+            newMessages = newMessages.filter(m => m.id !== `stream-${data.stream_id}`);
+          }
+
           // 2. If incoming is from me (echo), replace temp message with real one
           const isFromMe = incoming.sender?.id && String(incoming.sender.id) === String(user?.id);
           if (isFromMe) {
@@ -359,6 +364,38 @@ export default function ChatWindow({
         handleNotifyParent(incoming);
         // Auto-scroll on new message (container only)
         ensureScrollBottom(true);
+      } else if (data.type === "chat.message.delta") {
+        // Streamed chatbot reply: grow a draft until the saved message arrives
+        const draftId = `stream-${data.stream_id}`;
+        setMessages((prev) => {
+          if (prev.some(m => m.id === draftId)) {
+            return prev.map(m => m.id === draftId ? { ...m, content: m.content + data.delta } : m);
+          }
+          const draft = enrichSender({
+            id: draftId,
+            room: roomName,
+            content: data.delta,
+            sender: data.sender,
+            created_at: new Date().toISOString(),
+            isTemp: true,
+          });
+          return [...prev.filter(m => !m.isLoading), draft];
+        });
+        ensureScrollBottom(true);
+      } else if (data.type === "chatbot.busy") {
+        // Request rejected by the chatbot pool: show the notice in place of the placeholder
+        setMessages((prev) => [
+          ...prev.filter(m => !m.isLoading),
+          enrichSender({
+            id: `busy-${Date.now()}`,
+            room: roomName,
+            content: data.message,
+            sender: { username: "chatbot", id: "chatbot" },
+            created_at: new Date().toISOString(),
+            isTemp: true,
+          }),
+        ]);
+        ensureScrollBottom(true);
       } else if (data.type === "typing") {
         // Backend sends typing event with user_id, not sender object
         const typingUserId = data.user_id;
@@ -85,8 +85,10 @@ export default function Header() {
   const [unreadMessages, setUnreadMessages] = useState([]);
   const [loadingMessages, setLoadingMessages] = useState(false);
 
-  // Calculate unread notifications for the red dot
-  const unreadCount = notifications.filter((n) => !n.is_read).length;
+  // Unread notifications for the red dot: the server's count once known
+  // (it also covers notifications not loaded in the list)
+  const [serverUnreadCount, setServerUnreadCount] = useState(null);
+  const unreadCount = serverUnreadCount ?? notifications.filter((n) => !n.is_read).length;
 
   // Calculate unread messages count
   const unreadMessagesCount = unreadMessages.length;
@@ -130,6 +132,7 @@ export default function Header() {
     if (!isLoggedIn) {
       setNotifications([]);
       setUnreadMessages([]);
+      setServerUnreadCount(null);
       return;
     }
 
@@ -142,6 +145,11 @@ export default function Header() {
         setNotifications(res.data || []);
       }
       setLoadingNotifications(false);
+
+      const countRes = await managementService.getUnreadNotificationCount();
+      if (isMounted && countRes.success) {
+        setServerUnreadCount(countRes.data);
+      }
     };
 
     fetchNotifications();
@@ -150,6 +158,12 @@ export default function Header() {
     const handleWsNotification = (data) => {
       if (!data) return;
 
+      // Authoritative unread count, pushed on every change
+      if (data.type === "unread_count") {
+        setServerUnreadCount(data.count);
+        return;
+      }
+
       // Handle booking notifications
       if (data.type === "booking_notification") {
         const newNotification = {
@@ -194,12 +208,20 @@ export default function Header() {
       }
     };
 
+    // Missed more notifications than the server can replay: reload everything
+    const handleResync = () => {
+      fetchNotifications();
+      fetchUnreadMessages();
+    };
+
     notificationService.on("notification", handleWsNotification);
+    notificationService.on("resync", handleResync);
     notificationService.connect();
 
     return () => {
       isMounted = false;
       notificationService.off("notification", handleWsNotification);
+      notificationService.off("resync", handleResync);
     };
   }, [isLoggedIn, user?.id, fetchUnreadMessages, resolveRoomMateName]);
 
@@ -134,6 +134,23 @@ const mockMyTours = [
 ];
 const MOCK_MANAGEMENT_DATA = TEST_ROLE === "guide" ? mockDataGuide : mockDataTourist;
 
+// Shown under a paginated list while the snapshot has a next page for it
+const LoadMoreButton = ({ next, loading, onClick }) => {
+  if (!next) return null;
+  return (
+    <div className="flex justify-center mt-8">
+      <button
+        type="button"
+        onClick={onClick}
+        disabled={loading}
+        className="px-6 py-2 rounded-full border border-[#068F64] text-[#068F64] hover:bg-[#068F64] hover:text-white transition-colors disabled:opacity-50"
+      >
+        {loading ? "Loading..." : "Load more"}
+      </button>
+    </div>
+  );
+};
+
 export default function ManagementTours() {
   const { user } = useAuthStore();
   const [isLoading, setIsLoading] = useState(true);
@@ -145,6 +162,7 @@ export default function ManagementTours() {
     pastTours: [],
   });
   const [myTours, setMyTours] = useState([]);
+  const [loadingMore, setLoadingMore] = useState(false);
   const initialTab = IS_MOCK_TEST
     ? (TEST_ROLE === "guide" ? "my-tours" : "bookings")
     : "bookings";
@@ -209,6 +227,25 @@ export default function ManagementTours() {
     }
   };
 
+  // Append the next page of one list ("bookings" or "pastTours" in data.pagination)
+  const loadMore = async (list) => {
+    const next = managementData.pagination?.[list]?.next;
+    if (!next || loadingMore) return;
+    setLoadingMore(true);
+    const result = await managementService.getManagementSnapshot(next);
+    if (result.success) {
+      const key = list === "pastTours"
+        ? "pastTours"
+        : (managementData.role === "guide" ? "incomingRequests" : "bookings");
+      setManagementData(prev => ({
+        ...prev,
+        [key]: [...prev[key], ...result.data[key]],
+        pagination: { ...prev.pagination, [list]: result.data.pagination[list] },
+      }));
+    }
+    setLoadingMore(false);
+  };
+
   if (isLoading) {
     return (
       <div className="min-h-screen bg-gray-100 py-8 px-4">
@@ -277,19 +314,31 @@ export default function ManagementTours() {
                     <MyToursList tours={myTours} refreshData={refreshData} />
                   )}
                   {activeTab === "incoming" && (
-                    <IncomingRequests incomingRequests={managementData.incomingRequests} refreshData={refreshData} />
+                    <>
+                      <IncomingRequests incomingRequests={managementData.incomingRequests} refreshData={refreshData} />
+                      <LoadMoreButton next={managementData.pagination?.bookings?.next} loading={loadingMore} onClick={() => loadMore("bookings")} />
+                    </>
                   )}
                   {activeTab === "past-tours" && (
-                    <PastTours role="guide" pastTours={managementData.pastTours} />
+                    <>
+                      <PastTours role="guide" pastTours={managementData.pastTours} />
+                      <LoadMoreButton next={managementData.pagination?.pastTours?.next} loading={loadingMore} onClick={() => loadMore("pastTours")} />
+                    </>
                   )}
                 </>
               ) : (
                 <>
                   {activeTab === "bookings" && (
-                    <BookingList bookings={managementData.bookings} refreshData={refreshData} />
+                    <>
+                      <BookingList bookings={managementData.bookings} refreshData={refreshData} />
+                      <LoadMoreButton next={managementData.pagination?.bookings?.next} loading={loadingMore} onClick={() => loadMore("bookings")} />
+                    </>
                   )}
                   {activeTab === "past-tours" && (
-                    <PastTours role="tourist" pastTours={managementData.pastTours} />
+                    <>
+                      <PastTours role="tourist" pastTours={managementData.pastTours} />
+                      <LoadMoreButton next={managementData.pagination?.pastTours?.next} loading={loadingMore} onClick={() => loadMore("pastTours")} />
+                    </>
                   )}
                 </>
               )}
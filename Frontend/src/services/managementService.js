@@ -31,11 +31,13 @@ export const managementService = {
     /**
      * Get management snapshot data (bookings, incoming requests, past tours)
      * GET /management/frontend/snapshot/
-     * Returns data based on user role (tourist or guide)
+     * Returns data based on user role (tourist or guide), one page per list.
+     * Pass a "next" link from data.pagination to load the following page.
      */
-    getManagementSnapshot: async () => {
+    getManagementSnapshot: async (pageUrl = null) => {
         try {
-            const res = await api.get("/management/frontend/snapshot/");
+            const query = pageUrl ? new URL(pageUrl, window.location.origin).search : "";
+            const res = await api.get(`/management/frontend/snapshot/${query}`);
             return { success: true, data: res.data };
         } catch (err) {
             console.error("Error fetching management snapshot:", err);
@@ -210,6 +212,21 @@ export const managementService = {
         }
     },
 
+    /**
+     * Get the unread notification count for the badge
+     * GET /management/notifications/unread-count/
+     * Later changes are pushed as "unread_count" events on the notification socket
+     */
+    getUnreadNotificationCount: async () => {
+        try {
+            const res = await api.get("/management/notifications/unread-count/");
+            return { success: true, data: res.data.unread_count };
+        } catch (err) {
+            console.error("Error fetching unread notification count:", err);
+            return { success: false, error: err };
+        }
+    },
+
     /**
      * Get notifications
      * GET /management/notifications/
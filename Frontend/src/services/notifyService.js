@@ -7,6 +7,9 @@ class NotificationService {
     this.heartbeatInterval = null;
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 10;
+    // Highest replay sequence number received; sent as since_seq on reconnect
+    // so the server replays the notifications missed in between
+    this.lastSeq = null;
   }
 
   connect() {
@@ -17,7 +20,10 @@ class NotificationService {
 
     const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
     const wsHost = import.meta.env.MODE === 'development' ? "localhost:8000" : window.location.host;
-    const wsUrl = `${wsProtocol}//${wsHost}/ws/notify/?token=${encodeURIComponent(accessToken)}`;
+    let wsUrl = `${wsProtocol}//${wsHost}/ws/notify/?token=${encodeURIComponent(accessToken)}`;
+    if (this.lastSeq !== null) {
+      wsUrl += `&since_seq=${this.lastSeq}`;
+    }
 
     try {
       this.ws = new WebSocket(wsUrl);
@@ -32,7 +38,13 @@ class NotificationService {
       this.ws.onmessage = (evt) => {
         try {
           const data = JSON.parse(evt.data);
-          if (data.type !== "heartbeat_ack") {
+          if (typeof data.seq === "number") {
+            this.lastSeq = Math.max(this.lastSeq ?? 0, data.seq);
+          }
+          if (data.type === "resync_required") {
+            // Too far behind to replay: listeners refetch their state over REST
+            this.emit("resync", data);
+          } else if (data.type !== "heartbeat_ack" && data.type !== "replay_complete") {
             this.emit("notification", data);
           }
         } catch {}
@@ -84,6 +96,7 @@ class NotificationService {
 
   disconnect() {
     this.stopHeartbeat();
+    this.lastSeq = null;
     if (this.ws) {
       this.ws.close(1000, "Client disconnect");
       this.ws = null;